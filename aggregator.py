@@ -0,0 +1,492 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Optional
+
+from collect import AcquisitionPlan, MISSING, load_config
+from logwriter import RingBuffer
+from main import HEADER, make_writer
+from scheduler import FixedRateScheduler
+
+# -----------------------------------------------------------------------------
+# Several acquisition nodes (one Pi with up to two MCP3008s each) streaming to one
+# aggregator, which aligns them onto its own clock and writes one merged run log.
+#
+# Wire format, node -> aggregator over TCP or a Unix socket:
+#   one JSON line   {"node": name, "columns": [...], "rate_hz": r}
+#   records         little-endian float64 node clock time, uint32 sequence number,
+#                   then one uint16 raw reading per column (MISSING if not connected)
+#
+# Buffering is bounded end to end: the node drops samples when its RingBuffer is
+# full (the socket backs up while the aggregator is slow), the aggregator keeps at
+# most aggregator.queue_samples per node, and the merged log goes through main.py's writer.
+# -----------------------------------------------------------------------------
+SENSORS = HEADER[1:-1]
+RECORD_PREFIX = "<dI"
+
+
+def record_struct(columns: list) -> struct.Struct:
+    return struct.Struct(f"{RECORD_PREFIX}{len(columns)}H")
+
+
+def parse_address(address: str) -> tuple:
+    """'tcp://host:port' -> ('tcp', (host, port)); 'unix:///path' -> ('unix', path)."""
+    if address.startswith("unix://"):
+        return 'unix', address[len("unix://"):]
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://"):].rpartition(":")
+        return 'tcp', (host or "127.0.0.1", int(port))
+    raise ValueError(f"Address must be tcp://host:port or unix:///path, got {address!r}")
+
+
+# -----------------------------------------------------------------------------
+# Node side: the usual sampling loop, with a sender thread instead of a disk writer
+# -----------------------------------------------------------------------------
+class SkewedClock:
+    """time.monotonic() with a fixed offset and rate error, to stand in for another board's clock."""
+
+    def __init__(self, offset_s: float = 0.0, drift_ppm: float = 0.0):
+        self.offset_s = offset_s
+        self.rate = 1.0 + drift_ppm * 1e-6
+
+    def __call__(self) -> float:
+        return self.offset_s + self.rate * time.monotonic()
+
+
+class NodeSender(threading.Thread):
+    """Sends buffered records to the aggregator, reconnecting (every second) whenever the connection drops."""
+
+    def __init__(self, address: str, hello: dict, buffer: RingBuffer, batch_interval_s: float = 0.02):
+        super().__init__(name="node-sender", daemon=True)
+        self.address = parse_address(address)
+        self.hello = (json.dumps(hello) + "\n").encode()
+        self.buffer = buffer
+        self.batch_interval_s = batch_interval_s
+        self._stop_event = threading.Event()
+        self.sent = 0
+        self.connections = 0
+
+    def _connect(self) -> socket.socket:
+        kind, target = self.address
+        if kind == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(target)
+        else:
+            sock = socket.create_connection(target)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(self.hello)
+        self.connections += 1
+        return sock
+
+    def run(self) -> None:
+        sock = None
+        warned = False
+        while not self._stop_event.is_set():
+            try:
+                if sock is None:
+                    sock = self._connect()
+                    warned = False
+                records = self.buffer.drain(timeout=self.batch_interval_s)
+                if records:
+                    sock.sendall(b"".join(records))
+                    self.sent += len(records)
+            except OSError as e:
+                if not warned:
+                    print(f"Warning: aggregator unreachable ({e}); retrying, samples drop once the buffer is full.")
+                    warned = True
+                if sock is not None:
+                    sock.close()
+                    sock = None
+                self._stop_event.wait(1.0)
+        if sock is not None:
+            try:
+                sock.sendall(b"".join(self.buffer.drain(timeout=0)))
+            except OSError:
+                pass
+            sock.close()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.buffer.wake()
+        self.join()
+
+
+def run_node(config: dict, address: str, name: str, rate_hz: Optional[float] = None,
+             duration_s: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> None:
+    """Sample this board's sensors at the configured rate and stream them to the aggregator."""
+    sampling = config.get('sampling', {})
+    scheduler = FixedRateScheduler(rate_hz or sampling.get('sample_rate_hz', 10), sampling.get('overrun', 'skip'))
+    plan = AcquisitionPlan(config, SENSORS)
+    record = record_struct(SENSORS)
+    buffer = RingBuffer(config.get('node', {}).get('buffer_rows', 4096), 'drop')
+    sender = NodeSender(address, {'node': name, 'columns': SENSORS, 'rate_hz': 1 / scheduler.period}, buffer)
+    sender.start()
+
+    print(f"Node {name} streaming to {address} at {1 / scheduler.period:g} Hz")
+    seq = 0
+    scheduler.start()
+    try:
+        while duration_s is None or scheduler.samples < duration_s / scheduler.period:
+            scheduler.wait()
+            t = clock()
+            plan.read()
+            buffer.put(record.pack(t, seq, *plan.row), timeout=0)  # Never stall sampling on the network
+            seq += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sender.stop()
+        print(scheduler.summary())
+        print(f"Node {name}: {sender.sent} samples sent, {buffer.dropped} dropped, {sender.connections} connection(s)")
+
+
+# -----------------------------------------------------------------------------
+# Clock alignment
+# -----------------------------------------------------------------------------
+class ClockModel:
+    """
+    Maps a node's clock onto the aggregator's: local = node + offset + drift * (node - t_ref).
+    Each sample gives local_receive - node_send = offset + network/scheduling delay, and
+    the delay is never negative, so the smallest difference in each `window_s` is the
+    best estimate of the offset at that time. A line through the last `windows` of these
+    minima gives offset and drift; until three windows are in, the offset alone is used.
+    Any constant minimum delay ends up in the offset, which is harmless for local links.
+    """
+
+    def __init__(self, window_s: float = 1.0, windows: int = 60):
+        self.window_s = window_s
+        self.minima = deque(maxlen=windows)  # (node time, local - node)
+        self._window_start = None
+        self._best = None
+        self.offset = 0.0
+        self.drift = 0.0
+        self.t_ref = 0.0
+
+    def add(self, t_node: float, t_local: float) -> None:
+        difference = t_local - t_node
+        if self._window_start is None:
+            self._window_start = t_node
+        elif t_node - self._window_start >= self.window_s:
+            self.minima.append(self._best)
+            self._window_start, self._best = t_node, None
+            self._fit()
+        if self._best is None or difference < self._best[1]:
+            self._best = (t_node, difference)
+            if len(self.minima) < 3:
+                self.offset, self.t_ref = min([self._best, *self.minima], key=lambda m: m[1])[::-1]
+
+    def _fit(self) -> None:
+        if len(self.minima) < 3:
+            return
+        n = len(self.minima)
+        t_mean = sum(t for t, _ in self.minima) / n
+        d_mean = sum(d for _, d in self.minima) / n
+        stt = sum((t - t_mean) ** 2 for t, _ in self.minima)
+        self.drift = sum((t - t_mean) * (d - d_mean) for t, d in self.minima) / stt if stt else 0.0
+        self.offset, self.t_ref = d_mean, t_mean
+
+    def to_local(self, t_node: float) -> float:
+        return t_node + self.offset + self.drift * (t_node - self.t_ref)
+
+
+class NodeStream:
+    """One node's connection state, clock model and bounded queue of samples not yet merged."""
+
+    def __init__(self, name: str, capacity: int, clock_window_s: float, clock_windows: int):
+        self.name = name
+        self.capacity = capacity
+        self.clock_window_s = clock_window_s
+        self.clock_windows = clock_windows
+        self.columns = None
+        self.record = None
+        self.clock = ClockModel(clock_window_s, clock_windows)
+        self.queue = deque()
+        self.connected = False
+        self.connections = 0
+        self.received = 0
+        self.dropped = 0  # Oldest samples discarded because the merge fell behind
+        self.gaps = 0  # Samples the node numbered but never delivered (dropped on the node)
+        self.last_t = None
+        self._next_seq = None
+        self._current = None  # Newest sample at or before the last merged row
+
+    def attach(self, columns: list) -> None:
+        self.columns = columns
+        self.record = record_struct(columns)
+        self.clock = ClockModel(self.clock_window_s, self.clock_windows)  # The node may have rebooted
+        self.connected = True
+        self.connections += 1
+        self._next_seq = None
+
+    def add(self, fields: tuple, t_local: float) -> None:
+        t, seq = fields[0], fields[1]
+        if self._next_seq is not None and seq > self._next_seq:
+            self.gaps += seq - self._next_seq
+        self._next_seq = seq + 1
+        self.clock.add(t, t_local)
+        if len(self.queue) >= self.capacity:
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((t, fields[2:]))
+        self.received += 1
+        self.last_t = t
+
+    def latest_local(self) -> float:
+        return self.clock.to_local(self.last_t) if self.last_t is not None else -math.inf
+
+    def sample_at(self, t: float, stale_s: float) -> tuple:
+        """(row, |time error|) of the sample nearest local time t, or (None, None) if none is within stale_s."""
+        to_local = self.clock.to_local
+        while self.queue and to_local(self.queue[0][0]) <= t:
+            self._current = self.queue.popleft()
+        best, best_error = None, None
+        for sample in (self._current, self.queue[0] if self.queue else None):
+            if sample is not None:
+                error = abs(to_local(sample[0]) - t)
+                if error <= stale_s and (best_error is None or error < best_error):
+                    best, best_error = sample[1], error
+        return best, best_error
+
+    def summary(self) -> str:
+        return (f"{self.name}: {self.received} samples received, {self.gaps} lost on the node, "
+                f"{self.dropped} dropped here, {self.connections} connection(s), "
+                f"offset = {self.clock.offset:+.6f} s, drift = {self.clock.drift * 1e6:+.1f} ppm")
+
+
+# -----------------------------------------------------------------------------
+# Aggregator
+# -----------------------------------------------------------------------------
+class Aggregator:
+    """
+    Accepts the nodes listed in aggregator.nodes and, once all have connected, writes
+    <output_dir>/merged_<timestamp>.csv: one row per tick of the merged rate with every node's
+    sample nearest that tick (columns '<node>.<sensor>') and the largest time error in skew_ms.
+    A row is written once every connected node has sent a sample past it, or after max_lateness_ms.
+    """
+
+    def __init__(self, config: dict, nodes: Optional[list] = None, listen: Optional[str] = None,
+                 rate_hz: Optional[float] = None, output_dir: Optional[str] = None):
+        options = config.get('aggregator', {})
+        self.config = config
+        self.listen = listen or options.get('listen', 'tcp://127.0.0.1:5560')
+        self.output_dir = output_dir or options.get('output_dir', 'merged')
+        nodes = nodes or options.get('nodes') or []
+        if not nodes:
+            raise ValueError("List the node names to merge in aggregator.nodes")
+        rate_hz = rate_hz or options.get('rate_hz') or config.get('sampling', {}).get('sample_rate_hz', 10)
+        self.period = 1 / rate_hz
+        self.max_lateness_s = options.get('max_lateness_ms', 250) / 1000
+        self.stale_s = options.get('stale_ms', 500) / 1000
+        self.streams = {name: NodeStream(name, options.get('queue_samples', 2048),
+                                         options.get('clock_window_s', 1.0), options.get('clock_windows', 60))
+                        for name in nodes}
+        self.filename = None
+        self.rows = 0
+        self._all_connected = None
+
+    async def _serve_node(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        stream = None
+        try:
+            hello = json.loads(await reader.readline())
+            name = hello.get('node')
+            stream = self.streams.get(name)
+            if stream is None:
+                print(f"Rejected node {name!r}: not in aggregator.nodes")
+                return
+            if stream.connected or (stream.columns is not None and stream.columns != hello['columns']):
+                print(f"Rejected node {name!r}: already connected, or its columns changed")
+                stream = None
+                return
+            stream.attach(hello['columns'])
+            print(f"Node {name} connected ({len(stream.columns)} columns at {hello.get('rate_hz', 0):g} Hz)")
+            if all(s.connected for s in self.streams.values()):
+                self._all_connected.set()
+
+            size = stream.record.size
+            pending = b""
+            while True:
+                data = await reader.read(65536)  # StreamReader pauses the socket when it falls behind
+                if not data:
+                    break
+                t_local = time.monotonic()
+                pending += data
+                whole = len(pending) - len(pending) % size
+                for fields in stream.record.iter_unpack(pending[:whole]):
+                    stream.add(fields, t_local)
+                pending = pending[whole:]
+        except (ValueError, KeyError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass  # Aggregator shutting down
+        finally:
+            if stream is not None and stream.connected:
+                stream.connected = False
+                print(f"Node {stream.name} disconnected")
+            writer.close()
+
+    def _row(self, t: float, t0: float) -> list:
+        row = [round(t - t0, 3)]
+        skew = 0.0
+        for stream in self.streams.values():
+            values, error = stream.sample_at(t, self.stale_s)
+            if values is None:
+                row.extend([None] * len(stream.columns))
+                continue
+            row.extend(None if v == MISSING else v for v in values)
+            skew = max(skew, error)
+        row.append(round(1000 * skew, 2))
+        return row
+
+    async def merge(self, buffer: RingBuffer, t0: float) -> None:
+        streams = list(self.streams.values())
+        k = 0
+        while True:
+            await asyncio.sleep(self.period)
+            now = time.monotonic()
+            while True:
+                t = t0 + k * self.period
+                waiting = any(s.connected and s.latest_local() < t for s in streams)
+                if t > now or (waiting and now < t + self.max_lateness_s):
+                    break
+                buffer.put(self._row(t, t0), timeout=0)
+                k += 1
+
+    async def write(self, buffer: RingBuffer, writer, commit_interval_s: float) -> None:
+        while True:
+            await asyncio.sleep(commit_interval_s)
+            await asyncio.to_thread(writer.write_rows, buffer.drain(timeout=0), True)
+
+    async def run(self, duration_s: Optional[float] = None) -> None:
+        kind, target = parse_address(self.listen)
+        self._all_connected = asyncio.Event()
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.unlink(target)
+            server = await asyncio.start_unix_server(self._serve_node, target)
+        else:
+            server = await asyncio.start_server(self._serve_node, *target)
+
+        print(f"Aggregator listening on {self.listen}, waiting for {', '.join(self.streams)}")
+        tasks = []
+        writer = None
+        try:
+            await self._all_connected.wait()
+            header = ["seconds", *(f"{s.name}.{c}" for s in self.streams.values() for c in s.columns), "skew_ms"]
+            os.makedirs(self.output_dir, exist_ok=True)
+            stamp = datetime.now().isoformat(timespec='seconds').replace(':', '.').replace('T', '_')
+            self.filename = os.path.join(self.output_dir, f"merged_{stamp}.csv")
+            buffer, writer = make_writer(self.config, self.filename, header, FixedRateScheduler(1 / self.period))
+            commit_interval_s = self.config.get('writer', {}).get('commit_interval_s', 1.0)
+
+            # Rows start one lateness budget after the last node connects, so every clock model has data
+            await asyncio.sleep(self.max_lateness_s)
+            print(f"Merging into {self.filename} at {1 / self.period:g} Hz")
+            t0 = time.monotonic()
+            tasks = [asyncio.create_task(self.merge(buffer, t0), name="merge"),
+                     asyncio.create_task(self.write(buffer, writer, commit_interval_s), name="write")]
+            timer = [asyncio.create_task(asyncio.sleep(duration_s))] if duration_s else []
+            done, _ = await asyncio.wait(tasks + timer, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task not in timer:
+                    task.result()
+        except asyncio.CancelledError:
+            print("Stopped aggregating.")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            server.close()
+            if kind == 'unix' and os.path.exists(target):
+                os.unlink(target)
+            if writer is not None:
+                await asyncio.to_thread(writer.close)
+                self.rows = writer.rows_written
+                print(writer.summary())
+            for stream in self.streams.values():
+                print(stream.summary())
+
+
+# -----------------------------------------------------------------------------
+# Local test rig: one aggregator and several fake-SPI nodes with skewed clocks
+# -----------------------------------------------------------------------------
+def simulate(config: dict, nodes: int, duration_s: float, rate_hz: float, listen: Optional[str] = None) -> None:
+    names = [f"sim{i}" for i in range(nodes)]
+    aggregator = Aggregator(config, names, listen, rate_hz)
+    skews = {name: (random.uniform(-100, 100), random.uniform(-200, 200)) for name in names}  # (s, ppm)
+
+    async def run() -> None:
+        task = asyncio.create_task(aggregator.run(duration_s))
+        await asyncio.sleep(0.5)  # Let the server bind
+        env = dict(os.environ, COLDPLAYT_FAKE_SPI="1")
+        procs = [await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), 'node', '--name', name, '--connect', aggregator.listen,
+            '--rate', str(rate_hz), '--clock-offset', str(offset), '--clock-drift-ppm', str(ppm),
+            '--duration', str(duration_s + 5), env=env, stdout=subprocess.DEVNULL)
+            for name, (offset, ppm) in skews.items()]
+        try:
+            await task
+        finally:
+            for proc in procs:
+                if proc.returncode is None:
+                    proc.terminate()
+                await proc.wait()
+
+        # True offset of each node clock at the end of the run vs the fitted model
+        now = time.monotonic()
+        for name, (offset, ppm) in skews.items():
+            node_time = SkewedClock(offset, ppm)()
+            error_ms = 1000 * (aggregator.streams[name].clock.to_local(node_time) - now)
+            print(f"{name}: clock {offset:+.3f} s {ppm:+.1f} ppm, "
+                  f"fitted drift {-aggregator.streams[name].clock.drift * 1e6:+.1f} ppm, alignment error {error_ms:+.3f} ms")
+
+    asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Merge sample streams from several acquisition nodes.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="run the aggregator and write merged/merged_<timestamp>.csv")
+    serve.add_argument('--listen', help="tcp://host:port or unix:///path (default: aggregator.listen)")
+    serve.add_argument('--duration', type=float, help="stop after this many seconds")
+    node = commands.add_parser('node', help="sample this board and stream to the aggregator")
+    node.add_argument('--name', help="node name (default: node.name, or the hostname)")
+    node.add_argument('--connect', help="aggregator address (default: node.aggregator)")
+    node.add_argument('--rate', type=float, help="sample rate in Hz (default: sampling.sample_rate_hz)")
+    node.add_argument('--duration', type=float, help="stop after this many seconds")
+    node.add_argument('--clock-offset', type=float, default=0.0, help="testing: shift this node's clock (s)")
+    node.add_argument('--clock-drift-ppm', type=float, default=0.0, help="testing: make this node's clock run fast/slow")
+    sim = commands.add_parser('simulate', help="aggregator plus local fake-SPI nodes with skewed clocks")
+    sim.add_argument('--nodes', type=int, default=3)
+    sim.add_argument('--duration', type=float, default=20.0)
+    sim.add_argument('--rate', type=float, default=200.0, help="sample rate of each node and of the merged log")
+    sim.add_argument('--listen', help="address for the aggregator (default: aggregator.listen)")
+    args = parser.parse_args()
+
+    config = load_config()
+    if args.command == 'serve':
+        aggregator = Aggregator(config, listen=args.listen)
+        asyncio.run(aggregator.run(args.duration))
+    elif args.command == 'node':
+        options = config.get('node', {})
+        clock = time.monotonic
+        if args.clock_offset or args.clock_drift_ppm:
+            clock = SkewedClock(args.clock_offset, args.clock_drift_ppm)
+        run_node(config, args.connect or options.get('aggregator', 'tcp://127.0.0.1:5560'),
+                 args.name or options.get('name') or socket.gethostname(), args.rate, args.duration, clock)
+    else:
+        simulate(config, args.nodes, args.duration, args.rate, args.listen)
+
+
+if __name__ == "__main__":
+    main()
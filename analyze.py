@@ -1,113 +1,298 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
 import sys
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
 import yaml
-from datetime import datetime
-from plot_realtime import get_latest_csv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from csvtail import latest_run as get_latest_csv
+from catalog import RunCatalog
 from compute import calibrate_df
+from onlinestats import ColumnStats
+from render import plot_options, render_grid, render_worker, setup as setup_rendering
+from runlog import read_runlog, iter_runlog
+
+STAT_COLUMNS = ['Q_dot', 'heater_power', 'pump_power', 'efficiency']
+CACHE_FILE = "analysis_cache.json"
+SUMMARY_FILE = "analysis_summary.csv"
+
 
 # -----------------------------------------------------------------------------
-# Loads CSV file specified in CLI or defaults to latest.csv
+# Loads a run log (CSV, seekable .csv.gz or .runlog)
 # -----------------------------------------------------------------------------
-if len(sys.argv) > 1:
-    csv_file = sys.argv[1]
-else:
-    csv_file = get_latest_csv()
+def load_run(path: str, start: float = None, end: float = None) -> pd.DataFrame:
+    """The whole run, or only rows with start <= seconds <= end, read via the time index (timeindex.py)."""
+    if start is not None or end is not None:
+        from timeindex import read_window
+        return read_window(path, start, end)
+    if path.endswith('.runlog'):
+        return read_runlog(path)
+    return pd.read_csv(path)
 
-print(f"Analyzing file: {csv_file}")
 
-try:
-    df = pd.read_csv(csv_file)
-    print("Before calibration:\n", df[['pump_power', 'T1', 'T2', 'T3', 'P_in', 'P_out']].head())
+def iter_run(path: str, chunk_rows: int):
+    """Yield a run log in DataFrame chunks of up to `chunk_rows` rows."""
+    if path.endswith('.runlog'):
+        return iter_runlog(path, chunk_rows)
+    return pd.read_csv(path, chunksize=chunk_rows)
 
-except FileNotFoundError:
-    print(f"Error: File '{csv_file}' not found.")
-    sys.exit(1)
 
-# -----------------------------------------------------------------------------
-# Load calibration from config.yaml
-# -----------------------------------------------------------------------------
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+def output_paths(path: str, start: float = None, end: float = None) -> tuple:
+    """Names of the computed CSV and analysis figure for a run log (or a --from/--to window of it)."""
+    stem = os.path.splitext(path[:-3] if path.endswith('.gz') else path)[0]
+    if start is not None or end is not None:
+        stem += f"_t{'start' if start is None else f'{start:g}'}-{'end' if end is None else f'{end:g}'}"
+    return f"computed_{stem}.csv", f"analysis_grid_{stem}.png"
 
-# -----------------------------------------------------------------------------
-# Seconds processing, no longer needed since logging is now in seconds from T-0
-# -----------------------------------------------------------------------------
-# df['seconds'] = pd.to_datetime(df['seconds'])
-# df['time_only'] = df['seconds'].dt.strftime('%H:%M:%S')
-# analysis_date = df['seconds'].dt.date.iloc[0]
 
 # -----------------------------------------------------------------------------
 # Apply sensor calibrations and compute metrics
 # -----------------------------------------------------------------------------
-df = calibrate_df(df, config)
-print("After calibration:\n", df[['P_in_psi', 'P_out_psi', 'T1_F', 'T2_F', 'T3_F']].head()) # Debug
+def compute_run(df: pd.DataFrame, config: dict) -> pd.DataFrame:
+    df = calibrate_df(df, config)
+
+    # Calculate delta_T
+    if 'fluid_in_F' in df.columns and 'fluid_out_F' in df.columns:
+        df['delta_T'] = df['fluid_in_F'] - df['fluid_out_F']
+    return df
+
+
+def run_statistics(df: pd.DataFrame) -> dict:
+    """Average and maximum of each summary column that has data."""
+    stats = {}
+    for col in STAT_COLUMNS:
+        if col in df.columns and df[col].notna().any():
+            stats[f"{col}_avg"] = float(df[col].mean())
+            stats[f"{col}_max"] = float(df[col].max())
+    return stats
+
+
+def print_statistics(stats: dict) -> None:
+    print("\n=== Statistics ===")
+    for col in STAT_COLUMNS:
+        if f"{col}_avg" in stats:
+            print(f"{col}: avg = {stats[f'{col}_avg']:.2f}, max = {stats[f'{col}_max']:.2f}")
+
+
+def analyze_file(csv_file: str, config: dict, plot: bool = True, verbose: bool = True,
+                 start: float = None, end: float = None) -> dict:
+    """
+    Calibrate one run, save computed_<run>.csv (and the figure), return its statistics.
+    With start/end, only that window of the run is read and analyzed (computed_<run>_t<start>-<end>.csv).
+    """
+    df = load_run(csv_file, start, end)
+    if verbose:
+        print("Before calibration:\n", df[['pump_power', 'T1', 'T2', 'T3', 'P_in', 'P_out']].head())
+
+    df = compute_run(df, config)
+    if verbose:
+        print("After calibration:\n", df[['P_in_psi', 'P_out_psi', 'T1_F', 'T2_F', 'T3_F']].head()) # Debug
+
+    # Export processed data
+    computed_csv, plot_file = output_paths(csv_file, start, end)
+    df.to_csv(computed_csv, index=False)
+    if verbose:
+        print(f"Saved computed data to {computed_csv}")
+
+    stats = run_statistics(df)
+    stats['rows'] = len(df)
+    if verbose:
+        # Output summary into console
+        print_statistics(stats)
+
+    if plot:
+        # Plotting libraries load on first use; --no-plots and stream statistics never pay for them
+        seconds = render_grid(df, plot_file, **plot_options(config))
+        if verbose:
+            print(f"Saved analysis figure to {plot_file} (rendered in {seconds:.2f} s)")
+    return stats
 
-# -----------------------------------------------------------------------------
-# Calculate delta_T
-# -----------------------------------------------------------------------------
-if 'fluid_in_F' in df.columns and 'fluid_out_F' in df.columns:
-    df['delta_T'] = df['fluid_in_F'] - df['fluid_out_F']
 
 # -----------------------------------------------------------------------------
-# Data processing
+# Streaming mode: chunk by chunk with running statistics, for runs too big for RAM
 # -----------------------------------------------------------------------------
-# Export processed data
-computed_csv = f"computed_{csv_file}"
-df.to_csv(computed_csv, index=False)
-print(f"Saved computed data to {computed_csv}")
+def analyze_stream(csv_file: str, config: dict, chunk_rows: int = 50000, verbose: bool = True) -> dict:
+    """
+    Calibrate a run in chunks, appending to computed_<run>.csv as it goes.
+    Memory use depends on `chunk_rows`, not on run length. No figure is drawn.
+    """
+    computed_csv, _ = output_paths(csv_file)
+    column_stats = ColumnStats()
+    rows = 0
+    for i, chunk in enumerate(iter_run(csv_file, chunk_rows)):
+        raw_columns = list(chunk.columns)
+        chunk = compute_run(chunk, config)
+        chunk.to_csv(computed_csv, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+        column_stats.update(chunk)
+        rows += len(chunk)
+    if verbose:
+        print(f"Saved computed data to {computed_csv} ({rows} rows in chunks of {chunk_rows})")
+
+    stats = {'rows': rows}
+    for col in STAT_COLUMNS:
+        if col in column_stats:
+            stats[f"{col}_avg"] = float(column_stats[col].mean)
+            stats[f"{col}_max"] = float(column_stats[col].max)
+
+    if verbose:
+        print_statistics(stats)
+        derived = [col for col in column_stats.stats if col not in raw_columns or col in STAT_COLUMNS]
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print("\n=== Running statistics ===")
+            print(column_stats.table().loc[derived].round(3))
+    return stats
 
-# Output summary into console
-print("\n=== Statistics ===")
-for col in ['Q_dot', 'heater_power', 'pump_power', 'efficiency']:
-    if col in df.columns and df[col].notna().any():
-        print(f"{col}: avg = {df[col].mean():.2f}, max = {df[col].max():.2f}")
 
 # -----------------------------------------------------------------------------
-# Plot setup
+# Batch mode: all runs in a process pool, skipping runs whose results are cached
 # -----------------------------------------------------------------------------
-sns.set(style="whitegrid")
-fig, axs = plt.subplots(2, 2, figsize=(14, 10))
-
-# Plot 1: Temperature vs Time
-for col in ['T1_F', 'T2_F', 'T3_F', 'fluid_in_F', 'fluid_out_F']:
-    if col in df.columns:
-        axs[0,0].plot(df['seconds'], df[col], label=col)
-axs[0,0].set_title("Temperature vs Time")
-axs[0,0].set_ylabel("°C")
-axs[0,0].legend()
-
-# Plot 2: Pressure vs Time
-for col in ['P_in_psi', 'P_out_psi', 'delta_p']:
-    if col in df.columns:
-        axs[0,1].plot(df['seconds'], df[col], label=col)
-axs[0,1].set_title("Pressure vs Time")
-axs[0,1].set_ylabel("Pressure (Pa)")
-axs[0,1].legend()
-
-# Plot 3: Heat power vs pump power ( + efficiency)
-if 'Q_dot' in df.columns and 'pump_power_calc' in df.columns:
-    sc = axs[1,0].scatter(df['pump_power_calc'], df['heater_power'], alpha=0.6)
-    axs[1,0].set_title("Heat Transfer Rate and Efficiency")
-    axs[1,0].set_xlabel("Pump Power (W)")
-    axs[1,0].set_ylabel("Heat Transfer Rate (W)")
-    fig.colorbar(sc, ax=axs[1,0], label="Efficiency")
-
-# Plot 4: Efficiency over time
-if 'efficiency' in df.columns:
-    axs[1,1].plot(df['seconds'], df['efficiency'])
-    axs[1,1].set_title("System Efficiency Over Time")
-    axs[1,1].set_ylabel("Efficiency")
-
-for ax in axs.flat:
-    ax.set_xlabel("Time")
-    ax.tick_params(axis='x', rotation=30)
-
-# Show plots
-plt.tight_layout()
-plot_file = f"analysis_grid_{csv_file.replace('.csv','')}.png"
-plt.savefig(plot_file, dpi=300)
-print(f"Saved analysis figure to {plot_file}")
-# plt.show()
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_hash(config: dict) -> str:
+    """Hash of the config sections that affect computed results."""
+    relevant = {'calibration': config.get('calibration'), 'fluid_cp': config.get('fluid_cp')}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_cache() -> dict:
+    try:
+        with open(CACHE_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_cache(cache: dict) -> None:
+    tmp = f"{CACHE_FILE}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, CACHE_FILE)
+
+
+def _analyze_worker(args: tuple) -> dict:
+    path, config = args
+    return analyze_file(path, config, plot=False, verbose=False)
+
+
+def analyze_batch(paths: list, config: dict, jobs: int = None, plot: bool = True, force: bool = False) -> pd.DataFrame:
+    """Analyze `paths` in parallel; unchanged runs reuse cached statistics. Returns the summary table."""
+    cache = load_cache()
+    calibration = config_hash(config)
+    results, todo, keys = {}, [], {}
+    for path in paths:
+        entry = cache.get(path)
+        stat = os.stat(path)
+        # Unchanged size and mtime means unchanged content; only re-hash when they differ
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            raw = entry['file_hash']
+        else:
+            raw = file_hash(path)
+        outputs_exist = all(os.path.exists(p) for p in output_paths(path)[:1 + plot])
+        if not force and entry and (entry['file_hash'], entry['config_hash']) == (raw, calibration) and outputs_exist:
+            results[path] = entry['stats']
+            entry['mtime'] = stat.st_mtime
+        else:
+            keys[path] = (raw, stat)
+            todo.append(path)
+
+    print(f"{len(paths)} runs: {len(paths) - len(todo)} cached, {len(todo)} to analyze")
+    catalog = RunCatalog()
+    # One pool for both stages: a run's figure is queued as soon as its computed CSV is written,
+    # so rendering overlaps with the analysis of later runs
+    options = plot_options(config)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=setup_rendering if plot else None) as pool:
+        analyses = {pool.submit(_analyze_worker, (p, config)): p for p in todo}
+        renders = {}
+        for future in as_completed(analyses):
+            path = analyses[future]
+            stats = future.result()
+            raw, stat = keys[path]
+            results[path] = stats
+            cache[path] = {'file_hash': raw, 'config_hash': calibration, 'size': stat.st_size,
+                           'mtime': stat.st_mtime, 'stats': stats}
+            computed_csv, plot_file = output_paths(path)
+            catalog.add_derived(path, 'computed', computed_csv)
+            if plot:
+                renders[pool.submit(render_worker, (computed_csv, plot_file, options))] = path
+            else:
+                print(f"  {path}")
+        for future in as_completed(renders):
+            path = renders[future]
+            catalog.add_derived(path, 'analysis_grid', output_paths(path)[1])
+            print(f"  {path}  (figure {future.result():.2f} s)")
+    save_cache(cache)
+
+    summary = pd.DataFrame.from_dict(results, orient='index')
+    summary.index.name = 'run'
+    summary = summary.sort_index()
+    summary.to_csv(SUMMARY_FILE)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Calibrate and plot a logged run.")
+    parser.add_argument('file', nargs='?', help="run log to analyze (default: latest run)")
+    parser.add_argument('--batch', nargs='?', const='data_*.csv', metavar='GLOB',
+                        help="analyze every run matching GLOB (default: data_*.csv) in parallel")
+    parser.add_argument('--jobs', type=int, help="worker processes for --batch (default: all cores)")
+    parser.add_argument('--no-plots', action='store_true', help="skip the analysis figures in --batch")
+    parser.add_argument('--force', action='store_true', help="ignore cached results in --batch")
+    parser.add_argument('--stream', action='store_true',
+                        help="process the run in chunks with running statistics (constant memory, no figure)")
+    parser.add_argument('--chunk-rows', type=int, default=50000, help="rows per chunk for --stream")
+    parser.add_argument('--from', dest='start', type=float, metavar='SECONDS',
+                        help="analyze only from this many seconds into the run (seeks via the time index)")
+    parser.add_argument('--to', dest='end', type=float, metavar='SECONDS', help="analyze only up to this time")
+    args = parser.parse_args()
+    window = args.start is not None or args.end is not None
+    if window and (args.batch or args.stream):
+        parser.error("--from/--to apply to a single run and cannot be combined with --batch or --stream")
+
+    # -----------------------------------------------------------------------------
+    # Load calibration from config.yaml
+    # -----------------------------------------------------------------------------
+    with open("config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+
+    if args.batch:
+        paths = sorted(glob.glob(args.batch))
+        summary = analyze_batch(paths, config, jobs=args.jobs, plot=not args.no_plots, force=args.force)
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 250):
+            print(summary.round(2))
+        print(f"Saved summary to {SUMMARY_FILE}")
+        return
+
+    # -----------------------------------------------------------------------------
+    # Loads CSV file specified in CLI or defaults to the latest run
+    # -----------------------------------------------------------------------------
+    csv_file = args.file or get_latest_csv()
+    print(f"Analyzing file: {csv_file}")
+
+    try:
+        if args.stream:
+            analyze_stream(csv_file, config, chunk_rows=args.chunk_rows)
+        else:
+            analyze_file(csv_file, config, start=args.start, end=args.end)
+    except FileNotFoundError:
+        print(f"Error: File '{csv_file}' not found.")
+        sys.exit(1)
+
+    if window:
+        return  # Window outputs are not the run's derived files
+    computed_csv, plot_file = output_paths(csv_file)
+    catalog = RunCatalog()
+    catalog.add_derived(csv_file, 'computed', computed_csv)
+    if not args.stream:
+        catalog.add_derived(csv_file, 'analysis_grid', plot_file)
+
+
+if __name__ == "__main__":
+    main()
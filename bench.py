@@ -0,0 +1,240 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import yaml
+
+# -----------------------------------------------------------------------------
+# Pipeline benchmarks: acquisition, calibration, offline analysis, live plotting.
+# Runs anywhere with the CSVs in this directory and fake_spi, writes the results
+# as JSON and compares them with a saved baseline.
+# -----------------------------------------------------------------------------
+RESULTS_FILE = "bench_results.json"
+BASELINE_FILE = "bench_baseline.json"
+
+os.environ.setdefault("COLDPLAYT_FAKE_SPI", "1")  # Before collect opens any device
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+def load_config() -> dict:
+    with open("config.yaml") as f:
+        return yaml.safe_load(f)
+
+
+def largest_run(pattern: str = "data_*.csv") -> str:
+    files = glob.glob(pattern)
+    if not files:
+        raise FileNotFoundError(f"No run logs matching {pattern} to benchmark with")
+    return max(files, key=os.path.getsize)
+
+
+def result(value: float, unit: str, higher_is_better: bool, **details) -> dict:
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better, **details}
+
+
+def throughput(func, min_time_s: float, rounds: int = 5) -> float:
+    """Calls per second of func(): the best of `rounds` timed rounds, together at least min_time_s."""
+    func()  # Warm-up (opens devices, fills caches)
+    best = 0.0
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time_s / rounds:
+                break
+        best = max(best, calls / elapsed)
+    return best
+
+
+# --- Acquisition ---
+def bench_collect(config: dict, min_time_s: float) -> dict:
+    from collect import AcquisitionPlan, collect_data
+
+    plan = AcquisitionPlan(config)
+    return {
+        'collect_data_samples_per_s': result(throughput(lambda: collect_data(config), min_time_s), "samples/s", True),
+        'plan_read_samples_per_s': result(throughput(plan.read, min_time_s), "samples/s", True),
+    }
+
+
+# --- Calibration ---
+def bench_calibrate(config: dict, min_time_s: float) -> dict:
+    import pandas as pd
+    from compute import calibrate_df
+
+    path = largest_run()
+    df = pd.read_csv(path)
+    calls_per_s = throughput(lambda: calibrate_df(df.copy(), config), min_time_s)
+    return {'calibrate_df_rows_per_s': result(calls_per_s * len(df), "rows/s", True, file=path, rows=len(df))}
+
+
+# --- Offline analysis, as a user runs it ---
+def bench_analyze(repeat: int) -> dict:
+    """Wall time and peak RSS of `python analyze.py <largest run>`, in a scratch directory."""
+    path = largest_run()
+    script = os.path.abspath("analyze.py")
+    times, peaks = [], []
+    with tempfile.TemporaryDirectory() as scratch:
+        # analyze.py writes computed CSVs, figures and runs.json next to the run
+        shutil.copy("config.yaml", scratch)
+        shutil.copy(path, scratch)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            proc = subprocess.Popen([sys.executable, script, os.path.basename(path)], cwd=scratch,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            _, status, usage = os.wait4(proc.pid, 0)
+            times.append(time.perf_counter() - start)
+            if status != 0:
+                raise RuntimeError(f"analyze.py failed:\n{proc.stderr.read().decode()}")
+            proc.stderr.close()
+            peaks.append(usage.ru_maxrss / 1024)  # KiB on Linux
+    return {
+        'analyze_seconds': result(statistics.median(times), "s", False, file=path),
+        'analyze_peak_rss_mb': result(max(peaks), "MiB", False, file=path),
+    }
+
+
+# --- Live plot ---
+class ReplayReader:
+    """Stands in for LiveSource: each poll appends the next rows of a logged run to the window."""
+
+    using_bus = False
+
+    def __init__(self, config: dict, path: str, window: int, rows_per_poll: int = 1):
+        import pandas as pd
+
+        self.config = config
+        self.window = window
+        self.rows_per_poll = rows_per_poll
+        self.raw = pd.read_csv(path)
+        self.position = 0
+        self.samples = pd.DataFrame()
+
+    def poll(self):
+        from csvtail import append_calibrated
+
+        new_rows = self.raw.iloc[self.position:self.position + self.rows_per_poll]
+        self.position = (self.position + self.rows_per_poll) % len(self.raw)
+        self.samples = append_calibrated(self.samples, new_rows.reset_index(drop=True), self.window, self.config)
+        return self.samples
+
+
+def bench_plot(config: dict, frames: int) -> dict:
+    """Time per Dashboard.animate() call with one new sample per frame, as with live data."""
+    from plot_realtime import Dashboard
+
+    window = config.get('plot', {}).get('window', 100)
+    reader = ReplayReader(config, largest_run(), window)
+    dashboard = Dashboard(config, reader=reader)
+    dashboard.fig.canvas.draw()
+    for i in range(window):  # Fill the window first
+        dashboard.animate(i)
+
+    frame_ms = []
+    for i in range(frames):
+        start = time.perf_counter()
+        dashboard.animate(i)
+        frame_ms.append(1000 * (time.perf_counter() - start))
+    frame_ms.sort()
+    return {
+        'animate_ms_median': result(statistics.median(frame_ms), "ms", False, frames=frames),
+        'animate_ms_p95': result(frame_ms[int(0.95 * (len(frame_ms) - 1))], "ms", False, frames=frames),
+    }
+
+
+BENCHMARKS = ['collect', 'calibrate', 'analyze', 'plot']
+
+
+def run(only: list, quick: bool = False) -> dict:
+    config = load_config()
+    min_time_s = 0.5 if quick else 2.0
+    results = {}
+    for name in only:
+        print(f"Running {name}...", flush=True)
+        if name == 'collect':
+            results.update(bench_collect(config, min_time_s))
+        elif name == 'calibrate':
+            results.update(bench_calibrate(config, min_time_s))
+        elif name == 'analyze':
+            results.update(bench_analyze(repeat=1 if quick else 3))
+        elif name == 'plot':
+            results.update(bench_plot(config, frames=50 if quick else 300))
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpus)",
+        'results': results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Print each metric against the baseline; return the names that got worse by more than `tolerance`."""
+    regressions = []
+    print(f"\n{'metric':30} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, now in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None or not before['value']:
+            print(f"{name:30} {'-':>12} {now['value']:12.4g} {'new':>8}  {now['unit']}")
+            continue
+        change = now['value'] / before['value'] - 1
+        worse = -change if now['higher_is_better'] else change
+        flag = ""
+        if worse > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:30} {before['value']:12.4g} {now['value']:12.4g} {100 * change:+7.1f}%  {now['unit']}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark acquisition, calibration, analysis and plotting.")
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument('--quick', action='store_true', help="shorter runs, noisier numbers")
+    parser.add_argument('--output', default=RESULTS_FILE, help=f"results file (default: {RESULTS_FILE})")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help=f"baseline to compare with (default: {BASELINE_FILE})")
+    parser.add_argument('--save-baseline', action='store_true', help="also store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    only = [name for name in args.only.split(',') if name]
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    current = run(only, quick=args.quick)
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=1)
+    print(f"Saved results to {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(current, json.load(f), args.tolerance)
+    else:
+        for name, r in current['results'].items():
+            print(f"{name:30} {r['value']:12.4g}  {r['unit']}")
+
+    if args.save_baseline:
+        shutil.copy(args.output, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) worse than the baseline by more than {100 * args.tolerance:.0f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
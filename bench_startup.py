@@ -0,0 +1,59 @@
+import os
+import statistics
+import subprocess
+import sys
+
+# -----------------------------------------------------------------------------
+# Cold-start time of each entry point: importing the module in a fresh interpreter.
+# Imports must be side-effect free (no SPI, no config reads, no windows) for this to
+# measure only load time, so it also catches modules that regress on that.
+# -----------------------------------------------------------------------------
+ENTRY_POINTS = ["main", "collect", "compute", "analyze", "plot_realtime",
+                "runlog", "samplebus", "catalog", "csvtail"]
+HEAVY_MODULES = ["pandas", "matplotlib", "seaborn", "spidev"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def time_import(module: str, repeat: int = 5) -> tuple:
+    """Median seconds to import `module` in a new interpreter, and the heavy modules it pulled in."""
+    env = dict(os.environ, COLDPLAYT_FAKE_SPI="1", MPLBACKEND="Agg")
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                             capture_output=True, text=True, env=env, check=True).stdout.split()
+        times.append(float(out[0]))
+    loaded = out[1] if len(out) > 1 else ""
+    return statistics.median(times), loaded
+
+
+def import_profile(module: str, top: int = 10) -> list:
+    """Slowest imports (cumulative microseconds) from python -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=dict(os.environ, COLDPLAYT_FAKE_SPI="1"))
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.replace("import time:", "").split("|")]
+        if len(parts) == 3 and parts[1].isdigit():
+            rows.append((int(parts[1]), parts[2]))
+    return sorted(rows, reverse=True)[:top]
+
+
+# --- Run from command line ---
+if __name__ == '__main__':
+    # python bench_startup.py [module ...] [--profile]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    modules = args or ENTRY_POINTS
+    print(f"{'module':15} {'import ms':>10}  heavy dependencies loaded")
+    for module in modules:
+        seconds, loaded = time_import(module)
+        print(f"{module:15} {1000 * seconds:10.1f}  {loaded or '-'}")
+        if "--profile" in sys.argv:
+            for cumulative_us, name in import_profile(module):
+                print(f"{'':15} {cumulative_us / 1000:10.1f}  {name}")
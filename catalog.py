@@ -0,0 +1,198 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+CATALOG_FILE = "runs.json"
+
+# data_YYYY-MM-DD_HH.MM.SS.csv, as named by main.py
+RUN_NAME = re.compile(r"data_(\d{4}-\d{2}-\d{2})_(\d{2})\.(\d{2})\.(\d{2})")
+
+
+def config_hash(config: dict) -> str:
+    """Short, stable fingerprint of a config snapshot."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+# Run setting -> the config.yaml calibration key it was taken from
+SETTINGS = {'heater_power_w': 'heater_power', 'pump_power_w': 'pump_power', 'flow_rate_m3s': 'flow_rate_m3s'}
+
+
+def run_settings(config: dict) -> dict:
+    """Rig settings a run was taken with that the log itself does not record."""
+    calibration = config.get('calibration', {})
+    return {setting: calibration.get(key) for setting, key in SETTINGS.items()}
+
+
+def apply_settings(config: dict, settings: Optional[dict]) -> dict:
+    """`config` with a run's recorded settings in place of the current ones, to calibrate that run."""
+    recorded = {SETTINGS[k]: v for k, v in (settings or {}).items() if k in SETTINGS and v is not None}
+    if not recorded:
+        return config
+    return {**config, 'calibration': {**config.get('calibration', {}), **recorded}}
+
+
+class RunCatalog:
+    """
+    Persistent index of runs in runs.json, kept up to date by main.py and analyze.py.
+
+    Each run records its log file, start/stop time, row count, geometry, config hash
+    and derived artifacts (computed CSV, analysis figure). The latest run and runs by
+    geometry or date are looked up from in-memory indexes without scanning the directory.
+    """
+
+    def __init__(self, path: str = CATALOG_FILE):
+        self.path = path
+        self.runs = {}
+        self.latest_file = None
+        self._mtime = None
+        self._by_geometry = defaultdict(list)
+        self._by_date = defaultdict(list)
+        self.refresh()
+
+    # --- Loading and saving ---
+    def refresh(self) -> None:
+        """Reload from disk if another process updated the catalog."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path) as f:
+            data = json.load(f)
+        self._mtime = mtime
+        self.runs = data.get('runs', {})
+        self.latest_file = data.get('latest')
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._by_geometry.clear()
+        self._by_date.clear()
+        for run in self.runs.values():
+            self._by_geometry[run.get('geometry')].append(run['file'])
+            self._by_date[(run.get('start') or '')[:10]].append(run['file'])
+
+    def save(self) -> None:
+        # Write-then-rename so readers never see a half-written catalog
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({'latest': self.latest_file, 'runs': self.runs}, f, indent=1)
+        os.replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    # --- Updates ---
+    def _entry(self, filename: str) -> dict:
+        run = self.runs.get(filename)
+        if run is None:
+            match = RUN_NAME.search(os.path.basename(filename))
+            start = f"{match[1]}T{match[2]}:{match[3]}:{match[4]}" if match else None
+            run = self.runs[filename] = {
+                'file': filename, 'start': start, 'stop': None, 'rows': None,
+                'geometry': None, 'config_hash': None, 'derived': {},
+            }
+            self._reindex()
+        return run
+
+    def start_run(self, filename: str, config: dict) -> None:
+        self.refresh()
+        run = self._entry(filename)
+        if run['start'] is None:
+            run['start'] = datetime.now().isoformat(timespec='seconds')
+        run['geometry'] = config.get('geometry')
+        run['config_hash'] = config_hash(config)
+        run['settings'] = run_settings(config)
+        self._reindex()
+        self.latest_file = filename
+        self.save()
+
+    def finish_run(self, filename: str, rows: int, steady_state: Optional[dict] = None) -> None:
+        self.refresh()
+        run = self._entry(filename)
+        run['stop'] = datetime.now().isoformat(timespec='seconds')
+        run['rows'] = rows
+        if steady_state is not None:
+            run['steady_state'] = steady_state  # rolling.LiveMetrics.steady_summary()
+        self.save()
+
+    def add_derived(self, filename: str, kind: str, path: str) -> None:
+        """Record an artifact made from a run, e.g. kind='computed' or 'analysis_grid'."""
+        self.refresh()
+        self._entry(filename)['derived'][kind] = path
+        self.save()
+
+    # --- Queries ---
+    def latest(self) -> Optional[str]:
+        self.refresh()
+        return self.latest_file
+
+    def find(self, geometry: Optional[str] = None, date: Optional[str] = None) -> list:
+        """Runs matching a geometry and/or a start date (YYYY-MM-DD), oldest first."""
+        self.refresh()
+        if geometry is not None and date is not None:
+            files = [f for f in self._by_geometry.get(geometry, []) if f in self._by_date.get(date, [])]
+        elif geometry is not None:
+            files = self._by_geometry.get(geometry, [])
+        elif date is not None:
+            files = self._by_date.get(date, [])
+        else:
+            files = list(self.runs)
+        return sorted((self.runs[f] for f in files), key=lambda run: run.get('start') or '')
+
+    # --- One-off import of runs logged before the catalog existed ---
+    def rebuild(self, directory: str = ".") -> int:
+        """Scan `directory` once for data_* logs and their derived files. Returns runs added."""
+        added = 0
+        logs = sorted(glob.glob(os.path.join(directory, "data_*.csv")) + glob.glob(os.path.join(directory, "data_*.runlog")),
+                      key=os.path.getmtime)
+        for path in logs:
+            filename = os.path.relpath(path, ".")
+            stem = os.path.splitext(os.path.basename(filename))[0]
+            if filename not in self.runs:
+                added += 1
+            run = self._entry(filename)
+            if 'settings' not in run and filename.endswith(".runlog"):
+                from runlog import read_header
+                snapshot = read_header(path)[0].get('config')
+                if snapshot:
+                    run['settings'] = run_settings(snapshot)
+            if run['rows'] is None and filename.endswith(".csv"):
+                with open(path, "rb") as f:
+                    run['rows'] = max(sum(1 for _ in f) - 1, 0)
+            for kind, derived in (('computed', f"computed_{stem}.csv"), ('analysis_grid', f"analysis_grid_{stem}.png")):
+                if os.path.exists(os.path.join(directory, derived)):
+                    run['derived'][kind] = os.path.relpath(os.path.join(directory, derived), ".")
+        if logs and (self.latest_file is None or not os.path.exists(self.latest_file)):
+            self.latest_file = os.path.relpath(logs[-1], ".")
+        self.save()
+        return added
+
+
+# --- Run from command line ---
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ('rebuild', 'latest', 'list'):
+        print("Usage: python catalog.py rebuild                          # Index existing data_* files")
+        print("       python catalog.py latest")
+        print("       python catalog.py list [geometry] [YYYY-MM-DD]")
+        sys.exit(1)
+
+    catalog = RunCatalog()
+    if sys.argv[1] == 'rebuild':
+        print(f"Added {catalog.rebuild()} runs to {catalog.path}")
+    elif sys.argv[1] == 'latest':
+        print(catalog.latest())
+    else:
+        geometry = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != '-' else None
+        date = sys.argv[3] if len(sys.argv) > 3 else None
+        for run in catalog.find(geometry, date):
+            print(f"{run['file']:40} {run.get('start') or '':20} rows={run.get('rows')} "
+                  f"geometry={run.get('geometry')} derived={', '.join(run['derived'].values())}")
+            steady = run.get('steady_state')
+            if steady and steady['periods']:
+                averages = ", ".join(f"{k}={v:.3g}" for k, v in steady['averages'].items())
+                print(f"{'':40} steady {steady['steady_s']:.0f} s: {averages}")
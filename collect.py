@@ -1,21 +1,73 @@
-import spidev
+import os
 import time
 import yaml
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-# Attempt to initialize SPI devices
-spi_0 = spidev.SpiDev()
-spi_0.open(0, 0)
-spi_0.max_speed_hz = 1350000
+import fake_spi
 
 try:
-    spi_1 = spidev.SpiDev()
-    spi_1.open(0, 1)
-    spi_1.max_speed_hz = 1350000
-    second_chip_available = True
-except FileNotFoundError:
-    print("Warning: SPI device 0.1 not available. Falling back to single-chip mode.")
-    spi_1 = None
-    second_chip_available = False
+    import spidev
+except ImportError:
+    spidev = None
+
+SPI_MAX_SPEED_HZ = 1350000
+
+
+def open_spi(device: int, max_speed_hz: int = SPI_MAX_SPEED_HZ):
+    """
+    Open SPI0.<device>. Uses fake_spi.FakeSpiDev only when COLDPLAYT_FAKE_SPI is set
+    (e.g. on a development machine), so a run can never log simulated readings by accident.
+    """
+    if os.environ.get("COLDPLAYT_FAKE_SPI"):
+        spi = fake_spi.FakeSpiDev()
+    elif spidev is None:
+        raise ImportError("spidev is not installed; set COLDPLAYT_FAKE_SPI=1 to use simulated MCP3008s")
+    else:
+        spi = spidev.SpiDev()
+    spi.open(0, device)
+    spi.max_speed_hz = max_speed_hz
+    return spi
+
+
+# SPI devices are opened on first use, so importing this module touches no hardware
+spi_0 = None
+spi_1 = None
+second_chip_available = False
+_chip_pool = None  # Reads chip 1 while the calling thread reads chip 0
+
+
+def open_devices() -> None:
+    """Open SPI0.0 and, if present, SPI0.1. Safe to call repeatedly."""
+    global spi_0, spi_1, second_chip_available, _chip_pool
+    if spi_0 is not None:
+        return
+
+    # Attempt to initialize SPI devices
+    spi_0 = open_spi(0)
+
+    try:
+        spi_1 = open_spi(1)
+        second_chip_available = True
+        _chip_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spi0.1")
+    except FileNotFoundError:
+        print("Warning: SPI device 0.1 not available. Falling back to single-chip mode.")
+        spi_1 = None
+        second_chip_available = False
+
+
+def use_devices(chip_0, chip_1=None) -> None:
+    """
+    Read from the given spidev-like objects instead of opening SPI0.0/SPI0.1,
+    e.g. fake_spi.FakeSpiDev instances wired to a simulation. Call before compiling a plan.
+    """
+    global spi_0, spi_1, second_chip_available, _chip_pool
+    spi_0 = chip_0
+    spi_1 = chip_1
+    second_chip_available = chip_1 is not None
+    if second_chip_available and _chip_pool is None:
+        _chip_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spi0.1")
 
 
 def read_adc_channel(channel: int) -> int | None:
@@ -31,6 +83,7 @@ def read_adc_channel(channel: int) -> int | None:
     if channel < 0 or channel > 15:
         raise ValueError(f"Channel must be in range 0–15, got {channel}")
 
+    open_devices()
     if channel < 8:
         spi = spi_0
         chip_channel = channel
@@ -40,9 +93,72 @@ def read_adc_channel(channel: int) -> int | None:
         spi = spi_1
         chip_channel = channel - 8
 
-    adc = spi.xfer2([1, (8 + chip_channel) << 4, 0])
-    raw_value = ((adc[1] & 3) << 8) + adc[2]
-    return raw_value
+    value = decode_frame(spi.xfer2(mcp3008_command(chip_channel)))
+    return None if value == MISSING else value
+
+
+# -----------------------------------------------------------------------------
+# Batched reads: every configured channel exactly once per sample
+# -----------------------------------------------------------------------------
+def mcp3008_command(chip_channel: int) -> list:
+    """Single-ended read command for one MCP3008 channel (0–7)."""
+    return [1, (8 + chip_channel) << 4, 0]
+
+
+MISSING = 0xFFFF  # Unconnected sensor; same sentinel as runlog.MISSING
+NULL_BIT = 0x04  # Driven low by an MCP3008 before B9; high when nothing answers (MISO floating)
+
+
+def decode_frame(frame: list) -> int:
+    """10-bit result from a 3-byte MCP3008 response frame, or MISSING if no conversion was returned."""
+    if frame[1] & NULL_BIT:
+        return MISSING
+    return ((frame[1] & 3) << 8) + frame[2]
+
+
+def read_chip(spi, chip_channels: list, packed: bool = False) -> list:
+    """
+    Read several channels from one MCP3008, in order.
+
+    With packed=True all command frames go out in a single xfer2 buffer. The
+    MCP3008 only starts a new conversion after CS is raised, so this is for
+    ADCs (or CS wiring) that tolerate it; the default sends one frame per call.
+    """
+    if packed:
+        response = spi.xfer2([byte for ch in chip_channels for byte in mcp3008_command(ch)])
+        return [decode_frame(response[i:i + 3]) for i in range(0, len(response), 3)]
+    return [decode_frame(spi.xfer2(mcp3008_command(ch))) for ch in chip_channels]
+
+
+def read_channels(channels, packed: bool = False, parallel: bool = True) -> dict:
+    """
+    Read each distinct channel (0–15) once and return {channel: raw_value}.
+    Channels on chip 1 read as None when it is not connected, as does any channel
+    that returned no conversion. Chip 1 is read
+    on a worker thread while chip 0 is read here, unless parallel=False.
+    """
+    chip_0 = sorted({ch for ch in channels if ch < 8})
+    chip_1 = sorted({ch for ch in channels if ch >= 8})
+    for ch in chip_0 + chip_1:
+        if ch < 0 or ch > 15:
+            raise ValueError(f"Channel must be in range 0–15, got {ch}")
+
+    open_devices()
+    values = {}
+    pending = None
+    if chip_1:
+        if not second_chip_available:
+            values.update(dict.fromkeys(chip_1))
+        elif parallel and chip_0:
+            pending = _chip_pool.submit(read_chip, spi_1, [ch - 8 for ch in chip_1], packed)
+        else:
+            values.update(zip(chip_1, read_chip(spi_1, [ch - 8 for ch in chip_1], packed)))
+
+    if chip_0:
+        values.update(zip(chip_0, read_chip(spi_0, chip_0, packed)))
+    if pending is not None:
+        values.update(zip(chip_1, pending.result()))
+    return {ch: None if value == MISSING else value for ch, value in values.items()}
 
 
 def load_config(config_path: str = "config.yaml") -> dict:
@@ -51,64 +167,186 @@ def load_config(config_path: str = "config.yaml") -> dict:
         return yaml.safe_load(file)
 
 
-def collect_data(config: dict) -> dict:
+def is_channel(channel) -> bool:
+    """True for a usable channel number ("None"/None placeholders in config.yaml are not)."""
+    return isinstance(channel, int) and not isinstance(channel, bool)
+
+
+def sensor_channels(config: dict) -> dict:
+    """{label: channel or None} for every sensor in config.yaml, in the order collect_data reports them."""
+    sensors = config['sensors']
+    labels = {
+        **sensors.get('thermistors', {}),
+        **sensors.get('pressure', {}),
+        'heater_power': sensors.get('heater_power'),
+        'pump_power': sensors.get('pump_power'),
+    }
+    labels.setdefault('fluid_in', None)
+    labels.setdefault('fluid_out', None)
+    return labels
+
+
+# -----------------------------------------------------------------------------
+# Acquisition plan: config resolved once, then one preallocated row per sample
+# -----------------------------------------------------------------------------
+
+
+class AcquisitionPlan:
     """
-    Collect raw ADC data from thermistors, pressure sensors, and optional power sensors.
-    Returns a dictionary with raw ADC values.
+    The sensor config compiled for the sampling loop. Chip, channel and column
+    positions are resolved once; read() then fills `row`, an array('H') with one
+    raw reading per column (MISSING for sensors that are not connected), in place.
+    np.frombuffer(plan.row, dtype=np.uint16) gives a NumPy view of the same memory.
+
+    Opens the SPI devices, since channels on an absent chip 1 are resolved as missing.
+    With a metrics.Metrics registry, each SPI transfer's latency is recorded per
+    channel (per chip for packed transfers).
     """
-    thermistor_channels = config['sensors'].get('thermistors', {})
-    pressure_channels = config['sensors'].get('pressure', {})
 
-    temperatures = {
-        label: read_adc_channel(channel)
-        for label, channel in thermistor_channels.items()
-    }
+    __slots__ = ('columns', 'missing', 'packed', 'parallel', 'row', '_chip_0', '_chip_1', '_latency_0', '_latency_1')
 
-    pressures = {
-        label: read_adc_channel(channel)
-        for label, channel in pressure_channels.items()
-    }
+    def __init__(self, config: dict, columns=None, metrics=None):
+        labels = sensor_channels(config)
+        columns = tuple(columns if columns is not None else labels)
+        spi_options = config.get('spi', {})
+        open_devices()
 
-    # Optional fluid thermistors
-    fluid_channels = thermistor_channels
-    fluid_in = None
-    if 'fluid_in' in fluid_channels and fluid_channels['fluid_in'] not in [None, "none", "None"]:
-        fluid_in = read_adc_channel(fluid_channels['fluid_in'])
-
-    fluid_out = None
-    if 'fluid_out' in fluid_channels and fluid_channels['fluid_out'] not in [None, "none", "None"]:
-        fluid_out = read_adc_channel(fluid_channels['fluid_out'])
-
-    # Optional heat and pump power sensors
-    heater_power = None
-    if 'heater_power' in config['sensors']:
-        heater_power = read_adc_channel(config['sensors']['heater_power'])
-
-    pump_power = None
-    if 'pump_power' in config['sensors']:
-        pump_power = read_adc_channel(config['sensors']['pump_power'])
-
-    return {
-        **temperatures,
-        **pressures,
-        'fluid_in': fluid_in,
-        'fluid_out': fluid_out,
-        'heater_power': heater_power,
-        'pump_power': pump_power,
-    }
+        # Each distinct channel is read once and copied to every column wired to it
+        slots = {}
+        for i, label in enumerate(columns):
+            ch = labels.get(label)
+            if is_channel(ch):
+                if ch < 0 or ch > 15:
+                    raise ValueError(f"Channel must be in range 0–15, got {ch}")
+                if ch < 8 or second_chip_available:
+                    slots.setdefault(ch, []).append(i)
+
+        chip_channels = (sorted(ch for ch in slots if ch < 8), sorted(ch for ch in slots if ch >= 8))
+
+        def chip_reads(channels):
+            # (command frame, row indices) per channel, in channel order
+            return tuple((mcp3008_command(ch % 8), tuple(slots[ch])) for ch in channels)
+
+        object.__setattr__(self, 'columns', columns)
+        present = {i for indices in slots.values() for i in indices}
+        object.__setattr__(self, 'missing', tuple(i for i in range(len(columns)) if i not in present))
+        object.__setattr__(self, 'packed', spi_options.get('packed_transfers', False))
+        object.__setattr__(self, 'parallel', spi_options.get('parallel_chips', True))
+        object.__setattr__(self, '_chip_0', chip_reads(chip_channels[0]))
+        object.__setattr__(self, '_chip_1', chip_reads(chip_channels[1]))
+        object.__setattr__(self, 'row', array('H', [MISSING]) * len(columns))
+
+        # Latency histograms per transfer, in the order of _chip_0/_chip_1 (None: not instrumented)
+        for chip, channels in enumerate(chip_channels):
+            latency = None
+            if metrics is not None:
+                description = "Duration of one SPI transfer to the MCP3008s"
+                if self.packed:
+                    latency = (metrics.histogram("spi_transfer_seconds", description, channel=f"chip{chip}"),)
+                else:
+                    latency = tuple(metrics.histogram("spi_transfer_seconds", description, channel=ch) for ch in channels)
+            object.__setattr__(self, f'_latency_{chip}', latency)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AcquisitionPlan is immutable; compile a new one for a new config")
+
+    def _read_chip(self, spi, reads: tuple, latency: Optional[tuple] = None) -> None:
+        row = self.row
+        if latency is not None:
+            self._read_chip_timed(spi, reads, latency)
+            return
+        if self.packed:
+            response = spi.xfer2([byte for command, _ in reads for byte in command])
+            for n, (_, indices) in enumerate(reads):
+                high = response[3 * n + 1]
+                value = MISSING if high & NULL_BIT else ((high & 3) << 8) + response[3 * n + 2]
+                for i in indices:
+                    row[i] = value
+            return
+        for command, indices in reads:
+            frame = spi.xfer2(command)
+            high = frame[1]
+            value = MISSING if high & NULL_BIT else ((high & 3) << 8) + frame[2]
+            for i in indices:
+                row[i] = value
+
+    def _read_chip_timed(self, spi, reads: tuple, latency: tuple) -> None:
+        """_read_chip with each transfer timed; kept separate so the uninstrumented path stays lean."""
+        row = self.row
+        clock = time.perf_counter
+        if self.packed:
+            start = clock()
+            response = spi.xfer2([byte for command, _ in reads for byte in command])
+            latency[0].observe(clock() - start)
+            for n, (_, indices) in enumerate(reads):
+                high = response[3 * n + 1]
+                value = MISSING if high & NULL_BIT else ((high & 3) << 8) + response[3 * n + 2]
+                for i in indices:
+                    row[i] = value
+            return
+        for (command, indices), histogram in zip(reads, latency):
+            start = clock()
+            frame = spi.xfer2(command)
+            histogram.observe(clock() - start)
+            high = frame[1]
+            value = MISSING if high & NULL_BIT else ((high & 3) << 8) + frame[2]
+            for i in indices:
+                row[i] = value
+
+    def read(self) -> array:
+        """Take one sample into `row` and return it. Chip 1 is read on a worker thread while chip 0 is read here."""
+        pending = None
+        if self._chip_1:
+            if self.parallel and self._chip_0:
+                pending = _chip_pool.submit(self._read_chip, spi_1, self._chip_1, self._latency_1)
+            else:
+                self._read_chip(spi_1, self._chip_1, self._latency_1)
+        if self._chip_0:
+            self._read_chip(spi_0, self._chip_0, self._latency_0)
+        if pending is not None:
+            pending.result()
+        return self.row
+
+    def values(self) -> list:
+        """The last sample as a list in column order, with None for missing sensors."""
+        values = self.row.tolist()
+        for i in self.missing:
+            values[i] = None
+        if MISSING in values:  # A wired sensor that returned no conversion
+            values = [None if v == MISSING else v for v in values]
+        return values
+
+    def as_dict(self) -> dict:
+        return dict(zip(self.columns, self.values()))
+
+
+def collect_data(config: dict) -> dict:
+    """
+    Collect raw ADC data from thermistors, pressure sensors, and optional power sensors.
+    Returns a dictionary with raw ADC values.
+
+    Compiles a new AcquisitionPlan on every call; sampling loops should keep one plan.
+    """
+    plan = AcquisitionPlan(config)
+    plan.read()
+    return plan.as_dict()
 
 
-# Load config once and provide `read_all()` for other modules
-_config = load_config()
+# Load config and compile the plan once (on first call) and provide `read_all()` for other modules
+_plan = None
 
 def read_all() -> dict:
     """Convenience function for external use."""
-    return collect_data(_config)
+    global _plan
+    if _plan is None:
+        _plan = AcquisitionPlan(load_config())
+    _plan.read()
+    return _plan.as_dict()
 
 
 # Debug / direct run block
 if __name__ == "__main__":
     while True:
-        readings = collect_data(_config)
+        readings = read_all()
         print(readings)
         time.sleep(1)
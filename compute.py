@@ -1,15 +1,24 @@
+from __future__ import annotations
+
+import json
 import numpy as np
-import pandas as pd
-from typing import Union, Optional
+from typing import TYPE_CHECKING, Union, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd  # Imported in calibrate_df only, so scalar use stays light
 
-NumberOrSeries = Union[float, pd.Series]
+NumberOrSeries = Union[float, "pd.Series"]
 
 # -----------------------------------------------------------------------------
 # Converts raw ADC sensor readings to calibrated values
 # -----------------------------------------------------------------------------
-def temp_from_adc(adc_value: Union[int, float], calibration: dict) -> Optional[float]:
+ADC_TABLE_SIZE = 1024  # 10-bit MCP3008 codes 0–1023
+
+
+def thermistor_curve(adc_values: np.ndarray, calibration: dict) -> np.ndarray:
     """
-    Convert an ADC value to temperature (°C) using the Steinhart-Hart equation.
+    Vectorized Steinhart-Hart (beta) conversion of ADC codes to °C.
+    Codes of 0 or >= adc_max give NaN.
     """
     R_fixed = calibration['R_fixed']
     R_nominal = calibration['R_nominal']
@@ -17,20 +26,109 @@ def temp_from_adc(adc_value: Union[int, float], calibration: dict) -> Optional[f
     beta = calibration['beta']
     adc_max = calibration['adc_max']
 
-    if adc_value == 0 or adc_value >= adc_max:
-        return None
+    adc_values = np.asarray(adc_values, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resistance = R_fixed / (adc_max / adc_values - 1)
+        steinhart = np.log(resistance / R_nominal) / beta
+        steinhart += 1.0 / (T_nominal + 273.15)
+        temperature = 1.0 / steinhart - 273.15
+    invalid = (adc_values == 0) | (adc_values >= adc_max)
+    return np.where(invalid, np.nan, temperature)
+
+
+def pressure_curve(adc_values: np.ndarray, calibration: dict) -> np.ndarray:
+    """
+    Vectorized conversion of ADC codes to PSI.
+    Codes outside 0–adc_max give NaN, voltages outside V_min–V_max are clamped.
+    """
+    voltage_ref = calibration['V_ref']
+    adc_max = calibration['adc_max']
+    voltage_min = calibration['V_min']
+    pressure_min = calibration['P_min']
+    pressure_max = calibration['P_max']
+    voltage_max = calibration['V_max']
+
+    adc_values = np.asarray(adc_values, dtype=np.float64)
+    voltage = (adc_values / adc_max) * voltage_ref
+    pressure = ((voltage - voltage_min) / (voltage_max - voltage_min)) * pressure_max
+    pressure = np.where(voltage < voltage_min, pressure_min, pressure)
+    pressure = np.where(voltage > voltage_max, pressure_max, pressure)
+    invalid = ~((adc_values >= 0) & (adc_values <= adc_max))
+    return np.where(invalid, np.nan, pressure)
+
+
+# Calibration blocks in config.yaml that can be turned into lookup tables
+CALIBRATION_CURVES = {
+    'thermistor': thermistor_curve,
+    'pressure_transducer': pressure_curve,
+}
+
+
+class CalibrationEngine:
+    """
+    Precomputes one ADC_TABLE_SIZE-entry lookup table per calibration block,
+    so whole columns are converted by array indexing instead of per-sample calls.
+    """
+
+    def __init__(self, config: dict):
+        self.calibration = config['calibration']
+        codes = np.arange(ADC_TABLE_SIZE, dtype=np.float64)
+        self.tables = {
+            block: curve(codes, self.calibration[block])
+            for block, curve in CALIBRATION_CURVES.items()
+            if block in self.calibration
+        }
 
-    resistance = R_fixed / (adc_max / adc_value - 1)
-    steinhart = np.log(resistance / R_nominal) / beta
-    steinhart += 1.0 / (T_nominal + 273.15)
-    temperature_k = 1.0 / steinhart
-    return temperature_k - 273.15
+    def convert(self, block: str, adc_values) -> np.ndarray:
+        """
+        Convert an array of raw ADC values using the table for `block`.
+        NaN stays NaN; non-integer or out-of-table values fall back to the curve.
+        """
+        table = self.tables[block]
+        adc_values = np.asarray(adc_values, dtype=np.float64)
+        in_table = (adc_values >= 0) & (adc_values < len(table)) & (adc_values == np.floor(adc_values))
+
+        result = np.full(adc_values.shape, np.nan)
+        result[in_table] = table[adc_values[in_table].astype(np.intp)]
+        fallback = ~in_table & ~np.isnan(adc_values)
+        if fallback.any():
+            result[fallback] = CALIBRATION_CURVES[block](adc_values[fallback], self.calibration[block])
+        return result
+
+    def temperature(self, adc_values) -> np.ndarray:
+        return self.convert('thermistor', adc_values)
+
+    def pressure(self, adc_values) -> np.ndarray:
+        return self.convert('pressure_transducer', adc_values)
+
+
+_engine_cache: dict = {}
+
+def get_calibration_engine(config: dict) -> CalibrationEngine:
+    """
+    Return a CalibrationEngine for `config`, reusing tables while the calibration section is unchanged.
+    """
+    key = json.dumps(config['calibration'], sort_keys=True, default=str)
+    engine = _engine_cache.get(key)
+    if engine is None:
+        engine = _engine_cache[key] = CalibrationEngine(config)
+    return engine
+
+
+def temp_from_adc(adc_value: Union[int, float], calibration: dict) -> Optional[float]:
+    """
+    Convert an ADC value to temperature (°C) using the Steinhart-Hart equation.
+    Scalar wrapper around thermistor_curve; returns None for invalid readings.
+    """
+    temperature = float(thermistor_curve(adc_value, calibration))
+    return None if np.isnan(temperature) else temperature
 
 
 def pressure_from_adc(adc_value: Union[int, float], calibration: dict) -> Optional[float]:
     """
     Convert an ADC value to PSI by adjusting for voltage.
     Pressure in the lab is about 14.6 psi fo reference.
+    Scalar wrapper around pressure_curve.
     
     Parameters:
         adc_value: Raw ADC integer (0–1023 for 10-bit)
@@ -43,23 +141,9 @@ def pressure_from_adc(adc_value: Union[int, float], calibration: dict) -> Option
     Returns:
         Pressure in PSI (float), or NaN if invalid
     """
-    voltage_ref = calibration['V_ref']
-    adc_max = calibration['adc_max']
-    voltage_min = calibration['V_min']
-    pressure_min = calibration['P_min']
-    pressure_max = calibration['P_max']
-    voltage_max = calibration['V_max']
-
-    if adc_value is None or not (0 <= adc_value <= adc_max):
+    if adc_value is None:
         return float('nan')
-
-    voltage = (adc_value / adc_max) * voltage_ref
-    if voltage < voltage_min:
-        return pressure_min  # Below range
-    elif voltage > voltage_max:
-        return pressure_max  # Above range
-    else:
-        return ((voltage - voltage_min) / (voltage_max - voltage_min)) * pressure_max
+    return float(pressure_curve(adc_value, calibration))
 
 
 # -----------------------------------------------------------------------------
@@ -120,51 +204,12 @@ def calculate_heat_flux(temp_top: NumberOrSeries, temp_bottom: NumberOrSeries, t
 # -----------------------------------------------------------------------------
 def calibrate_df(df: pd.DataFrame, config: dict) -> pd.DataFrame:
     """
-    Apply all sensor calibrations to raw dataframe.
+    Apply all sensor calibrations to raw dataframe, adding every derived column.
+    The formulas live in rundata.RunData, which computes only the columns asked for.
     """
-    thermistor_cal = config['calibration']['thermistor']
-    pressure_cal = config['calibration']['pressure_transducer']
-    flow_rate = config['calibration'].get('flow_rate_m3s', 0.0001)
-    pump_power = config['calibration'].get('pump_power')
-    heater_power = config['calibration'].get('heater_power')
-    m_dot = 0.01  # kg/s
-    cp = config.get('fluid_cp', 1090)  # Default: Flutec PP1
-
-    df['heater_power_calc'] = heater_power
-
-    for t_col in ['T1', 'T2', 'T3', 'fluid_in', 'fluid_out']:
-        if t_col in df:
-            df[f'{t_col}_F'] = df[t_col].apply(lambda x: temp_from_adc(x, thermistor_cal) if pd.notna(x) else np.nan)
-    
-    for P_col in ['P_in', 'P_out']:
-        if P_col in df:
-            df[f'{P_col}_psi'] = df[P_col].apply(lambda x: pressure_from_adc(x, pressure_cal) if pd.notna(x) else np.nan)
-
-    if 'P_in' in df.columns and 'P_out' in df.columns:
-        df['delta_p'] = df['P_out'] - df['P_in']
-        if 'pump_power' in df.columns:
-            df['pump_power_calc'] = pump_power
-        else:
-            df['pump_power_calc'] = calculate_pump_power(flow_rate, df['delta_p'])
-        df['pump_cost_per_day'] = calculate_pump_cost(df['pump_power_calc'])
-        # if 'heater_power' in df.columns:
-        #     df['Q_dot'] = calculate_heat_transfer(m_dot, cp, df.get('fluid_in_F'), df.get('fluid_out_F'))
-        #     df['efficiency'] = calculate_efficiency(df['heater_power'], df['Q_dot'])
-    else:
-        df['delta_p'] = df['pump_power_calc'] = df['pump_cost_per_day'] = np.nan
-
-    if 'fluid_in' in df.columns and 'fluid_out' in df.columns:
-        # df['Q_dot'] = calculate_heat_transfer(m_dot, cp, df.get('fluid_in_F'), df.get('fluid_out_F'))
-        if 'heater_power' in df.columns:
-            df['Q_dot'] = calculate_heat_transfer(m_dot, cp, df.get('fluid_in_F'), df.get('fluid_out_F'))
-            df['efficiency'] = calculate_efficiency(df['pump_power_calc'], df['Q_dot']) # Using hard-coded heater_power from config.yaml
-        
-
-    # if 'heater_power' in df.columns:
-    #     df['efficiency'] = calculate_efficiency(df['heater_power'], df['Q_dot'])
-    # else:
-    #     # calculate_heating_power_if_not_present()
-    #     df['efficiency'] = calculate_efficiency(df['heater_power'], df['Q_dot'])
-    #     # df['efficiency'] = calculate_efficiency(df.get('heater_power_calc', np.nan), df['Q_dot'])
+    from rundata import RunData  # rundata builds on this module
 
+    run = RunData.from_frame(df, config)
+    for name in run.derived_columns:
+        df[name] = run[name]
     return df
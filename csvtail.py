@@ -0,0 +1,117 @@
+import glob
+import io
+import os
+import time
+from typing import Callable, Optional
+
+import pandas as pd
+
+from catalog import RunCatalog
+from compute import calibrate_df
+
+_catalog = None
+
+
+def latest_run(pattern: str = "data_*.csv") -> Optional[str]:
+    """
+    Newest run log: from the run catalog when it has one, otherwise the most
+    recently modified file matching `pattern`.
+    """
+    global _catalog
+    if _catalog is None:
+        _catalog = RunCatalog()
+    latest = _catalog.latest()
+    if latest and latest.endswith(".csv") and os.path.exists(latest):
+        return latest
+    files = glob.glob(pattern)
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def append_calibrated(samples: pd.DataFrame, new_rows: pd.DataFrame, window: int, config: dict) -> pd.DataFrame:
+    """Calibrate only `new_rows` and append them to the window of calibrated samples."""
+    if len(new_rows) > window:
+        new_rows = new_rows.tail(window).reset_index(drop=True)
+    new_rows = calibrate_df(new_rows, config)
+    if samples.empty:
+        return new_rows.reset_index(drop=True)
+    return pd.concat([samples, new_rows], ignore_index=True).tail(window)
+
+
+class CsvTailReader:
+    """
+    Follows the newest run log, parsing only rows appended since the last poll.
+
+    Keeps the last `window` calibrated samples; each poll calibrates just the new
+    rows, so the cost per frame does not grow with run length. The directory is
+    re-scanned for a newer run at most every `rescan_interval_s`.
+    """
+
+    def __init__(self, config: dict, window: int = 100, pattern: str = "data_*.csv",
+                 rescan_interval_s: float = 2.0, find_latest: Optional[Callable[[], Optional[str]]] = None):
+        self.config = config
+        self.window = window
+        self.pattern = pattern
+        self.rescan_interval_s = rescan_interval_s
+        self.find_latest = find_latest or (lambda: latest_run(self.pattern))
+
+        self.filename = None
+        self.samples = pd.DataFrame()
+        self._file = None
+        self._header = None
+        self._partial = b""
+        self._next_rescan = 0.0
+
+    def _open(self, filename: str) -> None:
+        if self._file:
+            self._file.close()
+        self.filename = filename
+        self.samples = pd.DataFrame()
+        self._file = open(filename, "rb")
+        self._header = self._file.readline()
+        self._partial = b""
+        if not self._header.endswith(b"\n"):
+            # Header still being written; try again next poll
+            self._file.seek(0)
+            self._header = None
+            return
+
+        # Start near the end of long runs: roughly enough bytes for `window` rows
+        size = os.path.getsize(filename)
+        start = max(self._file.tell(), size - 128 * self.window)
+        if start > self._file.tell():
+            self._file.seek(start)
+            self._file.readline()  # Skip the partial line we landed in
+
+    def _check_for_new_run(self) -> None:
+        now = time.monotonic()
+        if now < self._next_rescan and self.filename:
+            return
+        self._next_rescan = now + self.rescan_interval_s
+        latest = self.find_latest()
+        if latest and latest != self.filename:
+            self._open(latest)
+
+    def poll(self) -> pd.DataFrame:
+        """Read newly appended rows and return the calibrated window (may be empty)."""
+        self._check_for_new_run()
+        if self._file is None:
+            return self.samples
+        if self._header is None:
+            self._open(self.filename)
+            if self._header is None:
+                return self.samples
+
+        data = self._partial + self._file.read()
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]  # Row still being written
+        if not end:
+            return self.samples
+
+        new_rows = pd.read_csv(io.BytesIO(self._header + data[:end]))
+        self.samples = append_calibrated(self.samples, new_rows, self.window, self.config)
+        return self.samples
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
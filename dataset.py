@@ -0,0 +1,279 @@
+import argparse
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from analyze import compute_run, config_hash, load_run
+from catalog import RUN_NAME, RunCatalog, apply_settings
+from rolling import LiveMetrics
+
+# -----------------------------------------------------------------------------
+# All runs in one columnar store, for comparing geometries, pump settings and heater powers
+#
+#   runs_dataset/
+#     runs.parquet                                       one row of metadata per run
+#     samples/geometry=<g>/date=<YYYY-MM-DD>/<run>.parquet   calibrated samples of one run
+#
+# Hive-style directories make geometry and date partition columns, so queries on them
+# skip whole directories; other filters are pushed down to Parquet row-group statistics.
+# Needs pyarrow (pip install pyarrow), imported only when the store is used.
+# -----------------------------------------------------------------------------
+DATASET_DIR = "runs_dataset"
+FORMATS = {'parquet': '.parquet', 'feather': '.feather'}
+
+
+def _arrow():
+    """pyarrow modules (pa, pyarrow.dataset, pyarrow.parquet, pyarrow.feather), or a clear error."""
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("The run dataset needs pyarrow: pip install pyarrow") from None
+    return pa, ds, pq, feather
+
+
+class RunDataset:
+    """
+    Partitioned Parquet (or Feather) store of every run in the run catalog.
+
+    build() adds runs that are new or changed since the last build (by log file
+    mtime and calibration). Each run is calibrated with the heater/pump power and
+    flow rate recorded for it in the catalog, falling back to config.yaml; query() reads only the needed columns, partitions
+    and row groups.
+    """
+
+    def __init__(self, path: str = DATASET_DIR, file_format: str = "parquet"):
+        if file_format not in FORMATS:
+            raise ValueError(f"Dataset format must be one of {tuple(FORMATS)}, got {file_format!r}")
+        self.path = path
+        self.file_format = file_format
+        self.samples_path = os.path.join(path, "samples")
+        self.runs_path = os.path.join(path, "runs" + FORMATS[file_format])
+
+    # --- Writing ---
+    def _write_table(self, df: pd.DataFrame, path: str) -> None:
+        pa, _, pq, feather = _arrow()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp = f"{path}.tmp"
+        if self.file_format == "parquet":
+            pq.write_table(table, tmp, row_group_size=16384, compression="zstd")
+        else:
+            feather.write_feather(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+
+    def _sample_file(self, geometry: str, date: str, run: str) -> str:
+        return os.path.join(self.samples_path, f"geometry={geometry}", f"date={date}", run + FORMATS[self.file_format])
+
+    def build(self, config: dict, catalog: Optional[RunCatalog] = None, force: bool = False,
+              verbose: bool = True) -> int:
+        """Consolidate the catalog's runs into the store. Returns the number of runs (re)written."""
+        catalog = catalog or RunCatalog()
+        if not catalog.runs:
+            catalog.rebuild()
+        existing = {} if force else {run['file']: run for run in self.runs().to_dict('records')}
+
+        metadata = []
+        written = 0
+        for entry in catalog.find():
+            filename = entry['file']
+            if not os.path.exists(filename):
+                continue
+            mtime = os.path.getmtime(filename)
+            run_config = apply_settings(config, entry.get('settings'))
+            calibration = config_hash(run_config)  # Covers the run's own settings
+            previous = existing.get(filename)
+            if previous and previous['source_mtime'] == mtime and previous['calibration_hash'] == calibration:
+                metadata.append(previous)
+                continue
+
+            df = compute_run(load_run(filename), run_config)
+            run_meta = self._run_metadata(entry, df, mtime, calibration)
+            df.insert(0, 'run', run_meta['run'])
+            df['steady'] = steady_flags(df, run_config)
+
+            if previous:  # Geometry or date may have changed; drop the old copy
+                old = self._sample_file(previous['geometry'], previous['date'], previous['run'])
+                if os.path.exists(old):
+                    os.remove(old)
+            target = self._sample_file(run_meta['geometry'], run_meta['date'], run_meta['run'])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            self._write_table(df.drop(columns=['geometry', 'date'], errors='ignore'), target)
+            metadata.append(run_meta)
+            written += 1
+            if verbose:
+                print(f"{filename}: {len(df)} rows -> {target}")
+
+        if metadata or os.path.exists(self.runs_path):
+            os.makedirs(self.path, exist_ok=True)
+            self._write_table(pd.DataFrame(metadata), self.runs_path)
+        return written
+
+    @staticmethod
+    def _run_metadata(entry: dict, df: pd.DataFrame, mtime: float, calibration: str) -> dict:
+        filename = entry['file']
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        match = RUN_NAME.search(stem)
+        date = (entry.get('start') or '')[:10] or (match[1] if match else "unknown")
+        steady = entry.get('steady_state') or {}
+        settings = entry.get('settings') or {}  # Snapshot from when the run started; unknown for older runs
+        meta = {
+            'run': stem,
+            'file': filename,
+            'geometry': entry.get('geometry') or "unknown",
+            'date': date,
+            'start': entry.get('start'),
+            'stop': entry.get('stop'),
+            'rows': len(df),
+            'duration_s': float(df['seconds'].max()) if 'seconds' in df and len(df) else np.nan,
+            'config_hash': entry.get('config_hash'),
+            'calibration_hash': calibration,
+            'heater_power_w': settings.get('heater_power_w'),
+            'pump_power_w': settings.get('pump_power_w'),
+            'flow_rate_m3s': settings.get('flow_rate_m3s'),
+            'steady_s': steady.get('steady_s'),
+            'source_mtime': mtime,
+        }
+        for name, value in steady.get('averages', {}).items():
+            meta[f'steady_{name}'] = value
+        return meta
+
+    # --- Reading ---
+    def runs(self, **where) -> pd.DataFrame:
+        """Run metadata, optionally filtered like query() (e.g. geometry='simple_fins')."""
+        if not os.path.exists(self.runs_path):
+            return pd.DataFrame(columns=['run', 'file', 'geometry', 'date', 'source_mtime', 'calibration_hash'])
+        _, ds, _, _ = _arrow()
+        dataset = ds.dataset(self.runs_path, format=self._ds_format())
+        return dataset.to_table(filter=build_filter(where)).to_pandas()
+
+    def _ds_format(self) -> str:
+        return "parquet" if self.file_format == "parquet" else "ipc"
+
+    def query(self, columns: Optional[list] = None, filter=None, with_runs: Optional[list] = None,
+              **where) -> pd.DataFrame:
+        """
+        Samples of all runs as one DataFrame.
+
+        columns:   sample columns to read (default: all); partition columns are allowed
+        where:     column=value, column=[values] or column=(low, high) conditions, ANDed;
+                   e.g. geometry='simple_fins', steady=True, pump_power_calc=(4, 6)
+        filter:    a pyarrow.dataset expression, ANDed with `where`
+        with_runs: run metadata columns to join on, e.g. ['heater_power_w']
+        """
+        _, ds, _, _ = _arrow()
+        if not os.path.isdir(self.samples_path):
+            raise FileNotFoundError(f"No run dataset at {self.path}; run 'python dataset.py build' first")
+        dataset = ds.dataset(self.samples_path, format=self._ds_format(), partitioning="hive")
+        expression = build_filter(where)
+        if filter is not None:
+            expression = filter if expression is None else expression & filter
+        if columns is not None and with_runs and 'run' not in columns:
+            columns = ['run', *columns]
+        df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+        if with_runs:
+            df = df.merge(self.runs()[['run', *with_runs]], on='run', how='left')
+        return df
+
+
+def build_filter(where: dict):
+    """pyarrow expression for {column: value | [values] | (low, high)}, or None."""
+    if not where:
+        return None
+    _, ds, _, _ = _arrow()
+    expression = None
+    for name, value in where.items():
+        field = ds.field(name)
+        if isinstance(value, tuple):
+            low, high = value
+            condition = None
+            if low is not None:
+                condition = field >= low
+            if high is not None:
+                condition = field <= high if condition is None else condition & (field <= high)
+        elif isinstance(value, list):
+            condition = field.isin(value)
+        else:
+            condition = field == value
+        if condition is not None:
+            expression = condition if expression is None else expression & condition
+    return expression
+
+
+def steady_flags(df: pd.DataFrame, config: dict) -> np.ndarray:
+    """Per-sample steady-state flag, replaying the run through rolling.LiveMetrics."""
+    live = LiveMetrics(config)
+    names = [name for name in live.names if name in df]
+    columns = {name: df[name].to_numpy(dtype=np.float64) for name in names}
+    flags = np.zeros(len(df), dtype=bool)
+    for i, t in enumerate(df['seconds'].to_numpy(dtype=np.float64)):
+        live.update(float(t), {name: float(values[i]) for name, values in columns.items()})
+        flags[i] = live.steady_state.steady
+    return flags
+
+
+def parse_condition(text: str):
+    """'name=value', 'name=a,b' or 'name=low:high' from the command line."""
+    name, _, value = text.partition("=")
+
+    def scalar(v: str):
+        if v.lower() in ("true", "false"):
+            return v.lower() == "true"
+        try:
+            return float(v)
+        except ValueError:
+            return v
+
+    if ":" in value:
+        low, high = value.split(":", 1)
+        return name, (scalar(low) if low else None, scalar(high) if high else None)
+    if "," in value:
+        return name, [scalar(v) for v in value.split(",")]
+    return name, scalar(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Consolidate runs into a partitioned columnar dataset and query it.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="add new or changed runs from the run catalog")
+    build.add_argument('--force', action='store_true', help="rewrite every run")
+    sub.add_parser("runs", help="list run metadata")
+    query = sub.add_parser("query", help="read samples, e.g. query geometry=simple_fins steady=true")
+    query.add_argument('where', nargs='*', help="name=value, name=a,b or name=low:high")
+    query.add_argument('--columns', help="comma-separated sample columns")
+    query.add_argument('--with-runs', help="comma-separated run metadata columns to add")
+    query.add_argument('--output', help="save the result as CSV instead of printing it")
+    args = parser.parse_args()
+
+    with open("config.yaml") as f:
+        config = yaml.safe_load(f)
+    options = config.get('dataset', {})
+    dataset = RunDataset(options.get('path', DATASET_DIR), options.get('format', 'parquet'))
+
+    if args.command == "build":
+        if args.force and os.path.isdir(dataset.path):
+            shutil.rmtree(dataset.path)
+        written = dataset.build(config, force=args.force)
+        print(f"{written} runs written to {dataset.path}")
+    elif args.command == "runs":
+        with pd.option_context('display.max_rows', None, 'display.width', 250):
+            print(dataset.runs().drop(columns=['source_mtime', 'calibration_hash'], errors='ignore'))
+    else:
+        where = dict(parse_condition(text) for text in args.where)
+        df = dataset.query(columns=args.columns.split(",") if args.columns else None,
+                           with_runs=args.with_runs.split(",") if args.with_runs else None, **where)
+        if args.output:
+            df.to_csv(args.output, index=False)
+            print(f"Saved {len(df)} rows to {args.output}")
+        else:
+            print(df)
+            print(f"{len(df)} rows from {df['run'].nunique() if 'run' in df else '?'} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+from typing import Optional
+
+import numpy as np
+
+# -----------------------------------------------------------------------------
+# Reduces long series to a point budget before plotting, keeping peaks visible
+# -----------------------------------------------------------------------------
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum of y in each of max_points/2 equal buckets,
+    plus the first and last sample. Every local extreme survives, so spikes stay visible.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    n_buckets = max(max_points // 2 - 1, 1)
+    size = -(-n // n_buckets)  # ceil
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, size)
+
+    offsets = np.arange(n_buckets) * size
+    nan = np.isnan(padded)
+    low = np.where(nan, np.inf, padded).argmin(axis=1) + offsets
+    high = np.where(nan, -np.inf, padded).argmax(axis=1) + offsets
+    indices = np.unique(np.concatenate([[0, n - 1], low, high]))
+    return indices[indices < n]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: per bucket, the point forming the largest triangle
+    with the previous pick and the next bucket's average. Keeps the visual shape with
+    one point per bucket. NaN samples are skipped.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+    n = len(valid)
+    if n <= max_points or max_points < 3:
+        return valid
+
+    xv, yv = x[valid], y[valid]
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    picked = np.empty(max_points, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+
+    previous = 0
+    for b in range(max_points - 2):
+        start, end = edges[b], edges[b + 1]
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        next_x = xv[end:next_end].mean() if next_end > end else xv[-1]
+        next_y = yv[end:next_end].mean() if next_end > end else yv[-1]
+
+        area = np.abs((xv[previous] - next_x) * (yv[start:end] - yv[previous])
+                      - (xv[previous] - xv[start:end]) * (next_y - yv[previous]))
+        previous = start + int(area.argmax())
+        picked[b + 1] = previous
+    return valid[picked]
+
+
+def decimate(x, y, max_points: Optional[int], method: str = "minmax"):
+    """Return (x, y) reduced to about max_points points; unchanged if already within budget."""
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if not max_points or len(y) <= max_points:
+        return x, y
+    if method == "lttb":
+        indices = lttb_indices(x, y, max_points)
+    elif method == "minmax":
+        indices = minmax_indices(y, max_points)
+    else:
+        raise ValueError(f"Unknown decimation method {method!r}")
+    return x[indices], y[indices]
+
+
+def points_for_axes(ax, per_pixel: int = 2) -> int:
+    """Point budget from the axes' width in pixels (a min and a max per pixel column)."""
+    return max(int(ax.bbox.width) * per_pixel, 2)
@@ -0,0 +1,116 @@
+import time
+from typing import Optional
+
+# -----------------------------------------------------------------------------
+# RPi.GPIO-compatible stand-in, for running pump control off the Pi
+# -----------------------------------------------------------------------------
+class FakePWM:
+    """Mimics RPi.GPIO.PWM; remembers the duty cycle and when it was last changed."""
+
+    def __init__(self, gpio: "FakeGPIO", pin: int, frequency: float):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0.0
+        self.running = False
+        self.changes = []  # (time.monotonic(), duty) for every change
+
+    def start(self, duty_cycle: float) -> None:
+        self.running = True
+        self.ChangeDutyCycle(duty_cycle)
+
+    def ChangeDutyCycle(self, duty_cycle: float) -> None:
+        if not 0 <= duty_cycle <= 100:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty_cycle = duty_cycle
+        self.changes.append((time.monotonic(), duty_cycle))
+
+    def ChangeFrequency(self, frequency: float) -> None:
+        self.frequency = frequency
+
+    def stop(self) -> None:
+        self.running = False
+
+
+class FakeGPIO:
+    """
+    Mimics the RPi.GPIO module: pass an instance wherever the module is expected.
+    The PWM attribute is a factory, so `GPIO.PWM(pin, freq)` works as on the Pi.
+    """
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+        self.levels = {}  # Last output() level per pin
+        self.pwms = {}
+
+    def setmode(self, mode: int) -> None:
+        self.mode = mode
+
+    def setup(self, pin: int, direction: int) -> None:
+        if self.mode is None:
+            raise RuntimeError("Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)")
+        self.pins[pin] = direction
+
+    def output(self, pin: int, level: int) -> None:
+        if self.pins.get(pin) != self.OUT:
+            raise RuntimeError("The GPIO channel has not been set up as an OUTPUT")
+        self.levels[pin] = level
+
+    def PWM(self, pin: int, frequency: float) -> FakePWM:
+        pwm = self.pwms[pin] = FakePWM(self, pin, frequency)
+        return pwm
+
+    def cleanup(self) -> None:
+        self.pins.clear()
+        self.levels.clear()
+        self.mode = None
+
+    def duty(self, pin: int) -> float:
+        pwm = self.pwms.get(pin)
+        return pwm.duty_cycle if pwm and pwm.running else 0.0
+
+
+class PumpPlant:
+    """
+    Crude loop simulation for fake_spi: the pressure channels respond to the fake
+    pump's duty cycle with a first-order lag, everything else uses fake_spi's waveform.
+    Pass as FakeSpiDev(values=plant) so closed-loop control can be exercised off the Pi.
+    """
+
+    def __init__(self, gpio: FakeGPIO, pin: int, p_in_channel: int, p_out_channel: int,
+                 base: float = 100.0, gain: float = 4.0, time_constant_s: float = 1.0,
+                 fallback=None):
+        import fake_spi
+
+        self.gpio = gpio
+        self.pin = pin
+        self.p_in_channel = p_in_channel
+        self.p_out_channel = p_out_channel
+        self.base = base
+        self.gain = gain
+        self.time_constant_s = time_constant_s
+        self.fallback = fallback or fake_spi.default_waveform
+        self.level = 0.0  # delta_p in ADC counts
+        self._last_t: Optional[float] = None
+
+    def __call__(self, bus: int, device: int, channel: int) -> int:
+        global_channel = device * 8 + channel
+        if global_channel not in (self.p_in_channel, self.p_out_channel):
+            return self.fallback(bus, device, channel)
+
+        now = time.monotonic()
+        if self._last_t is not None:
+            target = self.gain * self.gpio.duty(self.pin)
+            self.level += (target - self.level) * min((now - self._last_t) / self.time_constant_s, 1.0)
+        self._last_t = now
+        if global_channel == self.p_in_channel:
+            return int(self.base)
+        return min(int(self.base + self.level), 1023)
@@ -0,0 +1,62 @@
+import math
+import time
+from typing import Callable, Optional
+
+# -----------------------------------------------------------------------------
+# spidev-compatible stand-in for an MCP3008, for testing and benchmarking off the Pi
+# -----------------------------------------------------------------------------
+def default_waveform(bus: int, device: int, channel: int) -> int:
+    """
+    Slowly varying reading around mid-scale, different per chip and channel.
+    """
+    phase = (device * 8 + channel) * 0.7
+    return int(512 + 300 * math.sin(time.monotonic() * 0.5 + phase)) & 0x3FF
+
+
+class FakeSpiDev:
+    """
+    Mimics spidev.SpiDev for an MCP3008 wired to (bus, device).
+    Every 3-byte frame [1, (8 + ch) << 4, 0] in a transfer is answered with that
+    channel's 10-bit reading, so packed multi-channel buffers work too. A `values`
+    callable returning None answers like an absent chip (all ones, null bit set).
+    """
+
+    def __init__(self, values: Optional[Callable[[int, int, int], Optional[int]]] = None, delay_per_byte_s: float = 0.0):
+        self.values = values or default_waveform
+        self.delay_per_byte_s = delay_per_byte_s
+        self.max_speed_hz = 0
+        self.mode = 0
+        self.bus = None
+        self.device = None
+        self.transfers = 0
+
+    def open(self, bus: int, device: int) -> None:
+        self.bus = bus
+        self.device = device
+
+    def close(self) -> None:
+        self.bus = self.device = None
+
+    def xfer2(self, data: list) -> list:
+        if self.bus is None:
+            raise OSError("FakeSpiDev is not open")
+        self.transfers += 1
+        if self.delay_per_byte_s:
+            time.sleep(self.delay_per_byte_s * len(data))
+
+        response = [0] * len(data)
+        for i in range(0, len(data) - 2, 3):
+            if data[i] != 1:
+                continue  # no start bit, MCP3008 stays idle
+            channel = (data[i + 1] >> 4) & 0x07
+            value = self.values(self.bus, self.device, channel)
+            if value is None:
+                response[i:i + 3] = [0xFF, 0xFF, 0xFF]  # No conversion: MISO floats high, null bit included
+                continue
+            value = int(value) & 0x3FF
+            response[i + 1] = (value >> 8) & 0x03
+            response[i + 2] = value & 0xFF
+        return response
+
+    xfer = xfer2
+    xfer3 = xfer2
@@ -0,0 +1,256 @@
+import csv
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# -----------------------------------------------------------------------------
+# Bounded row buffer between the acquisition loop and the writer thread
+# -----------------------------------------------------------------------------
+class RingBuffer:
+    """
+    Fixed-capacity FIFO of rows.
+    When full, put() either drops the new row (on_full="drop") or waits up to
+    `timeout` seconds for the writer to make room (on_full="block").
+    Once the writer has failed, put() raises instead of queueing rows nobody will write.
+    """
+
+    def __init__(self, capacity: int = 4096, on_full: str = "drop"):
+        if on_full not in ("drop", "block"):
+            raise ValueError(f"on_full must be 'drop' or 'block', got {on_full!r}")
+        self.capacity = capacity
+        self.on_full = on_full
+        self._rows = deque()
+        self._lock = threading.Condition()
+
+        self.pushed = 0
+        self.dropped = 0
+        self.blocked = 0  # puts that had to wait for room (backpressure)
+        self.high_water = 0
+        self.error = None  # The writer's failure, set by fail()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def put(self, row, timeout: Optional[float] = None) -> bool:
+        """Add a row; returns False if it was dropped."""
+        with self._lock:
+            if self.error is None and len(self._rows) >= self.capacity:
+                if self.on_full == "block":
+                    self.blocked += 1
+                    self._lock.wait_for(lambda: len(self._rows) < self.capacity or self.error is not None, timeout)
+            if self.error is not None:
+                raise RuntimeError(f"Log writer failed: {self.error!r}") from self.error
+            if len(self._rows) >= self.capacity:
+                    self.dropped += 1
+                    return False
+            self._rows.append(row)
+            self.pushed += 1
+            self.high_water = max(self.high_water, len(self._rows))
+            self._lock.notify_all()
+            return True
+
+    def drain(self, timeout: Optional[float] = None) -> list:
+        """Remove and return all buffered rows, waiting up to `timeout` for the first one."""
+        with self._lock:
+            if not self._rows:
+                self._lock.wait(timeout)
+            rows = list(self._rows)
+            self._rows.clear()
+            self._lock.notify_all()
+            return rows
+
+    def wake(self) -> None:
+        with self._lock:
+            self._lock.notify_all()
+
+    def fail(self, error: BaseException) -> None:
+        """The writer has stopped on `error`: fail every put() from now on."""
+        with self._lock:
+            self.error = error
+            self._lock.notify_all()
+
+
+# -----------------------------------------------------------------------------
+# Writer thread with group commits
+# -----------------------------------------------------------------------------
+class CsvSink:
+    """
+    Appends rows to a CSV log, writing the header first if the file is new.
+    With index_stride, the log's time index (timeindex.py) is kept current as rows are written.
+    """
+
+    def __init__(self, filename: str, header: list, index_stride: Optional[int] = None):
+        self.filename = filename
+        new_file = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        if not new_file:
+            check_csv_header(filename, header)
+        self._file = open(filename, "a", newline='')
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(header)
+            self._file.flush()
+        self._index = None
+        if index_stride:
+            from timeindex import TimeIndexWriter
+            self._index = TimeIndexWriter(filename, index_stride)
+
+    def writerows(self, rows: list) -> None:
+        index = self._index
+        if index is None:
+            self._writer.writerows(rows)
+            return
+        # Split the batch at stride boundaries to note each boundary row's byte offset
+        i = 0
+        while i < len(rows):
+            if index.rows % index.stride == 0:
+                index.add(rows[i][0], self._file.tell())
+            n = min(index.stride - index.rows % index.stride, len(rows) - i)
+            self._writer.writerows(rows[i:i + n])
+            index.rows += n
+            i += n
+
+    def flush(self) -> None:
+        self._file.flush()
+        if self._index is not None:
+            self._index.flush()  # After the rows it points at are on their way to disk
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self) -> None:
+        self._file.close()
+        if self._index is not None:
+            self._index.flush()
+
+
+class LogWriter(threading.Thread):
+    """
+    Writes rows from a RingBuffer to one or more sinks (CsvSink, runlog.RunLogSink) in batches.
+    Rows are flushed together every `commit_interval_s` (a group commit), with an
+    optional os.fsync so a commit survives power loss on the SD card.
+    Runs as its own thread (start/stop), or is driven by runtime.py through write_rows/close.
+    With a metrics.Metrics registry, batch write and commit durations are recorded.
+    If a sink fails (e.g. the SD card is full), the thread stops, further puts to the
+    buffer raise, and stop() re-raises the sink's error.
+    """
+
+    def __init__(self, sinks: list, buffer: RingBuffer,
+                 commit_interval_s: float = 1.0, fsync: bool = False, metrics=None):
+        super().__init__(name="log-writer", daemon=True)
+        self.sinks = sinks
+        self.buffer = buffer
+        self.commit_interval_s = commit_interval_s
+        self.fsync = fsync
+        self._stop_event = threading.Event()
+
+        self.rows_written = 0
+        self.commits = 0
+        self.max_commit_s = 0.0
+        self._pending = 0
+        self.error = None  # What stopped the thread, re-raised by stop()
+
+        self._write_seconds = self._commit_seconds = None
+        if metrics is not None:
+            self._write_seconds = metrics.histogram("write_seconds", "Duration of writing one batch of rows to all sinks")
+            self._commit_seconds = metrics.histogram("commit_seconds", "Duration of flushing (and fsyncing) all sinks")
+
+    def _write(self, rows: list) -> None:
+        start = time.perf_counter()
+        for sink in self.sinks:
+            sink.writerows(rows)
+        self.rows_written += len(rows)
+        if self._write_seconds is not None:
+            self._write_seconds.observe(time.perf_counter() - start)
+
+    def _commit(self) -> None:
+        start = time.perf_counter()
+        for sink in self.sinks:
+            sink.flush()
+            if self.fsync:
+                os.fsync(sink.fileno())
+        self.commits += 1
+        elapsed = time.perf_counter() - start
+        self.max_commit_s = max(self.max_commit_s, elapsed)
+        if self._commit_seconds is not None:
+            self._commit_seconds.observe(elapsed)
+
+    def write_rows(self, rows: list, commit: bool = False) -> None:
+        """Write rows and, with commit=True, flush everything written since the last commit."""
+        if rows:
+            self._write(rows)
+            self._pending += len(rows)
+        if commit and self._pending:
+            self._commit()
+            self._pending = 0
+
+    def close(self) -> None:
+        """Write out everything still buffered and close the sinks."""
+        self._write(self.buffer.drain(timeout=0))
+        self._commit()
+        for sink in self.sinks:
+            sink.close()
+
+    def run(self) -> None:
+        try:
+            next_commit = time.monotonic() + self.commit_interval_s
+            while not self._stop_event.is_set():
+                rows = self.buffer.drain(timeout=max(next_commit - time.monotonic(), 0.0))
+                due = time.monotonic() >= next_commit
+                self.write_rows(rows, commit=due)
+                if due:
+                    next_commit = time.monotonic() + self.commit_interval_s
+            self.close()
+        except Exception as e:
+            self.error = e
+            self.buffer.fail(e)  # Acquisition stops at its next put()
+            for sink in self.sinks:
+                try:
+                    sink.close()
+                except Exception:
+                    pass  # Already failing; keep the first error
+
+    def stop(self) -> None:
+        """Write out everything still buffered, then close the sinks. Raises the writer's error, if any."""
+        self._stop_event.set()
+        self.buffer.wake()
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def summary(self) -> str:
+        return (f"{self.rows_written} rows written in {self.commits} commits "
+                f"(max commit {1000 * self.max_commit_s:.1f} ms), "
+                f"dropped = {self.buffer.dropped}, backpressure waits = {self.buffer.blocked}, "
+                f"buffer high water = {self.buffer.high_water}/{self.buffer.capacity}")
+
+
+def check_csv_header(filename: str, header: list) -> None:
+    """Refuse to append to a log written with different columns (e.g. runtime.py's log from main.py)."""
+    with open(filename, newline='') as f:
+        existing = next(csv.reader(f), [])
+    if existing != list(header):
+        raise ValueError(f"{filename} has columns {existing}, expected {list(header)}")
+
+
+def recover_csv(filename: str) -> Optional[float]:
+    """
+    Prepare an existing log for appending after a crash or power loss.
+    A final line without a newline (a row cut off mid-write) is truncated away.
+    Returns the last complete `seconds` value, or None if there are no data rows.
+    """
+    with open(filename, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            print(f"Recovered {filename}: dropped truncated final line {data[end:]!r}")
+            f.truncate(end)
+        lines = data[:end].splitlines()
+
+    if len(lines) < 2:
+        return None
+    try:
+        return float(lines[-1].split(b",", 1)[0])
+    except ValueError:
+        return None
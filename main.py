@@ -1,33 +1,191 @@
+import os
+import sys
 import time
-import csv
-from collect import read_all
+from typing import Optional, Tuple
+from catalog import RunCatalog
+from collect import AcquisitionPlan, load_config
 from datetime import datetime
+from logwriter import RingBuffer, LogWriter, CsvSink, check_csv_header, recover_csv
+from metrics import MetricsExporter, from_config as metrics_from_config
+from rolling import LiveMetrics
+from runlog import RunLogSink
+from samplebus import DEFAULT_NAME, SampleBus
+from scheduler import FixedRateScheduler
+from watchdog import Watchdog
 
-# Names log file as 'data_YYYY-MM-DD_HH.MM.SS.csv' (Windows does not allow : in file names)
-filename = f"data_{datetime.now().isoformat(timespec='seconds').replace(':', '.').replace('T','_')}.csv" 
-
-header = [
+HEADER = [
     "seconds", "T1", "T2", "T3", "fluid_in", "fluid_out", "P_in", "P_out",
-    "heater_power", "pump_power"
+    "heater_power", "pump_power", "lateness_ms"
 ]
 
-with open(filename, "w", newline='') as f:
-    writer = csv.writer(f)
-    writer.writerow(header)
-    f.flush()  # Ensure header is written immediately
-    print(f"Now collecting data in {filename}")
+
+def open_log(scheduler: FixedRateScheduler, resume: Optional[str] = None,
+             header: Optional[list] = None, prefix: str = "data") -> Tuple[str, float, int]:
+    """
+    Log file for a new run ('<prefix>_<timestamp>.csv'), or `resume` after recovering its last complete row.
+    With `header`, a log with other columns is refused before anything in it is touched.
+    Returns (filename, time offset for the first sample, rows already logged).
+    """
+    if resume is None:
+        # Names log file as 'data_YYYY-MM-DD_HH.MM.SS.csv' (Windows does not allow : in file names)
+        if os.path.dirname(prefix):
+            os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        return f"{prefix}_{datetime.now().isoformat(timespec='seconds').replace(':', '.').replace('T','_')}.csv", 0.0, 0
+
+    if header is not None:
+        check_csv_header(resume, header)
+    time_offset = 0.0
+    last_seconds = recover_csv(resume)
+    with open(resume, 'rb') as f:
+        previous_rows = max(sum(1 for _ in f) - 1, 0)
+    if last_seconds is not None:
+        time_offset = last_seconds + scheduler.period
+    print(f"Resuming {resume} at {time_offset:.3f} s")
+    return resume, time_offset, previous_rows
+
+
+def make_writer(config: dict, filename: str, header: list, scheduler: FixedRateScheduler,
+                metrics=None) -> Tuple[RingBuffer, LogWriter]:
+    """The row buffer and a (not yet started) LogWriter for the CSV and optional binary log."""
+    writer_options = config.get('writer', {})
+    buffer = RingBuffer(writer_options.get('buffer_rows', 4096), writer_options.get('on_full', 'drop'))
+    index_stride = writer_options.get('index_stride', 256) if writer_options.get('time_index', True) else None
+    sinks = [CsvSink(filename, header, index_stride)]
+    if writer_options.get('binary_log', False):
+        # Compact uint16 copy of the run, read by runlog.read_runlog
+        sinks.append(RunLogSink(filename.replace('.csv', '.runlog'), header, config, 1 / scheduler.period))
+    writer = LogWriter(sinks, buffer,
+                       commit_interval_s=writer_options.get('commit_interval_s', 1.0),
+                       fsync=writer_options.get('fsync', False), metrics=metrics)
+    return buffer, writer
+
+
+def shutdown(steps: list) -> Optional[Exception]:
+    """
+    Run every teardown step (None entries are skipped) even if an earlier one fails.
+    Returns the first failure for the caller to raise once the run is wrapped up.
+    """
+    error = None
+    for step in filter(None, steps):
+        try:
+            step()
+        except Exception as e:
+            print(f"Error while stopping: {e!r}")
+            error = error or e
+    return error
+
+
+def main(config: Optional[dict] = None, resume: Optional[str] = None, prefix: str = "data",
+         cataloged: bool = True) -> dict:
+    """
+    Log samples until Ctrl-C. `config` defaults to config.yaml; `resume` continues that log.
+    `prefix` names new logs; runs with `cataloged` off (replays) are not added to runs.json.
+    Returns the run's counters, e.g. for replay.py's load tests.
+    """
+    config = config or load_config()
+    sampling = config.get('sampling', {})
+    bus_options = config.get('bus', {})
+    metrics_options = config.get('metrics', {})
+
+    scheduler = FixedRateScheduler(sampling.get('sample_rate_hz', 10), sampling.get('overrun', 'skip'))
+
+    # Optional timing histograms (None when metrics.enabled is off: nothing is timed)
+    metrics = metrics_from_config(config)
+
+    # Sensor channels resolved once; each sample fills the plan's preallocated row
+    plan = AcquisitionPlan(config, HEADER[1:-1], metrics=metrics)
+
+    # Rolling Q_dot/delta_p/efficiency and steady-state averages, kept up to date sample by sample
+    live = LiveMetrics(config, HEADER[1:-1]) if config.get('rolling', {}).get('enabled', True) else None
+
+    # Safety rules checked on every raw sample, with pump/heater hooks (None when watchdog.enabled is off)
+    watchdog = Watchdog.from_config(config, HEADER[1:-1], 1 / scheduler.period, metrics=metrics)
+
+    # 'python main.py data_<timestamp>.csv' resumes an interrupted run in that file
+    filename, time_offset, previous_rows = open_log(scheduler, resume, HEADER, prefix)
+
+    # Acquisition (this thread) pushes rows; the writer thread commits them to disk in batches
+    buffer, writer = make_writer(config, filename, HEADER, scheduler, metrics)
+    writer.start()
+
+    exporter = None
+    loop_period = sample_work = None
+    if metrics:
+        loop_period = metrics.histogram("loop_period_seconds", "Time between consecutive samples")
+        sample_work = metrics.histogram("sample_seconds", "Time to read, queue and publish one sample")
+        metrics.counter("samples_total", "Samples taken", lambda: scheduler.samples)
+        metrics.counter("overruns_total", "Samples that finished after the next deadline", lambda: scheduler.overruns)
+        metrics.counter("skipped_samples_total", "Deadlines dropped after overruns", lambda: scheduler.skipped)
+        metrics.counter("dropped_rows_total", "Rows discarded because the write buffer was full", lambda: buffer.dropped)
+        exporter = MetricsExporter(metrics, metrics_options.get('file', 'metrics.prom'),
+                                   metrics_options.get('interval_s', 5.0))
+        exporter.start()
+
+    # Index the run so viewers and analyze.py find it without scanning the directory
+    catalog = RunCatalog() if cataloged else None
+    if catalog:
+        catalog.start_run(filename, config)
+
+    # Live viewers read samples from shared memory instead of polling the CSV
+    bus = None
+    if bus_options.get('enabled', True):
+        bus = SampleBus(HEADER, capacity=bus_options.get('capacity', 4096), name=bus_options.get('name', DEFAULT_NAME),
+                        socket_path=bus_options.get('socket_path'))
+
+    print(f"Now collecting data in {filename} at {1 / scheduler.period:g} Hz")
     print(f"Run 'python plot_realtime.py' to view live metrics")
-    start_time = time.time() # Starts time for trial
+    scheduler.start() # Starts time for trial
+    previous_sample = None
     try:
         while True:
-            now = time.time()
-            delta_sec = round(now - start_time, 3)  # Time since start, in seconds
-            readings = read_all()
-            row = [delta_sec]
-            for key in header[1:]:
-                row.append(readings.get(key, None))  # Optional sensors filled with 'None'
-            writer.writerow(row)
-            f.flush()
-            time.sleep(0.1)  # 100ms interval
+            elapsed, lateness = scheduler.wait()  # Sleeps until the next sample deadline
+            if metrics:
+                sample_start = time.perf_counter()
+                if previous_sample is not None:
+                    loop_period.observe(sample_start - previous_sample)
+                previous_sample = sample_start
+            stamp = time.perf_counter()
+            plan.read()
+            # Time since start in seconds, readings (None for optional sensors), lateness
+            row = [round(time_offset + elapsed, 3), *plan.values(), round(1000 * lateness, 2)]
+            if watchdog:
+                watchdog.check(row[0], plan.row, stamp)  # Before anything that can wait
+            buffer.put(row, timeout=scheduler.period)
+            if bus:
+                bus.publish(row)
+            if live:
+                live.update_row(row[0], plan.row)
+            if metrics:
+                sample_work.observe(time.perf_counter() - sample_start)
     except KeyboardInterrupt:
         print("Stopped logging.")
+    finally:
+        # Independent steps: a failing bus or watchdog must not lose the buffered rows or the catalog entry
+        error = shutdown([
+            watchdog.close if watchdog else None,
+            bus.close if bus else None,
+            writer.stop,
+            (lambda: catalog.finish_run(filename, previous_rows + writer.rows_written,
+                                        steady_state=live.steady_summary() if live else None)) if catalog else None,
+        ])
+        print(scheduler.summary())
+        print(writer.summary())
+        if live:
+            print(live.summary())
+        if watchdog:
+            print(watchdog.summary())
+        if exporter:
+            exporter.stop()
+            print(metrics.summary())
+            print(f"Metrics written to {exporter.path}")
+        if error:
+            raise error
+    return {'filename': filename, 'samples': scheduler.samples, 'overruns': scheduler.overruns,
+            'skipped': scheduler.skipped, 'max_lateness_ms': 1000 * scheduler.max_lateness,
+            'rows_written': writer.rows_written, 'dropped': buffer.dropped,
+            'buffer_high_water': buffer.high_water, 'max_commit_ms': 1000 * writer.max_commit_s,
+            'watchdog_trips': len(watchdog.trips) if watchdog else 0}
+
+
+if __name__ == '__main__':
+    main(resume=sys.argv[1] if len(sys.argv) > 1 else None)
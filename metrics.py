@@ -0,0 +1,142 @@
+import os
+import threading
+from bisect import bisect_left
+from typing import Callable, Optional
+
+# -----------------------------------------------------------------------------
+# Hot-path instrumentation: fixed-bucket histograms cheap enough to update every
+# sample, exported as a Prometheus text file (e.g. for node_exporter's textfile
+# collector) and summarized at the end of a run
+# -----------------------------------------------------------------------------
+# 10 us to 10 s, 1-2.5-5 steps per decade
+DEFAULT_BOUNDS = tuple(m * 10.0 ** e for e in range(-5, 1) for m in (1, 2.5, 5)) + (10.0,)
+
+
+class Histogram:
+    """
+    Counts of observations (in seconds) per bucket, plus count, sum and max.
+    observe() is a bisect and three updates; no allocation.
+    """
+
+    def __init__(self, bounds: tuple = DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (the max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def _labels(labels: dict, **extra) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items.items()) + "}"
+
+
+class Metrics:
+    """
+    Registry of histograms and counters for one run.
+
+    Histograms are updated by the code being measured. Counters are read from
+    callables only when exporting (e.g. lambda: scheduler.overruns), so they cost
+    nothing per sample.
+    """
+
+    def __init__(self, prefix: str = "coldplayt"):
+        self.prefix = prefix
+        self._histograms = {}  # name -> (help, {label tuple: Histogram})
+        self._counters = {}    # name -> (help, callable)
+
+    def histogram(self, name: str, help: str, bounds: tuple = DEFAULT_BOUNDS, **labels) -> Histogram:
+        series = self._histograms.setdefault(name, (help, {}))[1]
+        key = tuple(sorted(labels.items()))
+        if key not in series:
+            series[key] = Histogram(bounds)
+        return series[key]
+
+    def counter(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self._counters[name] = (help, read)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for name, (help, read) in self._counters.items():
+            full = f"{self.prefix}_{name}"
+            lines += [f"# HELP {full} {help}", f"# TYPE {full} counter", f"{full} {read()}"]
+        for name, (help, series) in self._histograms.items():
+            full = f"{self.prefix}_{name}"
+            lines += [f"# HELP {full} {help}", f"# TYPE {full} histogram"]
+            for key, hist in series.items():
+                labels = dict(key)
+                counts = list(hist.counts)  # Snapshot; the hot path keeps updating
+                cumulative = 0
+                for bound, n in zip(hist.bounds, counts):
+                    cumulative += n
+                    lines.append(f"{full}_bucket{_labels(labels, le=f'{bound:g}')} {cumulative}")
+                lines.append(f"{full}_bucket{_labels(labels, le='+Inf')} {sum(counts)}")
+                lines.append(f"{full}_sum{_labels(labels)} {hist.sum:.9g}")
+                lines.append(f"{full}_count{_labels(labels)} {sum(counts)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        # Write-then-rename so scrapers never read a half-written file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+    def summary(self) -> str:
+        """Table of every histogram (ms) and counter, for the end of a run."""
+        lines = [f"{'metric':42} {'count':>8} {'mean':>8} {'p50':>8} {'p99':>8} {'max':>8}"]
+        for name, (_, series) in self._histograms.items():
+            for key, hist in sorted(series.items()):
+                label = name + _labels(dict(key))
+                mean = hist.sum / hist.count if hist.count else 0.0
+                lines.append(f"{label:42} {hist.count:8d} " + " ".join(
+                    f"{1000 * v:8.3f}" for v in (mean, hist.quantile(0.5), hist.quantile(0.99), hist.max)))
+        for name, (_, read) in self._counters.items():
+            lines.append(f"{name:42} {read():8}")
+        return "\n".join(lines) + "\n(times in ms; p50/p99 are histogram bucket bounds)"
+
+
+class MetricsExporter(threading.Thread):
+    """Rewrites the metrics file every `interval_s`, and once more on stop()."""
+
+    def __init__(self, metrics: Metrics, path: str = "metrics.prom", interval_s: float = 5.0):
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval_s = interval_s
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval_s):
+            self.metrics.write(self.path)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+        self.metrics.write(self.path)
+
+
+def from_config(config: dict) -> Optional[Metrics]:
+    """A Metrics registry if `metrics.enabled` is set in config.yaml, else None (no instrumentation)."""
+    return Metrics() if config.get('metrics', {}).get('enabled', False) else None
@@ -0,0 +1,101 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Running statistics updated chunk by chunk, in constant memory
+# -----------------------------------------------------------------------------
+class RunningStats:
+    """
+    Count, mean, variance (Welford/Chan merge), min and max of a stream, NaNs ignored.
+    Percentiles are estimated from a fixed-size uniform reservoir sample.
+    """
+
+    def __init__(self, reservoir_size: int = 10000, seed: Optional[int] = 0):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self._reservoir = np.empty(reservoir_size)
+        self._seen = 0  # values offered to the reservoir
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        n = len(values)
+        if n == 0:
+            return
+
+        # Merge this chunk's mean/variance into the running totals
+        chunk_mean = values.mean()
+        chunk_m2 = ((values - chunk_mean) ** 2).sum()
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+        self._sample(values)
+
+    def _sample(self, values: np.ndarray) -> None:
+        """Reservoir sampling (Algorithm R), vectorized over a chunk."""
+        size = len(self._reservoir)
+        fill = min(max(size - self._seen, 0), len(values))
+        self._reservoir[self._seen:self._seen + fill] = values[:fill]
+        rest = values[fill:]
+        if len(rest):
+            positions = np.arange(self._seen + fill, self._seen + len(values)) + 1
+            slots = (self._rng.random(len(rest)) * positions).astype(np.int64)
+            keep = slots < size
+            self._reservoir[slots[keep]] = rest[keep]
+        self._seen += len(values)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    def percentile(self, q) -> float:
+        if self.count == 0:
+            return np.nan
+        return float(np.percentile(self._reservoir[:min(self._seen, len(self._reservoir))], q))
+
+    def summary(self, percentiles=(50, 95)) -> dict:
+        result = {'count': self.count, 'mean': self.mean if self.count else np.nan,
+                  'std': self.std, 'min': self.min, 'max': self.max}
+        for q in percentiles:
+            result[f'p{q}'] = self.percentile(q)
+        return result
+
+
+class ColumnStats:
+    """RunningStats for every numeric column seen in a stream of DataFrame chunks."""
+
+    def __init__(self, columns: Optional[list] = None, reservoir_size: int = 10000):
+        self.columns = columns
+        self.reservoir_size = reservoir_size
+        self.stats = {}
+
+    def update(self, df: pd.DataFrame) -> None:
+        columns = self.columns if self.columns is not None else df.select_dtypes('number').columns
+        for col in columns:
+            if col in df:
+                if col not in self.stats:
+                    self.stats[col] = RunningStats(self.reservoir_size)
+                self.stats[col].update(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+
+    def __getitem__(self, col: str) -> RunningStats:
+        return self.stats[col]
+
+    def __contains__(self, col: str) -> bool:
+        return col in self.stats and self.stats[col].count > 0
+
+    def table(self, percentiles=(50, 95)) -> pd.DataFrame:
+        return pd.DataFrame({col: s.summary(percentiles) for col, s in self.stats.items()}).T
@@ -1,96 +1,209 @@
-import matplotlib.pyplot as plt
+import time
 import pandas as pd
 import numpy as np
-import glob
-import os
 import yaml
-from matplotlib.animation import FuncAnimation
-import matplotlib.gridspec as gridspec
-from compute import calibrate_df
+from csvtail import latest_run
+from decimate import decimate
+from rolling import LiveMetrics
+from samplebus import DEFAULT_NAME, LiveSource
+
+
+def load_config() -> dict:
+    with open("config.yaml") as f:
+        return yaml.safe_load(f)
 
-# Load config
-with open("config.yaml") as f:
-    config = yaml.safe_load(f)
 
 def get_latest_csv():
-    files = glob.glob("data_*.csv")
-    return max(files, key=os.path.getmtime) if files else None
-
-# Grid layout for 4 plots
-fig = plt.figure(constrained_layout=True, figsize=(12, 8))
-gs = gridspec.GridSpec(2, 2, figure=fig)
-
-ax_temp = fig.add_subplot(gs[0, 0])
-ax_pressure = fig.add_subplot(gs[0, 1])
-ax_power = fig.add_subplot(gs[1, 0])
-ax_efficiency = fig.add_subplot(gs[1, 1])
-ax_temp.grid(True)
-ax_pressure.grid(True)
-ax_power.grid(True)
-ax_efficiency.grid(True)
+    return latest_run("data_*.csv")
+
+
+def fit_limits(get_lim, set_lim, lo: float, hi: float, headroom: float = 0.1, scroll: bool = False) -> bool:
+    """
+    Refit limits to [lo, hi] only when the data leaves them, or when it uses under
+    a quarter of the range. With scroll=True the headroom is added on the right only
+    (for time axes). Returns True if the limits changed, which needs a full redraw.
+    """
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return False
+    cur_lo, cur_hi = get_lim()
+    span = max(hi - lo, 0.05 * abs(hi), 1e-3)
+    if lo >= cur_lo and hi <= cur_hi and span > (cur_hi - cur_lo) / 4:
+        return False
+    if scroll:
+        set_lim(lo, hi + headroom * span)
+    else:
+        set_lim(lo - headroom * span, hi + headroom * span)
+    return True
+
+
+def column(df: pd.DataFrame, label: str) -> np.ndarray:
+    return df[label].to_numpy(dtype=float) if label in df else np.array([])
+
+
 
 # -----------------------------------------------------------------------------
 # Set up plots (animation for realtime view)
 # -----------------------------------------------------------------------------
-def animate(i):
-    latest_csv = get_latest_csv()
-    if not latest_csv:
-        return
-
-    try:
-        df = pd.read_csv(latest_csv).tail(100)
-
-        # Apply calibrations and metrics
-        df = calibrate_df(df, config)
-
-        # Temperature plot
-        ax_temp.clear()
-        for label in ['fluid_in_F', 'fluid_out_F', 'T1_F', 'T2_F', 'T3_F']:
-            if label in df:
-                ax_temp.plot(df['seconds'], df[label], label=label)
+class Dashboard:
+    """
+    The 2x2 live figure. Artists are created once and updated in place by animate(),
+    which FuncAnimation calls every refresh interval.
+    """
+
+    def __init__(self, config: dict, reader=None):
+        # Loaded here so importing this module (e.g. for benchmarks) does not open a window
+        import matplotlib.pyplot as plt
+        import matplotlib.gridspec as gridspec
+
+        plot_options = config.get('plot', {})
+        self.refresh_ms = plot_options.get('refresh_interval_ms', 100)
+        self.max_points = plot_options.get('live_max_points', 500)  # Per line; only matters for long windows
+        self.method = plot_options.get('decimation', 'minmax')
+
+        # Samples from main.py's shared-memory bus, or new rows of the latest CSV if it is not running
+        self.reader = reader or LiveSource(config, window=plot_options.get('window', 100),
+                                           name=config.get('bus', {}).get('name', DEFAULT_NAME))
+
+        # Grid layout for 4 plots
+        fig = self.fig = plt.figure(constrained_layout=True, figsize=(12, 8))
+        gs = gridspec.GridSpec(2, 2, figure=fig)
+
+        ax_temp = self.ax_temp = fig.add_subplot(gs[0, 0])
+        ax_pressure = self.ax_pressure = fig.add_subplot(gs[0, 1])
+        ax_power = self.ax_power = fig.add_subplot(gs[1, 0])
+        ax_efficiency = self.ax_efficiency = fig.add_subplot(gs[1, 1])
+        ax_temp.grid(True)
+        ax_pressure.grid(True)
+        ax_power.grid(True)
+        ax_efficiency.grid(True)
+
+        # --- Artists are created once and updated in place every frame ---
+        self.temp_lines = {label: ax_temp.plot([], [], label=label)[0]
+                           for label in ['fluid_in_F', 'fluid_out_F', 'T1_F', 'T2_F', 'T3_F']}
         ax_temp.set_title("Temperatures (Fluid + T1–T3)")
-        ax_temp.legend()
+        ax_temp.legend(loc='upper left')
         ax_temp.set_ylabel("°C")
         ax_temp.set_xlabel("Seconds")
 
-
-        # Pressure plot
-        ax_pressure.clear()
-        for label in ['P_in_psi', 'P_out_psi']:
-            if label in df:
-                ax_pressure.plot(df['seconds'], df[label], label=label)
+        self.pressure_lines = {label: ax_pressure.plot([], [], label=label)[0]
+                               for label in ['P_in_psi', 'P_out_psi']}
         ax_pressure.set_title("Pressures")
-        ax_pressure.legend()
+        ax_pressure.legend(loc='upper left')
         ax_pressure.set_ylabel("psi")
         ax_pressure.set_xlabel("Seconds")
 
-
-        # Power plot
-        ax_power.clear()
-        if 'pump_power_calc' in df and 'heater_power_calc' in df:
-            ax_power.scatter(df['pump_power_calc'], df['heater_power_calc'], alpha=0.6)
+        self.power_scatter = ax_power.scatter([], [], alpha=0.6)
         ax_power.set_xlabel("Pump Power")
         ax_power.set_ylabel("Heater Power")
         ax_power.set_title("Heater vs Pump Power")
 
-        # Efficiency plot
-        ax_efficiency.clear()
-        if 'efficiency' in df:
-            ax_efficiency.plot(df['seconds'], df['efficiency'], label="Efficiency")
+        self.efficiency_line, = ax_efficiency.plot([], [], label="Efficiency")
         ax_efficiency.set_ylim(0.5, 5)
         ax_efficiency.set_ylabel("η (Thermal)")
         ax_efficiency.set_title("System Efficiency")
-        ax_efficiency.legend()
+        ax_efficiency.legend(loc='upper left')
         ax_efficiency.set_xlabel("Seconds")
 
-
         for ax in [ax_temp, ax_pressure, ax_efficiency]:
             ax.tick_params(axis='x', rotation=45)
 
-    except Exception as e:
-        print(f"Plot error: {e}")
+        self.frame_text = ax_temp.text(0.99, 0.02, "", transform=ax_temp.transAxes, ha='right', va='bottom', fontsize=8)
+        self.steady_text = ax_efficiency.text(0.99, 0.98, "", transform=ax_efficiency.transAxes,
+                                              ha='right', va='top', fontsize=8, family='monospace')
+        self.artists = [*self.temp_lines.values(), *self.pressure_lines.values(),
+                        self.power_scatter, self.efficiency_line, self.frame_text, self.steady_text]
+
+        # Smoothed values and steady state, fed only the rows that are new since the last frame
+        self.config = config
+        self.live = LiveMetrics(config)
+        self.fed_until = -np.inf
+
+        self.last_frame = None
+        self.frame_ms = self.period_ms = 0.0
+
+    def update_live(self, df: pd.DataFrame, seconds: np.ndarray) -> None:
+        if seconds.max() < self.fed_until:
+            self.live = LiveMetrics(self.config)  # A new run started
+            self.fed_until = -np.inf
+        self.live.update_frame(df[seconds > self.fed_until])
+        self.fed_until = seconds.max()
+
+        snapshot = self.live.snapshot()
+        lines = [f"{name:>10} {snapshot[name]['ewma']:8.3f}" for name in LiveMetrics.QUANTITIES]
+        steady = self.live.steady_state
+        lines.append(f"{'steady':>10} {steady.duration_s:6.0f} s" if steady.steady else f"{'':>10} settling")
+        self.steady_text.set_text("\n".join(lines))
+
+    def animate(self, i):
+        start = time.perf_counter()
+        if self.last_frame is not None:
+            self.period_ms = 0.9 * self.period_ms + 0.1 * 1000 * (start - self.last_frame)
+        self.last_frame = start
+        ax_temp, ax_pressure, ax_power = self.ax_temp, self.ax_pressure, self.ax_power
+        max_points, method = self.max_points, self.method
+
+        try:
+            df = self.reader.poll()  # Last samples, calibrated
+            if df.empty:
+                return self.artists
+
+            seconds = column(df, 'seconds')
+            rescaled = fit_limits(ax_temp.get_xlim, ax_temp.set_xlim, seconds.min(), seconds.max(),
+                                  headroom=0.5, scroll=True)
+            for ax in [ax_pressure, self.ax_efficiency]:
+                ax.set_xlim(ax_temp.get_xlim())
+
+            # Temperature plot
+            for label, line in self.temp_lines.items():
+                line.set_data(*decimate(seconds, column(df, label), max_points, method))
+            temps = [column(df, label) for label in self.temp_lines if label in df]
+            if temps:
+                rescaled |= fit_limits(ax_temp.get_ylim, ax_temp.set_ylim, np.nanmin(temps), np.nanmax(temps))
+
+            # Pressure plot
+            for label, line in self.pressure_lines.items():
+                line.set_data(*decimate(seconds, column(df, label), max_points, method))
+            pressures = [column(df, label) for label in self.pressure_lines if label in df]
+            if pressures:
+                rescaled |= fit_limits(ax_pressure.get_ylim, ax_pressure.set_ylim, np.nanmin(pressures), np.nanmax(pressures))
+
+            # Power plot
+            if 'pump_power_calc' in df and 'heater_power_calc' in df:
+                pump, heater = column(df, 'pump_power_calc'), column(df, 'heater_power_calc')
+                self.power_scatter.set_offsets(np.column_stack([pump, heater]))
+                rescaled |= fit_limits(ax_power.get_xlim, ax_power.set_xlim, np.nanmin(pump), np.nanmax(pump))
+                rescaled |= fit_limits(ax_power.get_ylim, ax_power.set_ylim, np.nanmin(heater), np.nanmax(heater))
+
+            # Efficiency plot
+            self.efficiency_line.set_data(*decimate(seconds, column(df, 'efficiency'), max_points, method))
+            self.update_live(df, seconds)
+
+            if rescaled:
+                # Redraw ticks and labels; the animation then re-captures the blit background
+                self.fig.canvas.draw()
+
+        except Exception as e:
+            print(f"Plot error: {e}")
+
+        self.frame_ms = 0.9 * self.frame_ms + 0.1 * 1000 * (time.perf_counter() - start)
+        late = " (behind)" if self.period_ms > 1.2 * self.refresh_ms else ""
+        self.frame_text.set_text(f"frame {self.frame_ms:.1f} ms | every {self.period_ms:.0f} ms, "
+                                 f"target {self.refresh_ms} ms{late}")
+        return self.artists
+
+
+def main() -> None:
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    dashboard = Dashboard(load_config())
+    source = 'the live sample bus' if dashboard.reader.using_bus else get_latest_csv()
+    print(f"Showing realtime plot using {source}")
+    ani = FuncAnimation(dashboard.fig, dashboard.animate, interval=dashboard.refresh_ms,
+                        blit=True, cache_frame_data=False)
+    plt.show()
+
 
 # Execution
-print(f"Showing realtime plot using {get_latest_csv()}")
-ani = FuncAnimation(fig, animate, interval=100, save_count=100)
-plt.show()
+if __name__ == "__main__":
+    main()
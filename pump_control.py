@@ -1,18 +1,37 @@
-import RPi.GPIO as GPIO
+import os
 import yaml
 import sys
 import time
 
+import fake_gpio
+
 CONFIG_FILE = 'config.yaml'
 PWM_GPIO_PIN = 12  # BCM numbering
 PWM_FREQUENCY = 1000  # 1kHz
 
+
+def open_gpio():
+    """
+    The RPi.GPIO module, or a fake_gpio.FakeGPIO only when COLDPLAYT_FAKE_GPIO is set
+    (e.g. on a development machine), so the pump is never silently left undriven.
+    """
+    if os.environ.get("COLDPLAYT_FAKE_GPIO"):
+        return fake_gpio.FakeGPIO()
+    try:
+        import RPi.GPIO as GPIO
+    except ImportError:
+        raise ImportError("RPi.GPIO is not installed; set COLDPLAYT_FAKE_GPIO=1 to use a simulated GPIO") from None
+    return GPIO
+
+
 class PumpController:
-    def __init__(self):
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(PWM_GPIO_PIN, GPIO.OUT)
-        self.pwm = GPIO.PWM(PWM_GPIO_PIN, PWM_FREQUENCY)
+    def __init__(self, gpio=None):
+        self.gpio = gpio or open_gpio()
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(PWM_GPIO_PIN, self.gpio.OUT)
+        self.pwm = self.gpio.PWM(PWM_GPIO_PIN, PWM_FREQUENCY)
         self.pwm.start(0)
+        self.duty_cycle = 0.0
         self.flow_rate = self.load_flow_rate()
 
     def set_pwm(self, duty_cycle):
@@ -21,6 +40,7 @@ class PumpController:
         # Change duty cycle to work with pump by halving it
         # duty_cycle = duty_cycle / 2 + 10
         self.pwm.ChangeDutyCycle(duty_cycle)
+        self.duty_cycle = duty_cycle
 
     def save_flow_rate(self, rate):
         try:
@@ -43,7 +63,7 @@ class PumpController:
 
     def cleanup(self):
         self.pwm.stop()
-        GPIO.cleanup()
+        self.gpio.cleanup()
 
 # --- Run from command line ---
 if __name__ == '__main__':
@@ -0,0 +1,153 @@
+import argparse
+import functools
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from decimate import decimate, minmax_indices, points_for_axes
+
+# -----------------------------------------------------------------------------
+# Headless rendering of the analysis grid (analysis_grid_<run>.png)
+#
+# Figures are built with matplotlib's object API on the Agg backend: no pyplot figure
+# manager and no extra redraw after saving. The seaborn style is applied once per
+# process, and runs render in parallel worker processes.
+# -----------------------------------------------------------------------------
+PLOT_COLUMNS = ['seconds', 'T1_F', 'T2_F', 'T3_F', 'fluid_in_F', 'fluid_out_F', 'P_in_psi', 'P_out_psi',
+                'delta_p', 'Q_dot', 'pump_power_calc', 'heater_power', 'efficiency']
+RASTERIZE_POINTS = 2000  # Lines and scatters with more points are drawn as images in vector outputs (.pdf/.svg)
+
+
+@functools.lru_cache(maxsize=None)
+def setup() -> None:
+    """Agg backend and the shared seaborn style, once per process."""
+    import matplotlib
+    matplotlib.use('Agg', force=True)  # Figures are only saved, never shown
+    import seaborn as sns
+    sns.set(style="whitegrid")
+    matplotlib.rcParams['agg.path.chunksize'] = 10000  # Long paths are drawn in chunks
+
+
+def render_grid(df, plot_file: str, max_points: int = None, method: str = "minmax", dpi: int = 300) -> float:
+    """
+    Save the 2x2 analysis grid and return the render time in seconds. Each series is
+    decimated to `max_points` (default: two points per horizontal pixel of its panel).
+    """
+    setup()
+    from matplotlib.figure import Figure
+
+    start = time.perf_counter()
+    fig = Figure(figsize=(14, 10), dpi=dpi)  # Panel sizes in pixels match the saved figure
+    axs = fig.subplots(2, 2)
+    budget = {ax: max_points or points_for_axes(ax) for ax in axs.flat}
+
+    def line(ax, column, **kwargs):
+        x, y = decimate(df['seconds'], df[column], budget[ax], method)
+        ax.plot(x, y, rasterized=len(x) > RASTERIZE_POINTS, **kwargs)
+
+    # Plot 1: Temperature vs Time
+    for col in ['T1_F', 'T2_F', 'T3_F', 'fluid_in_F', 'fluid_out_F']:
+        if col in df.columns:
+            line(axs[0, 0], col, label=col)
+    axs[0, 0].set_title("Temperature vs Time")
+    axs[0, 0].set_ylabel("°C")
+    axs[0, 0].legend()
+
+    # Plot 2: Pressure vs Time
+    for col in ['P_in_psi', 'P_out_psi', 'delta_p']:
+        if col in df.columns:
+            line(axs[0, 1], col, label=col)
+    axs[0, 1].set_title("Pressure vs Time")
+    axs[0, 1].set_ylabel("Pressure (Pa)")
+    axs[0, 1].legend()
+
+    # Plot 3: Heat power vs pump power ( + efficiency)
+    if 'Q_dot' in df.columns and 'pump_power_calc' in df.columns:
+        keep = minmax_indices(df['heater_power'].to_numpy(dtype=float), budget[axs[1, 0]])
+        sc = axs[1, 0].scatter(df['pump_power_calc'].iloc[keep], df['heater_power'].iloc[keep], alpha=0.6,
+                               rasterized=len(keep) > RASTERIZE_POINTS)
+        axs[1, 0].set_title("Heat Transfer Rate and Efficiency")
+        axs[1, 0].set_xlabel("Pump Power (W)")
+        axs[1, 0].set_ylabel("Heat Transfer Rate (W)")
+        fig.colorbar(sc, ax=axs[1, 0], label="Efficiency")
+
+    # Plot 4: Efficiency over time
+    if 'efficiency' in df.columns:
+        line(axs[1, 1], 'efficiency')
+        axs[1, 1].set_title("System Efficiency Over Time")
+        axs[1, 1].set_ylabel("Efficiency")
+
+    for ax in axs.flat:
+        ax.set_xlabel("Time")
+        ax.tick_params(axis='x', rotation=30)
+
+    fig.tight_layout()
+    fig.savefig(plot_file, dpi=dpi)
+    return time.perf_counter() - start
+
+
+def render_computed(computed_csv: str, plot_file: str, max_points: int = None, method: str = "minmax",
+                    dpi: int = 300) -> float:
+    """Render a figure from a computed_<run>.csv, reading only the columns it plots."""
+    import pandas as pd
+
+    present = pd.read_csv(computed_csv, nrows=0).columns
+    df = pd.read_csv(computed_csv, usecols=[c for c in PLOT_COLUMNS if c in present])
+    return render_grid(df, plot_file, max_points, method, dpi)
+
+
+def plot_options(config: dict) -> dict:
+    """render_grid keyword arguments from config.yaml's plot section."""
+    options = config.get('plot', {})
+    return {'max_points': options.get('analysis_max_points'), 'method': options.get('decimation', 'minmax'),
+            'dpi': options.get('analysis_dpi', 300)}
+
+
+def render_worker(args: tuple) -> float:
+    computed_csv, plot_file, options = args
+    return render_computed(computed_csv, plot_file, **options)
+
+
+def render_many(items: list, config: dict, jobs: int = None):
+    """Render (computed_csv, plot_file) pairs in a process pool; yields (plot_file, render seconds) as each finishes."""
+    options = plot_options(config)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=setup) as pool:
+        futures = {pool.submit(render_worker, (computed, plot_file, options)): plot_file
+                   for computed, plot_file in items}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+# --- Run from command line: regenerate figures from existing computed CSVs ---
+def main() -> None:
+    import yaml
+    from analyze import output_paths
+
+    parser = argparse.ArgumentParser(description="Regenerate analysis_grid figures from computed_<run>.csv files.")
+    parser.add_argument('runs', nargs='*', help="run logs (default: data_*.csv)")
+    parser.add_argument('--jobs', type=int, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    with open("config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+    items = []
+    for run in sorted(args.runs or glob.glob('data_*.csv')):
+        computed_csv, plot_file = output_paths(run)
+        if os.path.exists(computed_csv):
+            items.append((computed_csv, plot_file))
+        else:
+            print(f"  {run}: no {computed_csv}; run 'python analyze.py {run}' first")
+
+    start = time.perf_counter()
+    total = 0.0
+    for plot_file, seconds in render_many(items, config, args.jobs):
+        total += seconds
+        print(f"  {plot_file}  {seconds:.2f} s")
+    wall = time.perf_counter() - start
+    if items:
+        print(f"{len(items)} figures in {wall:.1f} s ({total / len(items):.2f} s each, {total / wall:.1f}x parallel)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+import collect
+import fake_spi
+from collect import is_channel, load_config, sensor_channels
+from runlog import MISSING
+from rundata import RunData
+
+# -----------------------------------------------------------------------------
+# Replays a recorded run through fake MCP3008s, so main.py, plot_realtime.py and
+# anything else reading collect.py sees the logged readings as if the rig were live:
+# at the recorded pace, N times faster, or as fast as a load test asks for.
+# -----------------------------------------------------------------------------
+SUSTAINED_MISS_FRACTION = 0.01  # A rate is sustainable with at most 1% of samples late or skipped
+LOG_PREFIX = os.path.join("replays", "replay")  # Replayed logs: replays/replay_<timestamp>.csv, not in runs.json
+BUS_PREFIX = "coldplayt_replay"  # Replays publish on coldplayt_replay_<pid>, never on a live run's bus
+
+
+class ReplayFinished(KeyboardInterrupt):
+    """Raised from an SPI read once the recording (or the replay's time limit) runs out; ends a run like Ctrl-C."""
+
+
+class ReplaySource:
+    """
+    A logged run as per-channel MCP3008 readings: pass as FakeSpiDev(values=source), or use install().
+    The row served follows a replay clock running `speed` times faster than the recording.
+    A sample never mixes rows: the row only advances when a channel is read a second time.
+    """
+
+    def __init__(self, path: str, config: dict, speed: float = 1.0, loop: bool = False,
+                 duration_s: Optional[float] = None):
+        run = RunData.load(path, config)
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.duration_s = duration_s
+        self.seconds = run['seconds'] - run['seconds'][0]
+        self.rows = len(run)
+        if self.rows < 2:
+            raise ValueError(f"{path} has too few rows to replay")
+        self.recorded_rate_hz = 1 / float(np.median(np.diff(self.seconds)))
+
+        # Channel -> recorded codes, as wired in config.yaml. Missing readings, and wired
+        # sensors the recording does not have, replay as missing (no conversion returned)
+        self.channels = {}
+        for label, ch in sensor_channels(config).items():
+            if is_channel(ch) and label in run.raw and run.raw[label].dtype == np.uint16:
+                self.channels[ch] = run.raw[label]
+
+        self.start_time = None
+        self.index = 0
+        self.served = 0  # Samples read
+        self.rows_visited = set()
+        self._read = set()
+        self._lock = threading.Lock()
+
+    def _advance(self) -> None:
+        now = time.monotonic()
+        if self.start_time is None:
+            self.start_time = now
+        elapsed = now - self.start_time
+        if self.duration_s is not None and elapsed >= self.duration_s:
+            raise ReplayFinished()
+        position = elapsed * self.speed
+        if position > self.seconds[-1]:
+            if not self.loop:
+                raise ReplayFinished()
+            position %= self.seconds[-1]
+        self.index = int(np.searchsorted(self.seconds, position, 'right')) - 1
+        self.served += 1
+        self.rows_visited.add(self.index)
+
+    def __call__(self, bus: int, device: int, channel: int) -> Optional[int]:
+        global_channel = device * 8 + channel
+        with self._lock:
+            if not self._read or global_channel in self._read:
+                self._read.clear()
+                self._advance()  # New sample
+            self._read.add(global_channel)
+            codes = self.channels.get(global_channel)
+            if codes is None or codes[self.index] == MISSING:
+                return None
+            return int(codes[self.index])
+
+
+def install(source: ReplaySource) -> None:
+    """Make collect.py (read_all, read_adc_channel, AcquisitionPlan) read from `source`."""
+    chips = []
+    for device in (0, 1):
+        spi = fake_spi.FakeSpiDev(values=source)
+        spi.open(0, device)
+        chips.append(spi)
+    collect.use_devices(*chips)
+    collect._plan = None  # read_all() compiles its plan against the new devices
+
+
+def replay_bus(config: dict, name: Optional[str] = None) -> dict:
+    """config with the sample bus renamed for a replay (default: coldplayt_replay_<pid>)."""
+    return {**config, 'bus': dict(config.get('bus', {}), name=name or f"{BUS_PREFIX}_{os.getpid()}")}
+
+
+def replay_config(config: dict, source: ReplaySource, rate_hz: Optional[float] = None,
+                  bus_name: Optional[str] = None) -> dict:
+    """
+    config with the sample rate set to the recorded rate times the replay speed (or `rate_hz`),
+    publishing on a bus of its own so viewers of a live run never see replayed samples.
+    """
+    sampling = dict(config.get('sampling', {}), sample_rate_hz=rate_hz or source.recorded_rate_hz * source.speed)
+    return {**replay_bus(config, bus_name), 'sampling': sampling}
+
+
+def run_main(path: str, config: dict, speed: float = 1.0, rate_hz: Optional[float] = None,
+             duration_s: Optional[float] = None, loop: bool = False, bus_name: Optional[str] = None) -> dict:
+    """
+    main.py's logging loop on a replayed run; returns its counters plus the replay's. The log is
+    written to replays/ and kept out of runs.json, so it never becomes the latest run.
+    """
+    import main
+
+    source = ReplaySource(path, config, speed, loop=loop, duration_s=duration_s)
+    install(source)
+    stats = main.main(replay_config(config, source, rate_hz, bus_name), prefix=LOG_PREFIX, cataloged=False)
+    stats.update(source=path, speed=speed, recorded_rate_hz=source.recorded_rate_hz,
+                 rows_replayed=len(source.rows_visited), source_rows=source.rows)
+    return stats
+
+
+# -----------------------------------------------------------------------------
+# Load tests
+# -----------------------------------------------------------------------------
+def sustainable(stats: dict) -> bool:
+    missed = stats['overruns'] + stats['skipped']
+    return stats['dropped'] == 0 and missed <= SUSTAINED_MISS_FRACTION * max(stats['samples'], 1)
+
+
+def find_max_rate(path: str, config: dict, seconds: float = 5.0, start_hz: Optional[float] = None,
+                  limit_hz: float = 20000.0) -> Optional[float]:
+    """
+    Double the sample rate until main.py can no longer keep up (overruns, skipped
+    deadlines or dropped rows), then bisect once. Each step runs in a scratch directory.
+    """
+    rate = start_hz or ReplaySource(path, config).recorded_rate_hz
+    best, worst = None, None
+    cwd = os.getcwd()
+    path = os.path.abspath(path)
+    print(f"{'rate Hz':>9} {'samples':>8} {'late':>6} {'skipped':>8} {'dropped':>8} {'backlog':>8} {'max lateness':>13}")
+    while rate <= limit_hz:
+        with tempfile.TemporaryDirectory() as scratch:
+            os.chdir(scratch)
+            try:
+                with open(os.devnull, 'w') as quiet:
+                    stdout, sys.stdout = sys.stdout, quiet
+                    try:
+                        stats = run_main(path, config, rate_hz=rate, duration_s=seconds, loop=True)
+                    finally:
+                        sys.stdout = stdout
+            finally:
+                os.chdir(cwd)
+        ok = sustainable(stats)
+        print(f"{rate:9.0f} {stats['samples']:8d} {stats['overruns']:6d} {stats['skipped']:8d} {stats['dropped']:8d} "
+              f"{stats['buffer_high_water']:8d} {stats['max_lateness_ms']:10.2f} ms{'' if ok else '  (not sustained)'}")
+        if ok:
+            best = rate
+            if worst is not None:
+                break
+            rate *= 2
+        else:
+            worst = rate
+            if best is None or worst / best < 1.2:
+                break
+            rate = (best + worst) / 2
+    return best
+
+
+def dashboard_fps(path: str, config: dict, speed: float, seconds: float = 10.0) -> dict:
+    """
+    Replay `path` through main.py in a child process and draw plot_realtime's Dashboard from
+    the live sample bus as fast as it goes, blitting like the on-screen animation (on Agg).
+    """
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    from plot_realtime import Dashboard
+
+    config = replay_bus(config)  # The child publishes there, and the dashboard reads it
+    with tempfile.TemporaryDirectory() as scratch:
+        shutil.copy("config.yaml", scratch)  # The child's log goes to the scratch directory
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'run', os.path.abspath(path),
+                                  '--speed', str(speed), '--duration', str(seconds + 5),
+                                  '--bus-name', config['bus']['name']],
+                                 cwd=scratch, stdout=subprocess.DEVNULL)
+        try:
+            time.sleep(2.0)  # Bus up and a few samples in
+            dashboard = Dashboard(config)
+            if not dashboard.reader.using_bus:
+                raise RuntimeError("main.py's sample bus is not up (is bus.enabled off?)")
+            canvas = dashboard.fig.canvas
+            canvas.draw()
+            background = canvas.copy_from_bbox(dashboard.fig.bbox)
+            frame_ms = []
+            start = time.perf_counter()
+            while time.perf_counter() - start < seconds:
+                frame_start = time.perf_counter()
+                # What FuncAnimation(blit=True) does per frame (animate() redraws fully on rescales)
+                canvas.restore_region(background)
+                for artist in dashboard.animate(len(frame_ms)):
+                    dashboard.fig.draw_artist(artist)
+                canvas.blit(dashboard.fig.bbox)
+                frame_ms.append(1000 * (time.perf_counter() - frame_start))
+            wall = time.perf_counter() - start
+        finally:
+            child.send_signal(signal.SIGINT)  # Ctrl-C, so main.py closes the bus
+            child.wait()
+    frame_ms.sort()
+    return {'frames': len(frame_ms), 'fps': len(frame_ms) / wall, 'frame_ms_median': statistics.median(frame_ms),
+            'frame_ms_p95': frame_ms[int(0.95 * (len(frame_ms) - 1))]}
+
+
+# -----------------------------------------------------------------------------
+# Checking a replayed log against the original analysis
+# -----------------------------------------------------------------------------
+def derived_inputs(name: str) -> set:
+    """Raw sensor columns a RunData derived column is computed from."""
+    if name.endswith('_F'):
+        return {name[:-2]}
+    if name.endswith('_psi'):
+        return {name[:-4]}
+    if name in ('delta_p', 'pump_power_calc', 'pump_cost_per_day'):
+        return {'P_in', 'P_out'}
+    if name == 'Q_dot':
+        return {'fluid_in', 'fluid_out'}
+    if name == 'efficiency':
+        return {'P_in', 'P_out', 'fluid_in', 'fluid_out'}
+    return set()
+
+
+def replayed_sensors(original: RunData, config: dict) -> list:
+    """Sensor columns a replay reproduces: wired in config.yaml and recorded (not all missing)."""
+    channels = sensor_channels(config)
+    return [c for c, codes in original.raw.items()
+            if is_channel(channels.get(c)) and codes.dtype == np.uint16 and (codes != MISSING).any()]
+
+
+def verify(replayed: str, source: str, config: dict) -> dict:
+    """
+    Match every row of a log written during replay to the recorded row it came from (by the raw
+    readings of the sensors both have), then compare the replayed row's calibrated columns
+    computed from those sensors with computed_<source>.csv.
+    """
+    import pandas as pd
+    from analyze import output_paths
+
+    run, original = RunData.load(replayed, config), RunData.load(source, config)
+    sensors = [c for c in replayed_sensors(original, config) if c in run.raw and run.raw[c].dtype == np.uint16]
+    if not sensors:
+        raise ValueError(f"No sensor is both recorded in {source} and wired in config.yaml")
+    recorded = pd.DataFrame({c: original.raw[c] for c in sensors})
+    recorded['source_row'] = np.arange(len(original))
+    recorded = recorded.drop_duplicates(sensors)  # Identical readings give identical derived values
+    matched = pd.DataFrame({c: run.raw[c] for c in sensors}).merge(recorded, on=sensors, how='left')['source_row']
+    found = matched.notna().to_numpy()
+
+    report = {'rows': len(run), 'rows_matched': int(found.sum()), 'sensors': sensors, 'columns': {}}
+    computed_csv = output_paths(source)[0]
+    if not os.path.exists(computed_csv):
+        report['computed_csv'] = None
+        return report
+    computed = pd.read_csv(computed_csv)
+    report['computed_csv'] = computed_csv
+    source_rows = matched[found].astype(np.int64).to_numpy()
+    for name in run.derived_columns:
+        if name not in computed or name not in original or not derived_inputs(name) <= set(sensors):
+            continue
+        expected = computed[name].to_numpy(dtype=np.float64)[source_rows]
+        actual = np.asarray(run[name], dtype=np.float64)[found]
+        recomputed = np.asarray(original[name], dtype=np.float64)[source_rows]
+        report['columns'][name] = {
+            # Replay reproduced the current calibration of the recorded row
+            'reproduced': not (~np.isclose(actual, recomputed, rtol=1e-9, atol=1e-12, equal_nan=True)).any(),
+            'mismatched': int((~np.isclose(actual, expected, rtol=1e-9, atol=1e-12, equal_nan=True)).sum()),
+            # Differences already present without replay: computed_*.csv predates the current calibration
+            'stale': int((~np.isclose(recomputed, expected, rtol=1e-9, atol=1e-12, equal_nan=True)).sum()),
+        }
+    return report
+
+
+def print_verification(report: dict) -> bool:
+    """
+    Print a verify() report. True when every replayed row came from the recording and
+    reproduces its derived columns; a stale computed CSV is reported but not a failure.
+    """
+    print(f"{report['rows_matched']} of {report['rows']} replayed rows found in the recording "
+          f"(compared on {', '.join(report['sensors'])})")
+    ok = report['rows_matched'] == report['rows']
+    if report['rows_matched'] == 0:
+        return False  # Not a replay of this recording
+    if report['computed_csv'] is None:
+        print("No computed CSV for the recording; run 'python analyze.py <recording>' first to compare outputs")
+        return ok
+    for name, counts in report['columns'].items():
+        if not counts['reproduced']:
+            ok = False
+            print(f"  {name}: replayed values differ from the recording's under the same calibration")
+        elif counts['mismatched']:
+            print(f"  {name}: {counts['mismatched']} rows differ from {report['computed_csv']}, "
+                  f"which was computed with a different calibration (re-run analyze.py)")
+    if not any(counts['mismatched'] for counts in report['columns'].values()):
+        print(f"All {len(report['columns'])} derived columns match {report['computed_csv']}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded run through the live pipeline.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="run main.py on replayed readings")
+    run.add_argument('source', help="recorded data_*.csv (or .runlog)")
+    run.add_argument('--speed', type=float, default=1.0, help="replay N times faster than recorded (default: 1)")
+    run.add_argument('--rate', type=float, help="sample rate in Hz (default: recorded rate x speed)")
+    run.add_argument('--duration', type=float, help="stop after this many seconds")
+    run.add_argument('--loop', action='store_true', help="start over at the end of the recording")
+    run.add_argument('--verify', action='store_true', help="compare the new log with computed_<source>.csv")
+    run.add_argument('--bus-name', help="sample bus to publish on (default: coldplayt_replay_<pid>)")
+    max_rate = commands.add_parser('max-rate', help="find the highest sample rate main.py sustains")
+    max_rate.add_argument('source')
+    max_rate.add_argument('--seconds', type=float, default=5.0, help="length of each trial")
+    max_rate.add_argument('--start', type=float, help="first rate to try in Hz (default: recorded rate)")
+    dashboard = commands.add_parser('dashboard', help="plot_realtime frame rate while replaying")
+    dashboard.add_argument('source')
+    dashboard.add_argument('--speed', type=float, default=10.0)
+    dashboard.add_argument('--seconds', type=float, default=10.0)
+    check = commands.add_parser('verify', help="compare a replayed log with computed_<source>.csv")
+    check.add_argument('replayed')
+    check.add_argument('source')
+    args = parser.parse_args()
+
+    config = load_config()
+    if args.command == 'run':
+        stats = run_main(args.source, config, args.speed, args.rate, args.duration, args.loop, args.bus_name)
+        print(f"Replayed {stats['rows_replayed']} of {stats['source_rows']} recorded rows "
+              f"at {args.speed:g}x ({stats['samples']} samples)")
+        if args.verify and not print_verification(verify(stats['filename'], args.source, config)):
+            sys.exit(1)
+    elif args.command == 'max-rate':
+        best = find_max_rate(args.source, config, args.seconds, args.start)
+        print(f"Maximum sustained sample rate: {best:.0f} Hz" if best else "Not sustained even at the first rate")
+    elif args.command == 'dashboard':
+        stats = dashboard_fps(args.source, config, args.speed, args.seconds)
+        print(f"{stats['frames']} frames, {stats['fps']:.1f} fps, frame median {stats['frame_ms_median']:.1f} ms, "
+              f"p95 {stats['frame_ms_p95']:.1f} ms (target {config.get('plot', {}).get('refresh_interval_ms', 100)} ms)")
+    else:
+        if not print_verification(verify(args.replayed, args.source, config)):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
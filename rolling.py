@@ -0,0 +1,242 @@
+import math
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from compute import (calculate_efficiency, calculate_heat_transfer, calculate_pump_power,
+                     get_calibration_engine)
+
+# -----------------------------------------------------------------------------
+# Incremental live metrics: rolling means, EWMAs and slopes updated in O(1) per
+# sample, with steady-state detection from temperature slopes
+# -----------------------------------------------------------------------------
+class RollingWindow:
+    """
+    Mean and least-squares slope of (t, y) over the last `window_s` seconds.
+    Running sums are updated as samples enter and leave the window; NaNs are skipped.
+    """
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self._samples = deque()
+        self._t0 = None  # Times are offset by the first one to keep the sums well conditioned
+        self._n = 0
+        self._sum_t = self._sum_y = self._sum_tt = self._sum_ty = 0.0
+
+    def update(self, t: float, y: float) -> None:
+        if self._t0 is None:
+            self._t0 = t
+        x = t - self._t0
+        samples = self._samples
+        while samples and samples[0][0] < x - self.window_s:
+            old_x, old_y = samples.popleft()
+            self._add(old_x, old_y, -1)
+        if not math.isnan(y):
+            samples.append((x, y))
+            self._add(x, y, 1)
+
+    def _add(self, x: float, y: float, sign: int) -> None:
+        self._n += sign
+        self._sum_t += sign * x
+        self._sum_y += sign * y
+        self._sum_tt += sign * x * x
+        self._sum_ty += sign * x * y
+
+    @property
+    def count(self) -> int:
+        return self._n
+
+    @property
+    def span_s(self) -> float:
+        return self._samples[-1][0] - self._samples[0][0] if self._samples else 0.0
+
+    @property
+    def mean(self) -> float:
+        return self._sum_y / self._n if self._n else math.nan
+
+    @property
+    def slope(self) -> float:
+        """Change of y per second over the window (NaN until two distinct times are seen)."""
+        n = self._n
+        denominator = n * self._sum_tt - self._sum_t ** 2
+        if n < 2 or denominator <= 1e-12 * max(n * self._sum_tt, 1.0):
+            return math.nan
+        return (n * self._sum_ty - self._sum_t * self._sum_y) / denominator
+
+
+class Ewma:
+    """Exponentially weighted moving average with a time-based half-life (uneven sample spacing is fine)."""
+
+    def __init__(self, halflife_s: float):
+        self.halflife_s = halflife_s
+        self.value = math.nan
+        self._last_t = None
+
+    def update(self, t: float, y: float) -> float:
+        if math.isnan(y):
+            return self.value
+        if self._last_t is None or math.isnan(self.value):
+            self.value = y
+        else:
+            alpha = 1.0 - 0.5 ** (max(t - self._last_t, 0.0) / self.halflife_s)
+            self.value += alpha * (y - self.value)
+        self._last_t = t
+        return self.value
+
+
+class SteadyState:
+    """
+    Steady once every tracked temperature slope has stayed within `slope_threshold`
+    (°C per minute) for `hold_s` seconds. Averages of each quantity are accumulated
+    over all steady samples.
+    """
+
+    def __init__(self, slope_threshold: float = 0.5, hold_s: float = 60.0):
+        self.slope_threshold = slope_threshold
+        self.hold_s = hold_s
+        self.steady = False
+        self.periods = []  # [start_s, end_s] of each steady stretch
+        self._calm_since = None
+        self._sums = {}
+        self._counts = {}
+
+    def update(self, t: float, slopes_per_s: list, values: dict) -> bool:
+        calm = bool(slopes_per_s) and all(not math.isnan(s) and abs(60 * s) <= self.slope_threshold
+                                          for s in slopes_per_s)
+        if not calm:
+            self._calm_since = None
+            self.steady = False
+        elif self._calm_since is None:
+            self._calm_since = t
+        elif not self.steady and t - self._calm_since >= self.hold_s:
+            self.steady = True
+            self.periods.append([t, t])
+
+        if self.steady:
+            self.periods[-1][1] = t
+            for name, value in values.items():
+                if not math.isnan(value):
+                    self._sums[name] = self._sums.get(name, 0.0) + value
+                    self._counts[name] = self._counts.get(name, 0) + 1
+        return self.steady
+
+    @property
+    def duration_s(self) -> float:
+        return sum(end - start for start, end in self.periods)
+
+    def averages(self) -> dict:
+        return {name: self._sums[name] / self._counts[name] for name in self._sums}
+
+
+class LiveMetrics:
+    """
+    Rolling mean, EWMA and slope of Q_dot, delta_p, efficiency and the steady-state
+    temperatures, plus steady-state averages for the whole run.
+
+    Fed either with raw rows in the logger's column order (update_row, as main.py
+    does; calibrated by table lookup like calibrate_df) or with calibrated
+    DataFrame rows (update_frame, as the live viewers get them).
+    """
+
+    QUANTITIES = ('Q_dot', 'delta_p', 'efficiency')
+
+    def __init__(self, config: dict, columns: Optional[list] = None):
+        options = config.get('rolling', {})
+        self.steady_columns = list(options.get('steady_columns', ['fluid_in_F', 'fluid_out_F']))
+        self.names = list(self.QUANTITIES) + [c for c in self.steady_columns if c not in self.QUANTITIES]
+        window_s = options.get('window_s', 30.0)
+        halflife_s = options.get('ewma_halflife_s', 10.0)
+        self.windows = {name: RollingWindow(window_s) for name in self.names}
+        self.ewmas = {name: Ewma(halflife_s) for name in self.names}
+        self.steady_state = SteadyState(options.get('steady_slope_c_per_min', 0.5), options.get('steady_hold_s', 60.0))
+        self.samples = 0
+        self.last_t = math.nan
+
+        # Same constants as calibrate_df
+        calibration = config['calibration']
+        self._cp = config.get('fluid_cp', 1090)
+        self._m_dot = 0.01
+        self._flow_rate = calibration.get('flow_rate_m3s', 0.0001)
+        self._pump_power = calibration.get('pump_power')
+        self._columns = list(columns) if columns is not None else None
+        if columns is not None:
+            engine = get_calibration_engine(config)
+            self._thermistor = engine.tables.get('thermistor')
+            index = {name: i for i, name in enumerate(columns)}
+            self._temperature_index = {f"{c}_F": index[c] for c in ('T1', 'T2', 'T3', 'fluid_in', 'fluid_out') if c in index}
+            self._p_in, self._p_out = index.get('P_in'), index.get('P_out')
+            self._has_pump_power = 'pump_power' in index
+            self._has_heater_power = 'heater_power' in index
+
+    # --- Inputs ---
+    def update_row(self, t: float, row) -> None:
+        """One raw sample, values in the `columns` order given at construction (None/0xFFFF: missing)."""
+        def code(i):
+            value = row[i] if i is not None else None
+            return math.nan if value is None or value >= 0xFFFF else value
+
+        values = {}
+        table = self._thermistor
+        for name, i in self._temperature_index.items():
+            raw = code(i)
+            values[name] = float(table[int(raw)]) if table is not None and not math.isnan(raw) and raw < len(table) else math.nan
+
+        if self._p_in is not None and self._p_out is not None:
+            delta_p = code(self._p_out) - code(self._p_in)
+            pump_power = self._pump_power if self._has_pump_power else calculate_pump_power(self._flow_rate, delta_p)
+        else:
+            delta_p = pump_power = math.nan
+        values['delta_p'] = delta_p
+
+        q_dot = efficiency = math.nan
+        if self._has_heater_power and 'fluid_in_F' in values and 'fluid_out_F' in values:
+            q_dot = calculate_heat_transfer(self._m_dot, self._cp, values['fluid_in_F'], values['fluid_out_F'])
+            efficiency = float(calculate_efficiency(pump_power, q_dot)) if pump_power is not None else math.nan
+        values['Q_dot'] = q_dot
+        values['efficiency'] = efficiency
+        self.update(t, values)
+
+    def update_frame(self, df) -> None:
+        """Calibrated rows (calibrate_df output), oldest first."""
+        seconds = df['seconds'].to_numpy(dtype=np.float64)
+        columns = {name: df[name].to_numpy(dtype=np.float64) for name in self.names if name in df}
+        for i, t in enumerate(seconds):
+            self.update(float(t), {name: float(values[i]) for name, values in columns.items()})
+
+    def update(self, t: float, values: dict) -> None:
+        """One sample of calibrated quantities, e.g. {'Q_dot': 12.0, 'fluid_in_F': 21.3, ...}."""
+        for name in self.names:
+            y = values.get(name, math.nan)
+            y = math.nan if y is None else y
+            self.windows[name].update(t, y)
+            self.ewmas[name].update(t, y)
+        slopes = [self.windows[name].slope for name in self.steady_columns]
+        self.steady_state.update(t, slopes, {name: values.get(name, math.nan) for name in self.names})
+        self.samples += 1
+        self.last_t = t
+
+    # --- Outputs ---
+    def snapshot(self) -> dict:
+        """{name: {'mean', 'ewma', 'slope_per_min'}} for the current window."""
+        return {name: {'mean': self.windows[name].mean, 'ewma': self.ewmas[name].value,
+                       'slope_per_min': 60 * self.windows[name].slope}
+                for name in self.names}
+
+    def steady_summary(self) -> dict:
+        """Steady-state report for the run, JSON-friendly (stored in runs.json by main.py)."""
+        averages = self.steady_state.averages()
+        return {
+            'steady_s': round(self.steady_state.duration_s, 3),
+            'periods': [[round(a, 3), round(b, 3)] for a, b in self.steady_state.periods],
+            'averages': {name: round(value, 6) for name, value in averages.items()},
+        }
+
+    def summary(self) -> str:
+        steady = self.steady_summary()
+        if not steady['periods']:
+            return (f"No steady state reached (temperature slopes above {self.steady_state.slope_threshold} °C/min "
+                    f"or steady for under {self.steady_state.hold_s:g} s)")
+        lines = [f"Steady state for {steady['steady_s']:.0f} s in {len(steady['periods'])} period(s); averages:"]
+        lines += [f"  {name}: {value:.3f}" for name, value in steady['averages'].items()]
+        return "\n".join(lines)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+from compute import (calculate_efficiency, calculate_heat_transfer, calculate_pump_cost,
+                     calculate_pump_power, get_calibration_engine)
+from runlog import FLOAT_COLUMNS, MISSING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# -----------------------------------------------------------------------------
+# Compact in-memory run: raw ADC columns as uint16, derived columns computed on demand
+# -----------------------------------------------------------------------------
+THERMISTOR_COLUMNS = ('T1', 'T2', 'T3', 'fluid_in', 'fluid_out')
+PRESSURE_COLUMNS = ('P_in', 'P_out')
+M_DOT = 0.01  # kg/s, as in calibrate_df
+
+
+def calibration_key(config: dict) -> str:
+    """Everything in config.yaml the derived columns depend on."""
+    return json.dumps({'calibration': config['calibration'], 'fluid_cp': config.get('fluid_cp')},
+                      sort_keys=True, default=str)
+
+
+def compact(values: np.ndarray) -> np.ndarray:
+    """uint16 copy of a raw ADC column (NaN -> MISSING), or the column unchanged if it holds anything else."""
+    values = np.asarray(values)
+    if values.dtype == np.uint16:
+        return values
+    if values.dtype.kind in 'iu':
+        if len(values) == 0 or (values.min() >= 0 and values.max() < MISSING):
+            return values.astype(np.uint16)
+        return values
+    if values.dtype.kind == 'f':
+        missing = np.isnan(values)
+        present = values[~missing]
+        if (present >= 0).all() and (present < MISSING).all() and (present == np.floor(present)).all():
+            return np.where(missing, MISSING, values).astype(np.uint16)
+    return values
+
+
+class RunData:
+    """
+    One run's columns, with calibrated quantities computed from compute.py the first time
+    they are read and memoized until the calibration changes:
+
+        run = RunData.load("data_<timestamp>.csv", config)
+        run['fluid_in_F']   # converts fluid_in only
+        run['efficiency']   # computes Q_dot and pump_power_calc on the way, and keeps them
+        run.config = other  # a different calibration drops the memoized columns
+
+    Raw ADC columns are held as uint16 with MISSING for absent readings (2 bytes per
+    sample instead of 8); `seconds` and the other FLOAT_COLUMNS stay float64. Derived
+    columns and their conditions are the same as calibrate_df's.
+    """
+
+    def __init__(self, columns: dict, config: dict):
+        self.raw = {name: compact(values) if name not in FLOAT_COLUMNS else np.asarray(values, dtype=np.float64)
+                    for name, values in columns.items()}
+        self._length = len(next(iter(self.raw.values()))) if self.raw else 0
+        self._cache = {}
+        self._key = None
+        self.config = config
+
+    # --- Construction ---
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, config: dict) -> RunData:
+        columns = {}
+        for name in df.columns:
+            values = df[name].to_numpy()
+            if values.dtype == object:
+                import pandas as pd
+                numeric = pd.to_numeric(df[name], errors='coerce')  # e.g. "None" placeholders
+                if numeric.notna().any() or df[name].isna().all():
+                    values = numeric.to_numpy(dtype=np.float64)
+            columns[name] = values
+        return cls(columns, config)
+
+    @classmethod
+    def from_records(cls, records: np.ndarray, config: dict) -> RunData:
+        """From runlog.open_runlog records; uint16 columns are used as they are (no copy)."""
+        return cls({name: records[name] for name in records.dtype.names}, config)
+
+    @classmethod
+    def load(cls, path: str, config: dict, start: Optional[float] = None, end: Optional[float] = None) -> RunData:
+        """A .csv, .csv.gz or .runlog run log, or the start/end window of it (see timeindex.py)."""
+        if start is not None or end is not None:
+            from timeindex import read_window
+            return cls.from_frame(read_window(path, start, end), config)
+        if path.endswith('.runlog'):
+            from runlog import open_runlog
+            return cls.from_records(open_runlog(path)[1], config)
+        import pandas as pd
+        return cls.from_frame(pd.read_csv(path), config)
+
+    # --- Configuration ---
+    @property
+    def config(self) -> dict:
+        return self._config
+
+    @config.setter
+    def config(self, config: dict) -> None:
+        key = calibration_key(config)
+        if key != self._key:
+            self._cache.clear()
+        self._config, self._key = config, key
+        self._engine = get_calibration_engine(config)
+
+    def invalidate(self) -> None:
+        """Drop every memoized column, e.g. after editing the config dict in place."""
+        self._cache.clear()
+        self.config = self._config
+
+    # --- Columns ---
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.raw or name in self.derived_columns
+
+    @property
+    def derived_columns(self) -> list:
+        """Derived columns this run can provide, in calibrate_df's order."""
+        raw = self.raw
+        names = ['heater_power_calc']
+        names += [f'{c}_F' for c in THERMISTOR_COLUMNS if c in raw]
+        names += [f'{c}_psi' for c in PRESSURE_COLUMNS if c in raw]
+        names += ['delta_p', 'pump_power_calc', 'pump_cost_per_day']
+        if 'fluid_in' in raw and 'fluid_out' in raw and 'heater_power' in raw:
+            names += ['Q_dot', 'efficiency']
+        return names
+
+    @property
+    def columns(self) -> list:
+        return list(self.raw) + [name for name in self.derived_columns if name not in self.raw]
+
+    @property
+    def cached(self) -> tuple:
+        """Derived columns computed so far."""
+        return tuple(self._cache)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(v.nbytes for v in self.raw.values()) + sum(v.nbytes for v in self._cache.values())
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name in self.raw:
+            return self.raw[name]
+        values = self._cache.get(name)
+        if values is None:
+            if name not in self.derived_columns:
+                raise KeyError(name)
+            values = self._cache[name] = self._compute(name)
+        return values
+
+    def numeric(self, name: str) -> np.ndarray:
+        """A raw column as float64 with NaN for missing readings (not memoized)."""
+        values = self.raw[name]
+        if values.dtype == np.uint16:
+            return np.where(values == MISSING, np.nan, values)
+        if values.dtype == object:
+            import pandas as pd
+            return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+        return np.asarray(values, dtype=np.float64)
+
+    def _calibrated(self, block: str, name: str) -> np.ndarray:
+        values = self.raw[name]
+        table = self._engine.tables[block]
+        if values.dtype != np.uint16:
+            return self._engine.convert(block, self.numeric(name))
+        # Codes index the lookup table directly; MISSING and out-of-table codes take the slow path
+        result = table[np.minimum(values, len(table) - 1)]
+        outside = values >= len(table)
+        if outside.any():
+            result[outside] = self._engine.convert(block, self.numeric(name)[outside])
+        return result
+
+    def _constant(self, value) -> np.ndarray:
+        return np.full(len(self), np.nan if value is None else value, dtype=np.float64)
+
+    def _compute(self, name: str) -> np.ndarray:
+        calibration = self.config['calibration']
+        has_pressures = 'P_in' in self.raw and 'P_out' in self.raw
+        if name == 'heater_power_calc':
+            return self._constant(calibration.get('heater_power'))
+        if name.endswith('_F'):
+            return self._calibrated('thermistor', name[:-2])
+        if name.endswith('_psi'):
+            return self._calibrated('pressure_transducer', name[:-4])
+        if name == 'delta_p':
+            if not has_pressures:
+                return self._constant(None)
+            p_in, p_out = self.raw['P_in'], self.raw['P_out']
+            if p_in.dtype == p_out.dtype == np.uint16 and not ((p_in == MISSING) | (p_out == MISSING)).any():
+                return p_out.astype(np.int64) - p_in  # ADC counts stay integers, as in the CSV
+            return self.numeric('P_out') - self.numeric('P_in')
+        if name == 'pump_power_calc':
+            if not has_pressures:
+                return self._constant(None)
+            if 'pump_power' in self.raw:
+                return self._constant(calibration.get('pump_power'))
+            return calculate_pump_power(calibration.get('flow_rate_m3s', 0.0001), self['delta_p'])
+        if name == 'pump_cost_per_day':
+            return calculate_pump_cost(self['pump_power_calc']) if has_pressures else self._constant(None)
+        if name == 'Q_dot':
+            return calculate_heat_transfer(M_DOT, self.config.get('fluid_cp', 1090), self['fluid_in_F'], self['fluid_out_F'])
+        if name == 'efficiency':
+            return calculate_efficiency(self['pump_power_calc'], self['Q_dot'])
+        raise KeyError(name)
+
+    # --- Export ---
+    def frame(self, columns: Optional[list] = None) -> pd.DataFrame:
+        """
+        DataFrame of `columns` (default: raw and every derived column, like calibrate_df).
+        Raw ADC columns with missing readings become float with NaN, as in a CSV read.
+        """
+        import pandas as pd
+
+        data = {}
+        for name in columns if columns is not None else self.columns:
+            values = self[name]
+            if name in self.raw and values.dtype == np.uint16 and (values == MISSING).any():
+                values = self.numeric(name)
+            data[name] = values
+        return pd.DataFrame(data, copy=False)
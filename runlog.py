@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import sys
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd  # Only the readers and converters need pandas; main.py's writer does not
+
+# -----------------------------------------------------------------------------
+# Binary run-log format (.runlog)
+#
+#   8 bytes   magic b"CPLOG01\n"
+#   4 bytes   little-endian uint32 length of the JSON header
+#   N bytes   JSON header: columns, channel map, config snapshot, sample rate
+#   records   fixed-width little-endian records, one per sample
+#
+# ADC readings are stored as uint16, with MISSING marking a sensor that was not read.
+# -----------------------------------------------------------------------------
+MAGIC = b"CPLOG01\n"
+MISSING = 0xFFFF
+FLOAT_COLUMNS = ("seconds", "lateness_ms", "pump_duty", "skew_ms")
+
+
+def record_dtype(columns: list) -> np.dtype:
+    """Record layout: float64 for time columns, uint16 for raw ADC values."""
+    return np.dtype([(name, '<f8' if name in FLOAT_COLUMNS else '<u2') for name in columns])
+
+
+def encode_header(columns: list, config: Optional[dict] = None, sample_rate_hz: Optional[float] = None) -> bytes:
+    header = {
+        'columns': columns,
+        'missing': MISSING,
+        'channels': (config or {}).get('sensors', {}),
+        'config': config or {},
+        'sample_rate_hz': sample_rate_hz,
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+    body = json.dumps(header, default=str).encode()
+    body += b" " * (-(len(MAGIC) + 4 + len(body)) % 8)  # records start 8-byte aligned
+    return MAGIC + struct.pack('<I', len(body)) + body
+
+
+def read_header(path: str) -> Tuple[dict, int]:
+    """Returns (header, byte offset of the first record)."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a run log")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length))
+    return header, len(MAGIC) + 4 + length
+
+
+def pack_rows(rows: list, dtype: np.dtype) -> np.ndarray:
+    """Pack rows (lists in column order, None for missing) into records."""
+    records = np.empty(len(rows), dtype=dtype)
+    for i, name in enumerate(dtype.names):
+        missing = np.nan if name in FLOAT_COLUMNS else MISSING
+        records[name] = [missing if row[i] is None else row[i] for row in rows]
+    return records
+
+
+# -----------------------------------------------------------------------------
+# Writing
+# -----------------------------------------------------------------------------
+class RunLogSink:
+    """
+    Append-only .runlog writer, usable as a logwriter.LogWriter sink.
+    Reopening an existing log drops any partially written last record.
+    """
+
+    def __init__(self, filename: str, columns: list, config: Optional[dict] = None,
+                 sample_rate_hz: Optional[float] = None):
+        self.filename = filename
+        self.dtype = record_dtype(columns)
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            header, offset = read_header(filename)
+            if header['columns'] != columns:
+                raise ValueError(f"{filename} has columns {header['columns']}, expected {columns}")
+            self._file = open(filename, 'r+b')
+            records = (os.path.getsize(filename) - offset) // self.dtype.itemsize
+            self._file.truncate(offset + records * self.dtype.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(filename, 'wb')
+            self._file.write(encode_header(columns, config, sample_rate_hz))
+
+    def writerows(self, rows: list) -> None:
+        if rows:
+            self._file.write(pack_rows(rows, self.dtype).tobytes())
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+# -----------------------------------------------------------------------------
+# Reading
+# -----------------------------------------------------------------------------
+def open_runlog(path: str) -> Tuple[dict, np.ndarray]:
+    """
+    Memory-map a run log. Returns (header, records); records is a read-only
+    structured array backed by the file, so columns are zero-copy views.
+    """
+    header, offset = read_header(path)
+    dtype = record_dtype(header['columns'])
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if count == 0:
+        return header, np.empty(0, dtype=dtype)
+    return header, np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    """
+    DataFrame with the same columns as the CSV log, ready for calibrate_df.
+    Columns without missing readings stay uint16; others become float with NaN.
+    """
+    import pandas as pd
+
+    data = {}
+    for name in records.dtype.names:
+        column = records[name]
+        if name not in FLOAT_COLUMNS:
+            missing = column == MISSING
+            if missing.any():
+                column = np.where(missing, np.nan, column)
+        data[name] = column
+    return pd.DataFrame(data, copy=False)
+
+
+def read_runlog(path: str) -> pd.DataFrame:
+    """Load a whole run log as a DataFrame."""
+    header, records = open_runlog(path)
+    return records_to_frame(records)
+
+
+def iter_runlog(path: str, chunk_rows: int = 50000):
+    """Yield a run log as DataFrames of up to `chunk_rows` rows, like pd.read_csv(chunksize=...)."""
+    header, records = open_runlog(path)
+    for start in range(0, len(records), chunk_rows):
+        yield records_to_frame(records[start:start + chunk_rows])
+
+
+# -----------------------------------------------------------------------------
+# Conversion to and from legacy CSV logs
+# -----------------------------------------------------------------------------
+def csv_to_runlog(csv_path: str, runlog_path: Optional[str] = None, config: Optional[dict] = None) -> str:
+    """Convert a data_*.csv log. The sample rate is estimated from the `seconds` column."""
+    import pandas as pd
+
+    runlog_path = runlog_path or os.path.splitext(csv_path)[0] + ".runlog"
+    df = pd.read_csv(csv_path)
+    if 'seconds' not in df.columns:
+        raise ValueError(f"{csv_path} has no 'seconds' column")
+
+    sample_rate_hz = None
+    if len(df) > 1:
+        period = df['seconds'].diff().median()
+        sample_rate_hz = round(1 / period, 3) if period > 0 else None
+
+    columns = list(df.columns)
+    dtype = record_dtype(columns)
+    records = np.empty(len(df), dtype=dtype)
+    for name in columns:
+        values = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=np.float64)
+        if name in FLOAT_COLUMNS:
+            records[name] = values
+            continue
+        valid = ~np.isnan(values)
+        if (values[valid] != np.round(values[valid])).any() or (values[valid] < 0).any() or (values[valid] >= MISSING).any():
+            raise ValueError(f"Column {name} in {csv_path} is not raw 10-bit ADC data")
+        records[name] = np.where(valid, values, MISSING)
+
+    with open(runlog_path, 'wb') as f:
+        f.write(encode_header(columns, config, sample_rate_hz))
+        f.write(records.tobytes())
+    return runlog_path
+
+
+def runlog_to_csv(runlog_path: str, csv_path: Optional[str] = None) -> str:
+    """Convert a run log back to the CSV layout written by main.py (missing readings left empty)."""
+    csv_path = csv_path or os.path.splitext(runlog_path)[0] + ".csv"
+    df = read_runlog(runlog_path)
+    for name in df.columns:
+        if name not in FLOAT_COLUMNS:
+            df[name] = df[name].astype('UInt16')
+    df.to_csv(csv_path, index=False, lineterminator='\r\n')  # csv.writer line endings, as in main.py
+    return csv_path
+
+
+# --- Run from command line ---
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('to-binary', 'to-csv'):
+        print("Usage: python runlog.py to-binary data_<timestamp>.csv [...]")
+        print("       python runlog.py to-csv data_<timestamp>.runlog [...]")
+        sys.exit(1)
+
+    import yaml
+    with open("config.yaml") as f:
+        config = yaml.safe_load(f)
+
+    for path in sys.argv[2:]:
+        if sys.argv[1] == 'to-binary':
+            print(f"{path} -> {csv_to_runlog(path, config=config)}")
+        else:
+            print(f"{path} -> {runlog_to_csv(path)}")
@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import math
+import os
+import time
+from array import array
+from typing import Callable, Optional
+
+from catalog import RunCatalog
+from collect import MISSING, AcquisitionPlan, load_config
+from compute import get_calibration_engine
+from main import HEADER, make_writer, open_log, shutdown
+from metrics import Histogram, MetricsExporter, from_config as metrics_from_config
+from pump_control import PWM_GPIO_PIN, PumpController
+from rolling import LiveMetrics
+from samplebus import DEFAULT_NAME, SampleBus
+from scheduler import FixedRateScheduler
+from watchdog import Watchdog
+
+# -----------------------------------------------------------------------------
+# One asyncio event loop running acquisition, the disk writer and pump control together.
+# Acquisition and control share the loop, so a control decision follows its sample
+# without thread hand-offs; file I/O runs in a worker thread so it never stalls either.
+# -----------------------------------------------------------------------------
+SENSORS = HEADER[1:-1]
+RUNTIME_HEADER = HEADER[:-1] + ["pump_duty", "lateness_ms"]
+
+
+# --- Pump strategies: (seconds, raw sample row) -> duty cycle % ---
+class DutySchedule:
+    """Step schedule of [seconds, duty] pairs; each duty holds until the next step."""
+
+    def __init__(self, steps: list):
+        if not steps:
+            raise ValueError("Pump schedule needs at least one [seconds, duty] step")
+        self.steps = sorted((float(t), float(duty)) for t, duty in steps)
+
+    def __call__(self, t: float, row) -> float:
+        duty = self.steps[0][1]
+        for start, step_duty in self.steps:
+            if t < start:
+                break
+            duty = step_duty
+        return duty
+
+
+def measurement(config: dict, columns: list, variable: str) -> Callable[[array], float]:
+    """
+    Function reading the controlled variable from a raw row: 'delta_p' (P_out - P_in
+    in ADC counts, as calibrate_df logs it), '<sensor>_F' or '<sensor>_psi'.
+    """
+    index = {name: i for i, name in enumerate(columns)}
+
+    def code(row, i):
+        value = row[i]
+        return math.nan if value is None or value == MISSING else value
+
+    if variable == 'delta_p':
+        p_in, p_out = index['P_in'], index['P_out']
+        return lambda row: code(row, p_out) - code(row, p_in)
+
+    engine = get_calibration_engine(config)
+    for suffix, block in (('_F', 'thermistor'), ('_psi', 'pressure_transducer')):
+        if variable.endswith(suffix) and variable[:-len(suffix)] in index:
+            i, table = index[variable[:-len(suffix)]], engine.tables[block]
+
+            def calibrated(row):
+                raw = code(row, i)
+                return math.nan if math.isnan(raw) else float(table[int(raw)])
+            return calibrated
+    raise ValueError(f"Cannot control on {variable!r}: use delta_p, <sensor>_F or <sensor>_psi")
+
+
+class PIController:
+    """
+    PI control of one measured variable with output clamping and anti-windup
+    (the integral stops growing while the output is saturated).
+    reverse=True when more pump lowers the variable, e.g. a temperature.
+    """
+
+    def __init__(self, measure: Callable[[array], float], setpoint: float, kp: float, ki: float,
+                 reverse: bool = False, min_duty: float = 0.0, max_duty: float = 100.0):
+        self.measure = measure
+        self.setpoint = setpoint
+        self.kp = kp
+        self.ki = ki
+        self.sign = -1.0 if reverse else 1.0
+        self.min_duty = min_duty
+        self.max_duty = max_duty
+        self.integral = 0.0
+        self._last_t = None
+        self.duty = min_duty
+
+    def __call__(self, t: float, row) -> float:
+        value = self.measure(row)
+        if math.isnan(value):
+            return self.duty  # Hold the last output on a missing reading
+        error = self.sign * (self.setpoint - value)
+        dt = t - self._last_t if self._last_t is not None else 0.0
+        self._last_t = t
+
+        integral = self.integral + error * dt
+        duty = self.kp * error + self.ki * integral
+        if self.min_duty < duty < self.max_duty:
+            self.integral = integral
+        self.duty = min(max(duty, self.min_duty), self.max_duty)
+        return self.duty
+
+
+def pump_strategy(config: dict, columns: list):
+    pump_options = config.get('pump', {})
+    mode = pump_options.get('mode', 'schedule')
+    if mode == 'schedule':
+        return DutySchedule(pump_options.get('schedule', [[0, 0]]))
+    if mode == 'closed_loop':
+        control = pump_options.get('control', {})
+        return PIController(measurement(config, columns, control.get('variable', 'delta_p')),
+                            setpoint=control['setpoint'], kp=control.get('kp', 0.5), ki=control.get('ki', 0.1),
+                            reverse=control.get('reverse', False),
+                            min_duty=control.get('min_duty', 0.0), max_duty=control.get('max_duty', 100.0))
+    raise ValueError(f"pump.mode must be 'schedule' or 'closed_loop', got {mode!r}")
+
+
+class LatestSample:
+    """Hand-off of the newest sample from acquisition to control; older unread samples are replaced."""
+
+    def __init__(self, size: int):
+        self.row = array('H', [MISSING]) * size
+        self.t = 0.0
+        self.stamp = 0.0  # perf_counter() when the sample was read
+        self.replaced = 0
+        self._event = asyncio.Event()
+
+    def publish(self, t: float, stamp: float, row: array) -> None:
+        if self._event.is_set():
+            self.replaced += 1
+        self.row[:] = row
+        self.t, self.stamp = t, stamp
+        self._event.set()
+
+    async def wait(self) -> None:
+        await self._event.wait()
+        self._event.clear()
+
+
+class Runtime:
+    """Acquisition, writer and pump-control tasks for one run, plus their shared state."""
+
+    def __init__(self, config: dict, resume: Optional[str] = None, pump: Optional[PumpController] = None):
+        sampling = config.get('sampling', {})
+        pump_options = config.get('pump', {})
+        self.config = config
+        self.scheduler = FixedRateScheduler(sampling.get('sample_rate_hz', 10), sampling.get('overrun', 'skip'))
+        self.metrics = metrics_from_config(config)
+        self.plan = AcquisitionPlan(config, SENSORS, metrics=self.metrics)
+        self.live = LiveMetrics(config, SENSORS) if config.get('rolling', {}).get('enabled', True) else None
+
+        self.filename, self.time_offset, self.previous_rows = open_log(self.scheduler, resume, RUNTIME_HEADER)
+        self.buffer, self.writer = make_writer(config, self.filename, RUNTIME_HEADER, self.scheduler, self.metrics)
+        self.commit_interval_s = config.get('writer', {}).get('commit_interval_s', 1.0)
+
+        self.pump = None
+        self.strategy = None
+        if pump_options.get('enabled', False):
+            self.pump = pump or PumpController()
+            self.strategy = pump_strategy(config, SENSORS)
+        # Checked in the acquire task; shares the pump with control and holds it once tripped
+        self.watchdog = Watchdog.from_config(config, SENSORS, 1 / self.scheduler.period, pump=self.pump or pump,
+                                             metrics=self.metrics)
+        self.control_interval_s = pump_options.get('control_interval_s', 0.0)
+        budget_ms = pump_options.get('latency_budget_ms')
+        self.latency_budget_s = budget_ms / 1000 if budget_ms else self.scheduler.period
+        description = "Time from reading a sample to applying the pump duty it leads to"
+        self.control_latency = (self.metrics.histogram("control_latency_seconds", description)
+                                if self.metrics else Histogram())
+        self.late_actions = 0
+        self.latest = None  # Set up in run(), inside the event loop
+        self.bus = None
+
+    # --- Tasks ---
+    async def acquire(self) -> None:
+        scheduler, plan, buffer = self.scheduler, self.plan, self.buffer
+        bus, live, latest, watchdog = self.bus, self.live, self.latest, self.watchdog
+        scheduler.start()
+        while True:
+            await asyncio.sleep(scheduler.delay())  # Until the next sample deadline
+            elapsed, lateness = scheduler.tick()
+            stamp = time.perf_counter()
+            plan.read()
+            t = round(self.time_offset + elapsed, 3)
+            if watchdog:
+                watchdog.check(t, plan.row, stamp)
+            duty = self.pump.duty_cycle if self.pump else None
+            row = [t, *plan.values(), duty, round(1000 * lateness, 2)]
+            buffer.put(row, timeout=0)  # Never block the loop; a full buffer drops the row
+            if bus:
+                bus.publish(row)
+            if live:
+                live.update_row(row[0], plan.row)
+            if latest:
+                latest.publish(row[0], stamp, plan.row)
+
+    async def write(self) -> None:
+        while True:
+            await asyncio.sleep(self.commit_interval_s)
+            rows = self.buffer.drain(timeout=0)
+            await asyncio.to_thread(self.writer.write_rows, rows, True)
+
+    async def control(self) -> None:
+        next_action = -math.inf
+        while True:
+            await self.latest.wait()
+            t, stamp = self.latest.t, self.latest.stamp
+            if t < next_action or (self.watchdog and self.watchdog.pump_held):
+                continue
+            next_action = t + self.control_interval_s
+            duty = round(self.strategy(t, self.latest.row), 2)
+            if duty != self.pump.duty_cycle:
+                self.pump.set_pwm(duty)
+            latency = time.perf_counter() - stamp
+            self.control_latency.observe(latency)
+            if latency > self.latency_budget_s:
+                self.late_actions += 1
+
+    async def run(self, duration_s: Optional[float] = None) -> None:
+        bus_options = self.config.get('bus', {})
+        metrics_options = self.config.get('metrics', {})
+        self.bus = None
+        if bus_options.get('enabled', True):
+            self.bus = SampleBus(RUNTIME_HEADER, capacity=bus_options.get('capacity', 4096),
+                                 name=bus_options.get('name', DEFAULT_NAME), socket_path=bus_options.get('socket_path'))
+        if self.pump:
+            self.latest = LatestSample(len(SENSORS))
+        exporter = None
+        if self.metrics:
+            for name, description, read in (
+                    ("samples_total", "Samples taken", lambda: self.scheduler.samples),
+                    ("overruns_total", "Samples that finished after the next deadline", lambda: self.scheduler.overruns),
+                    ("skipped_samples_total", "Deadlines dropped after overruns", lambda: self.scheduler.skipped),
+                    ("dropped_rows_total", "Rows discarded because the write buffer was full", lambda: self.buffer.dropped),
+                    ("late_control_total", "Pump actions later than the latency budget", lambda: self.late_actions)):
+                self.metrics.counter(name, description, read)
+            exporter = MetricsExporter(self.metrics, metrics_options.get('file', 'metrics.prom'),
+                                       metrics_options.get('interval_s', 5.0))
+            exporter.start()
+
+        catalog = RunCatalog()
+        catalog.start_run(self.filename, self.config)
+        tasks = [asyncio.create_task(self.acquire(), name="acquire"),
+                 asyncio.create_task(self.write(), name="write")]
+        if self.pump:
+            tasks.append(asyncio.create_task(self.control(), name="control"))
+
+        print(f"Now collecting data in {self.filename} at {1 / self.scheduler.period:g} Hz"
+              + (f", pump {self.config['pump'].get('mode', 'schedule')}" if self.pump else ""))
+        try:
+            # Runs until Ctrl-C, the duration, or a task failing
+            timer = [asyncio.create_task(asyncio.sleep(duration_s))] if duration_s else []
+            done, _ = await asyncio.wait(tasks + timer, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task not in timer:
+                    task.result()  # Re-raise the failure
+        except asyncio.CancelledError:
+            print("Stopped logging.")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            errors = [shutdown([self.watchdog.close if self.watchdog else None,
+                                self.pump.cleanup if self.pump else None,
+                                self.bus.close if self.bus else None])]
+            errors.append(await asyncio.to_thread(shutdown, [
+                self.writer.close,
+                lambda: catalog.finish_run(self.filename, self.previous_rows + self.writer.rows_written,
+                                           steady_state=self.live.steady_summary() if self.live else None),
+            ]))
+            print(self.scheduler.summary())
+            print(self.writer.summary())
+            if self.pump:
+                print(self.control_summary())
+            if self.live:
+                print(self.live.summary())
+            if self.watchdog:
+                print(self.watchdog.summary())
+            if exporter:
+                exporter.stop()
+                print(self.metrics.summary())
+            error = next((e for e in errors if e), None)
+            if error:
+                raise error
+
+    def control_summary(self) -> str:
+        h = self.control_latency
+        mean_ms = 1000 * h.sum / h.count if h.count else 0.0
+        return (f"{h.count} pump actions, latency avg = {mean_ms:.2f} ms, p99 <= {1000 * h.quantile(0.99):.2f} ms, "
+                f"max = {1000 * h.max:.2f} ms, over {1000 * self.latency_budget_s:g} ms budget = {self.late_actions}, "
+                f"samples superseded before control ran = {self.latest.replaced}")
+
+
+def simulate(config: dict):
+    """Fake GPIO and fake SPI with pressures that follow the pump, for trying control off the Pi."""
+    import collect
+    import fake_gpio
+    import fake_spi
+
+    gpio = fake_gpio.FakeGPIO()
+    pressure = config['sensors'].get('pressure', {})
+    plant = fake_gpio.PumpPlant(gpio, PWM_GPIO_PIN, pressure.get('P_in'), pressure.get('P_out'))
+    chips = []
+    for device in (0, 1):
+        spi = fake_spi.FakeSpiDev(values=plant)
+        spi.open(0, device)
+        chips.append(spi)
+    collect.use_devices(*chips)
+    return PumpController(gpio)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Log samples and drive the pump from one event loop.")
+    parser.add_argument('resume', nargs='?', help="interrupted data_<timestamp>.csv to resume")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--simulate', action='store_true',
+                        help="fake GPIO and SPI, with pressures responding to the pump duty")
+    args = parser.parse_args()
+
+    config = load_config()
+    pump = None
+    if args.simulate:
+        os.environ["COLDPLAYT_FAKE_SPI"] = "1"
+        pump = simulate(config)
+    runtime = Runtime(config, args.resume, pump=pump)
+    asyncio.run(runtime.run(args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd  # Viewer side only; main.py publishes without pandas
+
+# -----------------------------------------------------------------------------
+# Shared-memory ring of live samples, written by main.py (single writer)
+#
+#   0   magic b"CPBS", capacity, column count   (3 x uint32)
+#   16  seq: samples published so far           (uint64)
+#   24  closed flag                             (uint32)
+#   28  publisher pid                           (uint32)
+#   32  publisher token, random per bus         (uint64)
+#   40  column names as JSON                    (up to 472 bytes)
+#   512 capacity x columns float64 slots; sample n is stored in slot n % capacity
+#
+# The writer fills a slot before bumping seq, so readers never see a half-written
+# sample. A reader re-checks seq after copying to discard slots overwritten meanwhile.
+# -----------------------------------------------------------------------------
+MAGIC = b"CPBS"
+HEADER_SIZE = 512
+SEQ_OFFSET = 16
+CLOSED_OFFSET = 24
+OWNER_OFFSET = 28
+COLUMNS_OFFSET = 40
+DEFAULT_NAME = "coldplayt_bus"
+
+
+def pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False  # No owner recorded
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Someone else's process
+    return True
+
+
+def bus_owner(shm: shared_memory.SharedMemory) -> Optional[tuple]:
+    """(pid, token, closed) from a segment's header, or None if it is not a sample bus."""
+    magic, = struct.unpack_from('<4s', shm.buf, 0)
+    closed, pid, token = struct.unpack_from('<IIQ', shm.buf, CLOSED_OFFSET)
+    return (pid, token, closed == 1) if magic == MAGIC else None
+
+
+def forget(shm: shared_memory.SharedMemory) -> None:
+    """Stop this process's resource tracker unlinking a segment that another process owns."""
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+class SampleBus:
+    """
+    Publisher side: a shared-memory ring buffer, plus an optional Unix socket
+    that streams each sample to connected clients as a JSON line.
+    Refuses to start while another live process publishes under the same name.
+    """
+
+    def __init__(self, columns: list, capacity: int = 4096, name: str = DEFAULT_NAME,
+                 socket_path: Optional[str] = None):
+        self.columns = columns
+        self.capacity = capacity
+        names = json.dumps(columns).encode()
+        if len(names) > HEADER_SIZE - COLUMNS_OFFSET:
+            raise ValueError("Too many columns for the sample bus header")
+
+        size = HEADER_SIZE + capacity * len(columns) * 8
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            existing = shared_memory.SharedMemory(name=name)
+            owner = bus_owner(existing)
+            existing.close()
+            if owner is None or (not owner[2] and pid_alive(owner[0])):
+                if owner is None or owner[0] != os.getpid():
+                    forget(existing)
+                if owner is None:
+                    raise FileExistsError(f"Shared memory {name!r} exists and is not a sample bus") from None
+                raise FileExistsError(f"Sample bus {name!r} is in use by process {owner[0]}; "
+                                      f"set bus.name in config.yaml to run another logger") from None
+            # Left behind by a run that did not shut down cleanly (closed, or its process is gone)
+            existing.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.name = name
+        self._token = int.from_bytes(os.urandom(8), 'little')
+        buf = self._shm.buf
+        buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        struct.pack_into('<4sII', buf, 0, MAGIC, capacity, len(columns))
+        struct.pack_into('<IQ', buf, OWNER_OFFSET, os.getpid(), self._token)
+        buf[COLUMNS_OFFSET:COLUMNS_OFFSET + len(names)] = names
+        self._seq = np.ndarray((1,), dtype='<u8', buffer=buf, offset=SEQ_OFFSET)
+        self._slots = np.ndarray((capacity, len(columns)), dtype='<f8', buffer=buf, offset=HEADER_SIZE)
+        self._next = 0
+
+        self._clients = []
+        self._server = None
+        if socket_path:
+            self._start_socket(socket_path)
+
+    def publish(self, row: list) -> None:
+        """Publish one sample (values in column order, None for missing)."""
+        self._slots[self._next % self.capacity] = [np.nan if v is None else v for v in row]
+        self._next += 1
+        self._seq[0] = self._next
+        if self._clients:
+            self._send(row)
+
+    # --- Optional Unix socket stream ---
+    def _start_socket(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        self.socket_path = path
+        threading.Thread(target=self._accept, name="bus-accept", daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return  # Server socket closed
+            client.setblocking(False)
+            client.sendall((json.dumps(self.columns) + "\n").encode())
+            self._clients.append(client)
+
+    def _send(self, row: list) -> None:
+        line = (json.dumps(row) + "\n").encode()
+        for client in list(self._clients):
+            try:
+                if client.send(line) == len(line):
+                    continue
+            except OSError:
+                pass
+            # Slow or disconnected consumers are dropped rather than stalling acquisition
+            self._clients.remove(client)
+            client.close()
+
+    def close(self) -> None:
+        struct.pack_into('<I', self._shm.buf, CLOSED_OFFSET, 1)
+        if self._server:
+            self._server.close()
+            os.unlink(self.socket_path)
+            for client in self._clients:
+                client.close()
+        del self._seq, self._slots
+        self._shm.close()
+        try:
+            current = shared_memory.SharedMemory(name=self.name)
+            owner = bus_owner(current)
+            current.close()
+        except FileNotFoundError:
+            owner = None
+        if owner is not None and owner[1] == self._token:
+            self._shm.unlink()
+        elif owner is None or owner[0] != os.getpid():
+            forget(self._shm)  # Replaced by another run since we marked it closed: leave its segment alone
+
+
+class BusSubscriber:
+    """
+    Reader side of a SampleBus. Raises FileNotFoundError if no bus is running.
+    The first read_new() also returns up to `backlog` samples published before attaching.
+    """
+
+    def __init__(self, name: str = DEFAULT_NAME, backlog: int = 0):
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13: stop the resource tracker unlinking the publisher's segment on exit
+            from multiprocessing import resource_tracker
+            self._shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+
+        buf = self._shm.buf
+        magic, self.capacity, n_columns = struct.unpack_from('<4sII', buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory {name!r} is not a sample bus")
+        names = bytes(buf[COLUMNS_OFFSET:HEADER_SIZE]).rstrip(b"\0")
+        self.columns = json.loads(names)
+        self._seq = np.ndarray((1,), dtype='<u8', buffer=buf, offset=SEQ_OFFSET)
+        self._slots = np.ndarray((self.capacity, n_columns), dtype='<f8', buffer=buf, offset=HEADER_SIZE)
+        self.position = max(int(self._seq[0]) - min(backlog, self.capacity), 0)
+        self.missed = 0
+
+    @property
+    def closed(self) -> bool:
+        return struct.unpack_from('<I', self._shm.buf, CLOSED_OFFSET)[0] == 1
+
+    def read_new(self) -> np.ndarray:
+        """Return samples published since the last call, oldest first (rows x columns)."""
+        seq = int(self._seq[0])
+        start = max(self.position, seq - self.capacity)
+        self.missed += start - self.position
+        if start == seq:
+            return np.empty((0, len(self.columns)))
+
+        index = np.arange(start, seq)
+        rows = self._slots[index % self.capacity].copy()
+        # Slots the writer started overwriting while we copied are discarded
+        oldest_valid = int(self._seq[0]) - self.capacity + 1
+        if start < oldest_valid:
+            keep = index >= oldest_valid
+            self.missed += int((~keep).sum())
+            rows = rows[keep]
+        self.position = seq
+        return rows
+
+    def close(self) -> None:
+        del self._seq, self._slots
+        self._shm.close()
+
+
+class BusTailReader:
+    """Same interface as csvtail.CsvTailReader, fed from the sample bus instead of the CSV."""
+
+    def __init__(self, config: dict, window: int = 100, name: str = DEFAULT_NAME):
+        import pandas as pd
+
+        self.config = config
+        self.window = window
+        self.subscriber = BusSubscriber(name, backlog=window)
+        self.samples = pd.DataFrame()
+
+    def poll(self) -> pd.DataFrame:
+        import pandas as pd
+        from csvtail import append_calibrated
+
+        rows = self.subscriber.read_new()
+        if len(rows):
+            new_rows = pd.DataFrame(rows, columns=self.subscriber.columns)
+            self.samples = append_calibrated(self.samples, new_rows, self.window, self.config)
+        return self.samples
+
+    def close(self) -> None:
+        self.subscriber.close()
+
+
+class LiveSource:
+    """
+    Live samples for viewers: the sample bus when main.py is publishing one,
+    otherwise tailing the newest CSV. Re-attaches when a new run starts a new bus.
+    """
+
+    def __init__(self, config: dict, window: int = 100, name: str = DEFAULT_NAME,
+                 retry_interval_s: float = 2.0):
+        self.config = config
+        self.window = window
+        self.name = name
+        self.retry_interval_s = retry_interval_s
+        self.reader = None
+        self._next_retry = time.monotonic() + retry_interval_s
+        self._attach()
+
+    def _attach(self) -> None:
+        from csvtail import CsvTailReader
+
+        try:
+            reader = BusTailReader(self.config, self.window, self.name)
+        except (FileNotFoundError, ValueError):
+            if self.reader is None or self.using_bus:
+                # No bus yet, or the run publishing it has stopped
+                if self.reader:
+                    self.reader.close()
+                self.reader = CsvTailReader(self.config, self.window)
+            return
+        if self.reader:
+            self.reader.close()
+        self.reader = reader
+
+    @property
+    def using_bus(self) -> bool:
+        return isinstance(self.reader, BusTailReader)
+
+    def poll(self) -> pd.DataFrame:
+        if time.monotonic() >= self._next_retry:
+            if not self.using_bus or self.reader.subscriber.closed:
+                self._attach()
+            self._next_retry = time.monotonic() + self.retry_interval_s
+        return self.reader.poll()
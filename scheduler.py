@@ -0,0 +1,83 @@
+import time
+from typing import Callable, Tuple
+
+OVERRUN_POLICIES = ("skip", "catch_up")
+
+
+class FixedRateScheduler:
+    """
+    Deadline-based fixed-rate timer on a monotonic clock.
+    Deadlines are start + n * period, so time spent sampling and writing does not
+    accumulate as drift.
+
+    Overruns (a sample finishing after the following deadline) are handled by policy:
+        skip:     drop the missed deadlines and resume on the grid
+        catch_up: sample back-to-back until the schedule is met again
+    """
+
+    def __init__(self, rate_hz: float, overrun: str = "skip",
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if rate_hz <= 0:
+            raise ValueError(f"Sample rate must be positive, got {rate_hz}")
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"Overrun policy must be one of {OVERRUN_POLICIES}, got {overrun!r}")
+        self.period = 1.0 / rate_hz
+        self.overrun = overrun
+        self.clock = clock
+        self.sleep = sleep
+
+        self.start_time = None
+        self.next_deadline = None
+        self.samples = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def start(self) -> float:
+        """Start the schedule now; the first deadline is immediate."""
+        self.start_time = self.next_deadline = self.clock()
+        return self.start_time
+
+    def wait(self) -> Tuple[float, float]:
+        """
+        Sleep until the next deadline.
+        Returns (seconds since start, lateness in seconds) for the sample about to be taken.
+        """
+        delay = self.delay()
+        if delay > 0:
+            self.sleep(delay)
+        return self.tick()
+
+    def delay(self) -> float:
+        """Seconds until the next deadline (0 if it has passed). For callers that sleep themselves, e.g. asyncio."""
+        if self.start_time is None:
+            self.start()
+        return max(self.next_deadline - self.clock(), 0.0)
+
+    def tick(self) -> Tuple[float, float]:
+        """Account for the sample being taken now; returns the same as wait()."""
+        if self.start_time is None:
+            self.start()
+        now = self.clock()
+        lateness = max(now - self.next_deadline, 0.0)
+        self.next_deadline += self.period
+        if now >= self.next_deadline:
+            self.overruns += 1
+            if self.overrun == "skip":
+                missed = int((now - self.next_deadline) // self.period) + 1
+                self.next_deadline += missed * self.period
+                self.skipped += missed
+
+        self.samples += 1
+        self.total_lateness += lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        return now - self.start_time, lateness
+
+    def summary(self) -> str:
+        """One-line timing report for the end of a run."""
+        mean_ms = 1000 * self.total_lateness / self.samples if self.samples else 0.0
+        return (f"{self.samples} samples at {1 / self.period:g} Hz, "
+                f"lateness avg = {mean_ms:.2f} ms, max = {1000 * self.max_lateness:.2f} ms, "
+                f"overruns = {self.overruns}, skipped = {self.skipped}")
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def config():
+    """config.yaml from the repository root."""
+    from collect import load_config
+    return load_config(os.path.join(ROOT, "config.yaml"))
+
+
+@pytest.fixture
+def fake_chips():
+    """
+    Two FakeSpiDev chips installed in collect.py, each reading back a fixed code per
+    channel (chip * 100 + channel * 10 + 5). Restores collect's devices afterwards.
+    """
+    import collect
+    import fake_spi
+
+    saved = (collect.spi_0, collect.spi_1, collect.second_chip_available, collect._plan)
+    chips = []
+    for device in (0, 1):
+        spi = fake_spi.FakeSpiDev(values=lambda bus, device, channel: device * 100 + channel * 10 + 5)
+        spi.open(0, device)
+        chips.append(spi)
+    collect.use_devices(*chips)
+    yield chips
+    collect.spi_0, collect.spi_1, collect.second_chip_available, collect._plan = saved
@@ -0,0 +1,80 @@
+import asyncio
+import csv
+import random
+import threading
+import time
+
+import pytest
+
+from aggregator import Aggregator, ClockModel, NodeStream, SkewedClock, run_node
+
+
+def node_samples(offset_s, drift_ppm, seconds=20.0, rate_hz=200.0, seed=0):
+    """(node time, local receive time) pairs for a node clock local -> offset + (1 + drift) * local."""
+    rng = random.Random(seed)
+    for i in range(int(seconds * rate_hz)):
+        local = 1000.0 + i / rate_hz
+        node = offset_s + (1 + drift_ppm * 1e-6) * local
+        yield node, local + 0.0005 + rng.expovariate(1 / 0.002)  # Network delay: 0.5 ms + jitter
+
+
+@pytest.mark.parametrize("offset_s, drift_ppm", [(0.0, 0.0), (42.5, 150.0), (-87.0, -200.0)])
+def test_clock_model_fits_offset_and_drift(offset_s, drift_ppm):
+    model = ClockModel(window_s=1.0, windows=60)
+    for node, received in node_samples(offset_s, drift_ppm):
+        model.add(node, received)
+    assert -model.drift * 1e6 == pytest.approx(drift_ppm, abs=2.0)
+    # A sample sent at local time 1010 s maps back to it, up to the constant minimum delay
+    node = offset_s + (1 + drift_ppm * 1e-6) * 1010.0
+    assert model.to_local(node) - 1010.0 == pytest.approx(0.0005, abs=0.0005)
+
+
+def test_clock_model_uses_offset_alone_at_first():
+    model = ClockModel(window_s=1.0)
+    model.add(10.0, 110.002)
+    model.add(10.1, 110.101)
+    assert model.drift == 0.0
+    assert model.to_local(10.5) == pytest.approx(110.501)
+
+
+def test_node_stream_nearest_sample_and_staleness():
+    stream = NodeStream("a", capacity=3, clock_window_s=1.0, clock_windows=10)
+    stream.attach(["T1"])
+    for seq, t in enumerate([0.0, 0.1, 0.2, 0.5]):
+        stream.add((t, seq, seq * 10), t)  # Node clock equals the local clock
+    assert stream.dropped == 1  # Capacity 3: the first sample went
+    assert stream.sample_at(0.12, stale_s=0.05) == ((10,), pytest.approx(0.02))
+    assert stream.sample_at(0.35, stale_s=0.05) == (None, None)  # Nothing within 50 ms
+    assert stream.sample_at(0.49, stale_s=0.05)[0] == (30,)
+    stream.add((0.9, 6, 60), 0.9)
+    assert stream.gaps == 2  # Sequence numbers 4 and 5 never arrived
+
+
+def test_simulated_nodes_are_merged_in_step(tmp_path, fake_chips, config):
+    names = ["a", "b"]
+    skews = {"a": (30.0, 100.0), "b": (-55.0, -150.0)}
+    address = f"unix://{tmp_path / 'agg.sock'}"
+    aggregator = Aggregator(config, names, address, rate_hz=50, output_dir=str(tmp_path / "merged"))
+
+    async def run():
+        task = asyncio.create_task(aggregator.run(3.0))
+        await asyncio.sleep(0.2)  # Server bound
+        nodes = [threading.Thread(target=run_node, args=(config, address, name, 50, 4.0, SkewedClock(*skews[name])))
+                 for name in names]
+        for node in nodes:
+            node.start()
+        await task
+        for node in nodes:
+            await asyncio.to_thread(node.join)
+
+    asyncio.run(run())
+    now = time.monotonic()
+    for name, (offset, ppm) in skews.items():
+        error_s = aggregator.streams[name].clock.to_local(SkewedClock(offset, ppm)()) - now
+        assert abs(error_s) < 0.01
+    with open(aggregator.filename, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert aggregator.filename.startswith(str(tmp_path / "merged"))
+    assert len(rows) > 100
+    assert {"a.T1", "b.T1", "skew_ms"} <= set(rows[0])
+    assert max(float(row["skew_ms"]) for row in rows[10:]) < 20  # Within one 50 Hz period
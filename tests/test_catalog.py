@@ -0,0 +1,24 @@
+import numpy as np
+
+from analyze import compute_run, config_hash, load_run
+from catalog import RunCatalog, apply_settings, run_settings
+from conftest import ROOT
+
+
+def test_start_run_records_settings(tmp_path, config):
+    catalog = RunCatalog(str(tmp_path / "runs.json"))
+    catalog.start_run("data_2025-06-06_11.14.06.csv", config)
+    settings = RunCatalog(catalog.path).runs["data_2025-06-06_11.14.06.csv"]['settings']
+    assert settings['heater_power_w'] == config['calibration']['heater_power']
+
+
+def test_run_is_calibrated_with_its_own_settings(config):
+    settings = {'heater_power_w': 150.0, 'pump_power_w': None, 'flow_rate_m3s': 2e-5}
+    run_config = apply_settings(config, settings)
+    assert run_settings(run_config) == {**run_settings(config), 'heater_power_w': 150.0, 'flow_rate_m3s': 2e-5}
+    assert config['calibration']['heater_power'] != 150.0  # The current config is left alone
+    assert config_hash(run_config) != config_hash(config)
+    assert apply_settings(config, None) is config
+
+    df = compute_run(load_run(f"{ROOT}/sample_data.csv"), run_config)
+    assert np.all(df['heater_power_calc'] == 150.0)
@@ -0,0 +1,76 @@
+import pytest
+
+import collect
+from collect import MISSING, AcquisitionPlan, read_adc_channel, read_channels
+
+
+def expected(channel: int) -> int:
+    return (channel // 8) * 100 + (channel % 8) * 10 + 5
+
+
+def test_read_adc_channel_on_both_chips(fake_chips):
+    assert read_adc_channel(3) == expected(3)
+    assert read_adc_channel(12) == expected(12)
+    assert read_adc_channel(None) is None
+    with pytest.raises(ValueError):
+        read_adc_channel(16)
+
+
+@pytest.mark.parametrize("packed", [False, True])
+@pytest.mark.parametrize("parallel", [False, True])
+def test_read_channels_reads_each_channel_once(fake_chips, packed, parallel):
+    values = read_channels([2, 9, 2, 0, 15], packed=packed, parallel=parallel)
+    assert values == {ch: expected(ch) for ch in (0, 2, 9, 15)}
+    transfers = [chip.transfers for chip in fake_chips]
+    assert transfers == ([1, 1] if packed else [2, 2])
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_plan_fills_row_in_column_order(fake_chips, config, packed):
+    config['spi'] = {'packed_transfers': packed, 'parallel_chips': True}
+    config['sensors']['thermistors']['T3'] = 10  # On chip 1
+    columns = ["T1", "T2", "T3", "fluid_in", "P_in", "heater_power"]
+    plan = AcquisitionPlan(config, columns)
+    plan.read()
+    channels = collect.sensor_channels(config)
+    assert list(plan.row[:-1]) == [expected(channels[c]) for c in columns[:-1]]
+    assert plan.row[-1] == MISSING  # heater_power is not wired
+    assert plan.values()[-1] is None
+
+
+def test_absent_second_chip_reads_missing(fake_chips, config):
+    collect.use_devices(fake_chips[0])
+    config['sensors']['thermistors']['T3'] = 10
+    plan = AcquisitionPlan(config, ["T1", "T3"])
+    plan.read()
+    assert plan.values() == [expected(collect.sensor_channels(config)['T1']), None]
+
+
+def test_fake_spi_is_opt_in(monkeypatch):
+    monkeypatch.delenv("COLDPLAYT_FAKE_SPI", raising=False)
+    monkeypatch.setattr(collect, "spidev", None)
+    with pytest.raises(ImportError):
+        collect.open_spi(0)
+    monkeypatch.setenv("COLDPLAYT_FAKE_SPI", "1")
+    assert collect.open_spi(0).xfer2(collect.mcp3008_command(0))[0] == 0
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_channel_without_conversion_reads_missing(config, packed):
+    import fake_spi
+
+    saved = (collect.spi_0, collect.spi_1, collect.second_chip_available)
+    spi = fake_spi.FakeSpiDev(values=lambda bus, device, channel: None if channel == 2 else 7)
+    spi.open(0, 0)
+    collect.use_devices(spi)
+    try:
+        config['spi'] = {'packed_transfers': packed}
+        config['sensors']['thermistors'].update(T1=2, T2=0)
+        plan = AcquisitionPlan(config, ["T1", "T2"])
+        plan.read()
+        assert list(plan.row) == [MISSING, 7]
+        assert plan.values() == [None, 7]
+        assert read_adc_channel(2) is None
+        assert read_channels([0, 2], packed=packed) == {0: 7, 2: None}
+    finally:
+        collect.spi_0, collect.spi_1, collect.second_chip_available = saved
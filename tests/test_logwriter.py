@@ -0,0 +1,82 @@
+import errno
+import time
+
+import pytest
+
+import main
+from catalog import RunCatalog
+from logwriter import CsvSink, LogWriter, RingBuffer, recover_csv
+from main import HEADER, open_log
+from runtime import RUNTIME_HEADER
+from scheduler import FixedRateScheduler
+
+
+def write_log(path, header, rows):
+    sink = CsvSink(str(path), header)
+    sink.writerows(rows)
+    sink.close()
+
+
+def test_csv_sink_appends_under_the_same_header(tmp_path):
+    path = tmp_path / "data.csv"
+    write_log(path, HEADER, [[0.0, *range(9), 0.1]])
+    write_log(path, HEADER, [[0.1, *range(9), 0.2]])
+    lines = path.read_text().splitlines()
+    assert lines[0].split(",") == HEADER
+    assert len(lines) == 3
+
+
+def test_csv_sink_refuses_other_columns(tmp_path):
+    path = tmp_path / "data.csv"
+    write_log(path, HEADER, [[0.0, *range(9), 0.1]])
+    with pytest.raises(ValueError):
+        CsvSink(str(path), RUNTIME_HEADER)
+    assert len(path.read_text().splitlines()) == 2
+
+
+def test_resume_refuses_a_log_from_the_other_logger(tmp_path):
+    path = tmp_path / "data.csv"
+    write_log(path, RUNTIME_HEADER, [[0.0, *range(9), 40.0, 0.1]])
+    with open(path, "a") as f:
+        f.write("0.1,1,2")  # Cut off mid-row
+    before = path.read_bytes()
+    with pytest.raises(ValueError):
+        open_log(FixedRateScheduler(10), str(path), HEADER)
+    assert path.read_bytes() == before  # Not touched
+    filename, offset, rows = open_log(FixedRateScheduler(10), str(path), RUNTIME_HEADER)
+    assert (offset, rows) == (pytest.approx(0.1), 1)
+    assert recover_csv(filename) == 0.0
+
+
+class FullDisk(CsvSink):
+    def writerows(self, rows):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+
+@pytest.mark.parametrize("on_full", ["drop", "block"])
+def test_writer_failure_stops_acquisition_and_stop_raises(tmp_path, on_full):
+    buffer = RingBuffer(4, on_full)
+    writer = LogWriter([FullDisk(str(tmp_path / "data.csv"), HEADER)], buffer, commit_interval_s=0.01)
+    writer.start()
+    buffer.put([0.0, *range(9), 0.1])
+    writer.join(timeout=1.0)
+    assert not writer.is_alive()
+    with pytest.raises(RuntimeError, match="Log writer failed") as failed:
+        for _ in range(10):
+            buffer.put([0.1, *range(9), 0.1], timeout=0.01)
+    assert isinstance(failed.value.__cause__, OSError)
+    with pytest.raises(OSError):
+        writer.stop()
+
+
+def test_main_fails_loudly_when_the_log_cannot_be_written(tmp_path, monkeypatch, config, fake_chips):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "CsvSink", FullDisk)
+    config['bus'] = {'enabled': False}
+    start = time.monotonic()
+    with pytest.raises(OSError) as failed:
+        main.main(config)
+    assert failed.value.errno == errno.ENOSPC
+    assert time.monotonic() - start < 5.0
+    run, = RunCatalog(str(tmp_path / "runs.json")).runs.values()
+    assert run['stop'] is not None  # The run was still closed in the catalog
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import collect
+import replay
+from collect import MISSING, AcquisitionPlan
+from main import HEADER
+from samplebus import BusSubscriber, SampleBus
+
+RECORDING = """seconds,T1,T2,T3,fluid_in,fluid_out,P_in,P_out,heater_power,pump_power
+0.0,315,318,316,,,110,96,310,309
+0.1,316,319,317,,,108,104,310,310
+0.2,317,,318,,,109,101,311,310
+"""
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "data_2025-06-06_11.14.06.csv"
+    path.write_text(RECORDING)
+    return str(path)
+
+
+@pytest.fixture
+def restore_devices():
+    saved = (collect.spi_0, collect.spi_1, collect.second_chip_available, collect._plan)
+    yield
+    collect.spi_0, collect.spi_1, collect.second_chip_available, collect._plan = saved
+
+
+def test_replay_serves_recorded_rows_and_missing_readings(recording, config, restore_devices):
+    source = replay.ReplaySource(recording, config)
+    assert source.recorded_rate_hz == pytest.approx(10.0)
+    replay.install(source)
+    plan = AcquisitionPlan(config, HEADER[1:-1])
+    assert list(plan.read())[:7] == [315, 318, 316, MISSING, MISSING, 110, 96]  # fluid_in/out were not recorded
+    assert list(plan.row)[7:] == [MISSING, MISSING]  # Power sensors are not wired in config.yaml
+    source._advance = lambda: None
+    source.index = 2
+    assert list(plan.read())[:3] == [317, MISSING, 318]  # The missing T2 reading stays missing
+
+
+def test_verify_compares_sensors_wired_in_both(recording, config, tmp_path):
+    replayed = tmp_path / "replay.csv"
+    replayed.write_text("seconds,T1,T2,T3,fluid_in,fluid_out,P_in,P_out,heater_power,pump_power,lateness_ms\n"
+                        "0.0,315,318,316,,,110,96,,,0.1\n0.01,317,,318,,,109,101,,,0.1\n0.02,1,2,3,,,4,5,,,0.1\n")
+    report = replay.verify(str(replayed), recording, config)
+    assert report['sensors'] == ['T1', 'T2', 'T3', 'P_in', 'P_out']
+    assert (report['rows'], report['rows_matched']) == (3, 2)
+
+
+def test_replay_leaves_live_run_alone(recording, config, restore_devices, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    name = f"coldplayt_test_live_{os.getpid()}"
+    config['bus'] = {'enabled': True, 'capacity': 64, 'name': name}
+    live = SampleBus(HEADER, capacity=64, name=name)
+    try:
+        stats = replay.run_main(recording, config, speed=10.0)
+        subscriber = BusSubscriber(name)
+        assert not subscriber.closed  # Still the live run's bus
+        subscriber.close()
+    finally:
+        live.close()
+    assert stats['filename'].startswith(replay.LOG_PREFIX) and stats['samples'] > 0
+    assert not (tmp_path / "runs.json").exists()
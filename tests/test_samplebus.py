@@ -0,0 +1,53 @@
+import os
+import struct
+
+import pytest
+
+from samplebus import OWNER_OFFSET, BusSubscriber, SampleBus
+
+COLUMNS = ["seconds", "T1"]
+
+
+@pytest.fixture
+def name():
+    return f"coldplayt_test_{os.getpid()}"
+
+
+def test_second_publisher_refused_while_first_runs(name):
+    bus = SampleBus(COLUMNS, capacity=8, name=name)
+    try:
+        with pytest.raises(FileExistsError, match="in use by process"):
+            SampleBus(COLUMNS, capacity=8, name=name)
+        bus.publish([0.0, 1.0])
+        subscriber = BusSubscriber(name)
+        assert subscriber.position == 1
+        subscriber.close()
+    finally:
+        bus.close()
+    with pytest.raises(FileNotFoundError):
+        BusSubscriber(name)
+
+
+def test_stale_segment_of_dead_publisher_is_replaced(name):
+    crashed = SampleBus(COLUMNS, capacity=8, name=name)
+    struct.pack_into('<I', crashed._shm.buf, OWNER_OFFSET, 0)  # As if its process had gone
+    bus = SampleBus(COLUMNS, capacity=8, name=name)
+    bus.publish([0.0, 1.0])
+    subscriber = BusSubscriber(name)
+    try:
+        assert subscriber.position == 1 and not subscriber.closed
+    finally:
+        subscriber.close()
+        bus.close()
+        crashed.close()
+
+
+def test_close_leaves_a_newer_bus_under_the_same_name(name):
+    old = SampleBus(COLUMNS, capacity=8, name=name)
+    struct.pack_into('<I', old._shm.buf, OWNER_OFFSET, 0)
+    new = SampleBus(COLUMNS, capacity=8, name=name)
+    old.close()
+    new.publish([0.0, 1.0])
+    subscriber = BusSubscriber(name)  # Still there
+    subscriber.close()
+    new.close()
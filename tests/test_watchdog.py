@@ -0,0 +1,55 @@
+import sys
+
+import pytest
+
+import pump_control
+from fake_gpio import FakeGPIO
+from main import HEADER
+from pump_control import PWM_GPIO_PIN, PumpController
+from watchdog import HeaterCutoff, Watchdog
+
+SENSORS = HEADER[1:-1]
+HEATER_PIN = 17
+
+
+@pytest.fixture
+def watchdog_config(config):
+    config['watchdog'] = {'enabled': True, 'confirm_samples': 1, 'heater_pin': HEATER_PIN,
+                          'rules': [{'sensor': 'P_in', 'above': 150, 'pump_duty': 0}]}
+    return config
+
+
+def test_heater_cutoff_needs_real_gpio_unless_fake_requested(monkeypatch):
+    monkeypatch.delenv("COLDPLAYT_FAKE_GPIO", raising=False)
+    monkeypatch.setitem(sys.modules, 'RPi', None)  # RPi.GPIO not installed
+    with pytest.raises(ImportError, match="COLDPLAYT_FAKE_GPIO"):
+        HeaterCutoff(HEATER_PIN)
+    monkeypatch.setenv("COLDPLAYT_FAKE_GPIO", "1")
+    heater = HeaterCutoff(HEATER_PIN)
+    assert isinstance(heater.gpio, FakeGPIO) and heater.gpio.levels[HEATER_PIN] == FakeGPIO.HIGH
+
+
+def test_watchdog_does_not_open_the_pump(watchdog_config, monkeypatch, capsys):
+    monkeypatch.setenv("COLDPLAYT_FAKE_GPIO", "1")
+    monkeypatch.setattr(pump_control.PumpController, '__init__', lambda *args: pytest.fail("pump opened"))
+    watchdog = Watchdog.from_config(watchdog_config, SENSORS, 10.0)
+    assert watchdog.pump is None
+    assert "trips cannot set pump_duty" in capsys.readouterr().out
+    watchdog.close()
+    assert watchdog.heater.cut_off
+
+
+def test_trip_sets_shared_pump_and_leaves_it_running(watchdog_config):
+    gpio = FakeGPIO()
+    pump = PumpController(gpio)
+    pump.set_pwm(60)
+    watchdog = Watchdog.from_config(watchdog_config, SENSORS, 10.0, pump=pump)
+    assert gpio.duty(PWM_GPIO_PIN) == 60  # Attaching does not reset the running pump
+
+    row = [500] * len(SENSORS)
+    row[SENSORS.index('P_in')] = 1023
+    watchdog.check(0.0, row, 0.0)
+    assert watchdog.pump_held and gpio.duty(PWM_GPIO_PIN) == 0
+    assert gpio.levels[HEATER_PIN] == FakeGPIO.LOW
+    watchdog.close()
+    assert gpio.pwms[PWM_GPIO_PIN].running and gpio.mode is not None  # The caller still owns the pump
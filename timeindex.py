@@ -0,0 +1,216 @@
+import gzip
+import io
+import json
+import os
+import struct
+import sys
+from typing import Optional, Tuple
+
+import numpy as np
+
+# -----------------------------------------------------------------------------
+# Time index sidecar (<log>.idx): `seconds` -> byte offset, every `stride` rows
+#
+#   8 bytes   magic b"CPIDX01\n"
+#   4 bytes   little-endian uint32 length of the JSON header
+#   N bytes   JSON header: stride, header line of the log, compressed flag
+#   entries   (seconds float64, byte offset uint64, row uint64), appended as the log grows
+#
+# A window of a run is read by seeking to the entry before its start and parsing
+# only up to the entry after its end. Compressed logs (.csv.gz) are written as one
+# gzip member per stride, so each entry points at an independently decodable member
+# and the file is still an ordinary gzip file for other tools.
+# -----------------------------------------------------------------------------
+MAGIC = b"CPIDX01\n"
+DEFAULT_STRIDE = 256
+ENTRY_DTYPE = np.dtype([('seconds', '<f8'), ('offset', '<u8'), ('row', '<u8')])
+
+
+def index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def _write_header(f, meta: dict) -> None:
+    body = json.dumps(meta).encode()
+    body += b" " * (-(len(MAGIC) + 4 + len(body)) % 8)  # entries start 8-byte aligned
+    f.write(MAGIC + struct.pack('<I', len(body)) + body)
+
+
+def read_index(path: str) -> Tuple[dict, np.ndarray]:
+    """(header, entries) of an existing .idx file."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a time index")
+        (length,) = struct.unpack('<I', f.read(4))
+        meta = json.loads(f.read(length))
+        data = f.read()
+    usable = len(data) - len(data) % ENTRY_DTYPE.itemsize  # Ignore an entry cut off mid-write
+    return meta, np.frombuffer(data[:usable], dtype=ENTRY_DTYPE)
+
+
+def _seconds_column(header_line: bytes) -> int:
+    columns = header_line.rstrip(b"\r\n").split(b",")
+    if b"seconds" not in columns:
+        raise ValueError("Log has no 'seconds' column to index by")
+    return columns.index(b"seconds")
+
+
+def _scan(f, offset: int, row: int, stride: int, column: int) -> Tuple[list, int]:
+    """Entries for rows from `offset` (row number `row`) to the end of the file. Returns (entries, rows)."""
+    f.seek(offset)
+    entries = []
+    for line in f:
+        if not line.endswith(b"\n"):
+            break  # Row still being written
+        if row % stride == 0:
+            entries.append((float(line.split(b",")[column]), offset, row))
+        offset += len(line)
+        row += 1
+    return entries, row
+
+
+def _append(path: str, entries: list) -> None:
+    if entries:
+        with open(path, 'ab') as f:
+            f.write(np.array(entries, dtype=ENTRY_DTYPE).tobytes())
+
+
+def ensure_index(csv_path: str, stride: int = DEFAULT_STRIDE) -> Tuple[dict, np.ndarray, int]:
+    """
+    Load the index of a plain CSV log, building it for a legacy log or extending it
+    over rows appended since. Returns (header, entries, data rows in the log).
+    """
+    idx = index_path(csv_path)
+    with open(csv_path, 'rb') as f:
+        header_line = f.readline()
+        column = _seconds_column(header_line)
+        meta = entries = None
+        if os.path.exists(idx):
+            meta, entries = read_index(idx)
+            size = os.path.getsize(csv_path)
+            if meta.get('header') != header_line.decode() or (len(entries) and entries['offset'][-1] >= size):
+                meta = None  # Log was replaced or truncated; rebuild
+        if meta is None:
+            meta = {'stride': stride, 'header': header_line.decode(), 'compressed': False}
+            with open(idx, 'wb') as out:
+                _write_header(out, meta)
+            entries = np.empty(0, dtype=ENTRY_DTYPE)
+
+        stride = meta['stride']
+        if len(entries):
+            start_offset, start_row = int(entries['offset'][-1]), int(entries['row'][-1])
+        else:
+            start_offset, start_row = len(header_line), 0
+        new, rows = _scan(f, start_offset, start_row, stride, column)
+        new = [e for e in new if e[2] > start_row or not len(entries)]
+    _append(idx, new)
+    if new:
+        entries = np.concatenate([entries, np.array(new, dtype=ENTRY_DTYPE)])
+    return meta, entries, rows
+
+
+class TimeIndexWriter:
+    """
+    Keeps a CSV log's index current while logging.CsvSink writes it: the sink calls
+    add() before every stride-th row and flush() on each commit. Create it once the
+    header is on disk; rows already in the log (a resumed run) are indexed first.
+    """
+
+    def __init__(self, csv_path: str, stride: int = DEFAULT_STRIDE):
+        self.path = index_path(csv_path)
+        meta, _, self.rows = ensure_index(csv_path, stride)
+        self.stride = meta['stride']
+        self._pending = []
+
+    def add(self, seconds: float, offset: int) -> None:
+        self._pending.append((seconds, offset, self.rows))
+
+    def flush(self) -> None:
+        _append(self.path, self._pending)
+        self._pending = []
+
+
+# -----------------------------------------------------------------------------
+# Compressed logs with random access
+# -----------------------------------------------------------------------------
+def compress(csv_path: str, stride: int = DEFAULT_STRIDE, level: int = 6) -> str:
+    """Write <log>.csv.gz (one gzip member per `stride` rows) and its index. Returns the .gz path."""
+    gz_path = csv_path + ".gz"
+    with open(csv_path, 'rb') as f:
+        header_line = f.readline()
+        column = _seconds_column(header_line)
+        lines = f.readlines()
+    if lines and not lines[-1].endswith(b"\n"):
+        lines.pop()  # Row cut off mid-write
+
+    entries = []
+    with open(gz_path, 'wb') as out:
+        out.write(gzip.compress(header_line, level))
+        for start in range(0, len(lines), stride):
+            block = lines[start:start + stride]
+            entries.append((float(block[0].split(b",")[column]), out.tell(), start))
+            out.write(gzip.compress(b"".join(block), level))
+    with open(index_path(gz_path), 'wb') as f:
+        _write_header(f, {'stride': stride, 'header': header_line.decode(), 'compressed': True})
+    _append(index_path(gz_path), entries)
+    return gz_path
+
+
+# -----------------------------------------------------------------------------
+# Reading a time window
+# -----------------------------------------------------------------------------
+def read_window(path: str, start: Optional[float] = None, end: Optional[float] = None):
+    """
+    Rows with start <= seconds <= end from a .csv, .csv.gz or .runlog, reading only
+    the indexed blocks that overlap the window. Open ends read to the start/end of the run.
+    """
+    import pandas as pd
+
+    if path.endswith(".runlog"):
+        from runlog import open_runlog, records_to_frame
+        _, records = open_runlog(path)
+        seconds = records['seconds']
+        i = np.searchsorted(seconds, start, 'left') if start is not None else 0
+        j = np.searchsorted(seconds, end, 'right') if end is not None else len(records)
+        return records_to_frame(records[i:j])
+
+    if path.endswith(".gz"):
+        meta, entries = read_index(index_path(path))
+    else:
+        meta, entries, _ = ensure_index(path)
+    times = entries['seconds']
+    if len(times) == 0 or np.any(np.diff(times) < 0):
+        # Empty, or time goes backwards (e.g. logs joined together): no seeking
+        df = pd.read_csv(path)
+    else:
+        first = max(np.searchsorted(times, start, 'right') - 1, 0) if start is not None else 0
+        last = np.searchsorted(times, end, 'right') if end is not None else len(entries)
+        with open(path, 'rb') as f:
+            f.seek(int(entries['offset'][first]))
+            data = f.read(int(entries['offset'][last]) - int(entries['offset'][first])) if last < len(entries) else f.read()
+        if meta['compressed']:
+            data = gzip.decompress(data)
+        df = pd.read_csv(io.BytesIO(meta['header'].encode() + data))
+
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= (df['seconds'] >= start).to_numpy()
+    if end is not None:
+        keep &= (df['seconds'] <= end).to_numpy()
+    return df[keep].reset_index(drop=True)
+
+
+# --- Run from command line ---
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('build', 'compress'):
+        print("Usage: python timeindex.py build data_*.csv       # Index legacy logs")
+        print("       python timeindex.py compress data_*.csv    # Seekable .csv.gz with index")
+        sys.exit(1)
+
+    for path in sys.argv[2:]:
+        if sys.argv[1] == 'build':
+            meta, entries, rows = ensure_index(path)
+            print(f"{path}: {rows} rows, {len(entries)} index entries -> {index_path(path)}")
+        else:
+            gz_path = compress(path)
+            print(f"{path} -> {gz_path} ({os.path.getsize(gz_path) / os.path.getsize(path):.0%} of original)")
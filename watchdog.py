@@ -0,0 +1,262 @@
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from collect import MISSING, is_channel, sensor_channels
+from compute import get_calibration_engine
+from metrics import Histogram
+from pump_control import PumpController, open_gpio
+
+# -----------------------------------------------------------------------------
+# Safety watchdog on the acquisition path
+#
+# Threshold and rate-of-change rules from config.yaml (°C, psi, per second) are
+# compiled once into ranges of raw ADC codes, so checking a sample is a few integer
+# comparisons: no calibration runs per sample. A rule that trips calls its pump
+# and heater-cutoff hooks right away, in the acquisition loop, and the time from
+# reading the sample to the hooks returning is recorded.
+# -----------------------------------------------------------------------------
+SENSOR_GROUPS = {'thermistors': ('thermistor', "°C"), 'pressure': ('pressure_transducer', "psi")}
+CONDITIONS = ('above', 'below', 'rate_above', 'rate_below')
+NEVER = (1, 0)  # Empty code range
+
+
+def code_range(mask: np.ndarray) -> tuple:
+    """(first, last) True index of a boolean array whose True entries are contiguous; NEVER if none."""
+    hits = np.flatnonzero(mask)
+    if len(hits) == 0:
+        return NEVER
+    if hits[-1] - hits[0] + 1 != len(hits):
+        raise ValueError("calibration is not monotonic over the rule's range")
+    return int(hits[0]), int(hits[-1])
+
+
+class Rule:
+    """
+    One compiled rule on a sensor column. Level rules trip while the code is in [lo, hi].
+    Rate rules compare with the code `lag` samples earlier: they trip while the new code
+    is in [lo[old], hi[old]], ranges precomputed for every possible earlier code.
+    """
+
+    def __init__(self, description: str, column: int, lo, hi, lag: int = 0, confirm: int = 1,
+                 pump_duty: Optional[float] = None, heater_off: bool = True):
+        self.description = description
+        self.column = column
+        self.lo, self.hi = lo, hi
+        self.lag = lag
+        self.confirm = confirm
+        self.pump_duty = pump_duty
+        self.heater_off = heater_off
+        self.history = [MISSING] * lag  # Codes of the last `lag` samples, as a ring
+        self.position = 0
+        self.streak = 0  # Consecutive samples the condition has held
+        self.tripped = False
+
+    @property
+    def armed(self) -> bool:
+        """False when no reading can trip the rule under the current calibration."""
+        if self.lag:
+            return any(lo <= hi for lo, hi in zip(self.lo, self.hi))
+        return self.lo <= self.hi
+
+    def update(self, code: int) -> bool:
+        """Feed one raw code; True when the rule trips on this sample."""
+        if self.lag:
+            old = self.history[self.position]
+            self.history[self.position] = code
+            self.position = (self.position + 1) % self.lag
+            hit = old < len(self.lo) and self.lo[old] <= code <= self.hi[old]
+        else:
+            hit = self.lo <= code <= self.hi
+        if not hit:
+            self.streak = 0
+            return False
+        self.streak += 1
+        if self.streak < self.confirm or self.tripped:
+            return False
+        self.tripped = True  # Latched until restart
+        return True
+
+
+def compile_rule(options: dict, config: dict, columns: list, rate_hz: float, confirm: int) -> Rule:
+    """A rule from config.yaml's watchdog.rules, e.g. {sensor: P_in, rate_above: 100, window_s: 0.5}."""
+    sensor = options['sensor']
+    group = next((g for g in SENSOR_GROUPS if sensor in config['sensors'].get(g, {})), None)
+    if group is None:
+        raise ValueError(f"watchdog: {sensor} is not a thermistor or pressure sensor in config.yaml")
+    if sensor not in columns or not is_channel(sensor_channels(config).get(sensor)):
+        raise ValueError(f"watchdog: {sensor} has no ADC channel")
+    conditions = [key for key in CONDITIONS if key in options]
+    if len(conditions) != 1:
+        raise ValueError(f"watchdog: rule on {sensor} needs exactly one of {', '.join(CONDITIONS)}")
+    condition = conditions[0]
+    limit = float(options[condition])
+    block, unit = SENSOR_GROUPS[group]
+    table = get_calibration_engine(config).tables[block]
+
+    lag = 0
+    if condition.startswith('rate_'):
+        # Change over `lag` samples between every earlier code (rows) and every new code (columns)
+        lag = max(1, round(options.get('window_s', 1.0) * rate_hz))
+        change = limit * lag / rate_hz
+        with np.errstate(invalid='ignore'):
+            delta = table[np.newaxis, :] - table[:, np.newaxis]
+            masks = delta > change if condition == 'rate_above' else delta < change
+        lo, hi = map(list, zip(*(code_range(mask) for mask in masks)))
+        description = f"{sensor} rate {condition[5:]} {limit:g} {unit}/s"
+    else:
+        with np.errstate(invalid='ignore'):
+            lo, hi = code_range(table > limit if condition == 'above' else table < limit)
+        description = f"{sensor} {condition} {limit:g} {unit}"
+    return Rule(description, columns.index(sensor), lo, hi, lag, options.get('confirm_samples', confirm),
+                options.get('pump_duty'), options.get('heater_off', True))
+
+
+class HeaterCutoff:
+    """
+    Heater interlock relay on a GPIO pin. The pin is held on while the watchdog runs
+    and dropped on a trip or when the run stops, so the heater cannot run unwatched.
+    Without `gpio` it opens RPi.GPIO, and fails unless COLDPLAYT_FAKE_GPIO asks for the fake.
+    """
+
+    def __init__(self, pin: int, gpio=None, active_high: bool = True):
+        self.gpio = gpio if gpio is not None else open_gpio()
+        self.pin = pin
+        self.on, self.off = (self.gpio.HIGH, self.gpio.LOW) if active_high else (self.gpio.LOW, self.gpio.HIGH)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(pin, self.gpio.OUT)
+        self.gpio.output(pin, self.on)
+        self.cut_off = False
+
+    def cut(self) -> None:
+        self.gpio.output(self.pin, self.off)
+        self.cut_off = True
+
+    def close(self) -> None:
+        self.cut()
+
+
+class Trip(NamedTuple):
+    rule: str
+    seconds: float  # Run time of the sample that tripped the rule
+    code: int
+    latency_ms: float  # From reading the sample to the hooks returning
+
+
+class Watchdog:
+    """
+    Checks every sample against the compiled rules; call check() right after the plan is read.
+    `pump` and `heater` are the hooks (either may be None); `on_trip` callbacks run after them.
+    The pump belongs to the caller: the watchdog only changes its duty cycle.
+    """
+
+    def __init__(self, rules: list, period_s: float, pump: Optional[PumpController] = None,
+                 heater: Optional[HeaterCutoff] = None, on_trip: Optional[list] = None,
+                 latency_budget_s: Optional[float] = None, metrics=None):
+        self.rules = rules
+        self.pump = pump
+        self.heater = heater
+        self.on_trip = list(on_trip or [])
+        self.latency_budget_s = latency_budget_s or period_s
+        self.pump_held = False  # A trip has set the pump; other pump control must leave it alone
+        self.trips = []
+        self.late_trips = 0
+        self.samples = 0
+        self.check_s = 0.0
+        self.max_check_s = 0.0
+        description = "Time from reading a sample to the watchdog's hooks returning"
+        self.latency = metrics.histogram("watchdog_trip_latency_seconds", description) if metrics else Histogram()
+        if metrics:
+            metrics.counter("watchdog_trips_total", "Safety rules tripped", lambda: len(self.trips))
+        self._owned = []  # Hooks opened by from_config (the heater relay), released by close()
+
+    @classmethod
+    def from_config(cls, config: dict, columns: list, rate_hz: float, pump: Optional[PumpController] = None,
+                    metrics=None) -> Optional["Watchdog"]:
+        """
+        The watchdog in config.yaml, or None if it is disabled. Rules with pump_duty act on `pump`,
+        the caller's running controller; the watchdog never opens the pump itself.
+        """
+        options = config.get('watchdog', {})
+        if not options.get('enabled', False):
+            return None
+        confirm = options.get('confirm_samples', 1)
+        rules = [compile_rule(rule, config, columns, rate_hz, confirm) for rule in options.get('rules', [])]
+        for rule in rules:
+            if not rule.armed:
+                print(f"Warning: watchdog rule '{rule.description}' cannot trip with this calibration")
+        if pump is None and any(rule.pump_duty is not None for rule in rules):
+            print("Warning: no pump controller (pump.enabled is off, or main.py); trips cannot set pump_duty")
+        owned = []
+        heater = None
+        if options.get('heater_pin') is not None:
+            heater = HeaterCutoff(options['heater_pin'], pump.gpio if pump else None,
+                                  options.get('heater_active_high', True))
+            owned.append(heater.close)
+        elif any(rule.heater_off for rule in rules):
+            print("Warning: watchdog.heater_pin is not set; trips cannot cut the heater")
+        budget_ms = options.get('latency_budget_ms')
+        watchdog = cls(rules, 1 / rate_hz, pump, heater, latency_budget_s=budget_ms / 1000 if budget_ms else None,
+                       metrics=metrics)
+        watchdog._owned = owned
+        return watchdog
+
+    def check(self, t: float, row, stamp: float) -> None:
+        """One raw sample (codes in `columns` order); `stamp` is perf_counter() when its read started."""
+        start = time.perf_counter()
+        tripped = None
+        for rule in self.rules:
+            if rule.update(row[rule.column]):
+                tripped = tripped or []
+                tripped.append(rule)
+        if tripped:
+            self._trip(t, row, stamp, tripped)
+        elapsed = time.perf_counter() - start
+        self.samples += 1
+        self.check_s += elapsed
+        if elapsed > self.max_check_s:
+            self.max_check_s = elapsed
+
+    def _trip(self, t: float, row, stamp: float, rules: list) -> None:
+        # Act first, report after
+        duties = [rule.pump_duty for rule in rules if rule.pump_duty is not None]
+        actions = []
+        if self.heater and any(rule.heater_off for rule in rules):
+            actions.append(self.heater.cut)
+        if self.pump and duties:
+            self.pump_held = True
+            actions.append(lambda: self.pump.set_pwm(duties[0]))
+        actions += [lambda callback=callback: callback(rules) for callback in self.on_trip]
+        errors = []
+        for action in actions:
+            try:
+                action()
+            except Exception as e:  # Keep acting and logging; one failed hook must not stop the others
+                errors.append(e)
+        latency = time.perf_counter() - stamp
+        self.latency.observe(latency)
+        if latency > self.latency_budget_s:
+            self.late_trips += 1
+        for rule in rules:
+            self.trips.append(Trip(rule.description, t, row[rule.column], 1000 * latency))
+            print(f"WATCHDOG: {rule.description} at {t:.3f} s (code {row[rule.column]}), "
+                  f"acted {1000 * latency:.2f} ms after the read")
+        for e in errors:
+            print(f"WATCHDOG: hook failed: {e}")
+
+    def close(self) -> None:
+        for release in self._owned:
+            release()
+        self._owned = []
+
+    def summary(self) -> str:
+        mean_us = 1e6 * self.check_s / self.samples if self.samples else 0.0
+        lines = [f"Watchdog: {len(self.rules)} rule(s) on {self.samples} samples, check avg = {mean_us:.1f} µs, "
+                 f"max = {1e6 * self.max_check_s:.1f} µs, trips = {len(self.trips)}"]
+        if self.trips:
+            lines.append(f"  trip latency max = {1000 * self.latency.max:.2f} ms, "
+                         f"over {1000 * self.latency_budget_s:g} ms budget = {self.late_trips}")
+        lines += [f"  {trip.seconds:10.3f} s  {trip.rule} (code {trip.code}), {trip.latency_ms:.2f} ms"
+                  for trip in self.trips]
+        return "\n".join(lines)